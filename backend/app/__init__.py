@@ -3,56 +3,44 @@ from flask_cors import CORS
 from app.config import Config
 from app.extensions import db, bcrypt, migrate, mail, socketio
 from app.api import init_app as init_api
+from app.auditoria import audit_log
+from app.correio import fila_email
+from app.senhas import servico_senhas
+from app.particoes import logs_cli
+from app.pool import opcoes_engine, configurar_engine
+from app.presenca import presenca
+from app.metricas import metricas
+from app.consultas import monitor_consultas
+from app.sessoes import sessoes
+from app.cache_contatos import cache_contatos
 from flask_jwt_extended import JWTManager
-import os
-import psycopg2
-from urllib.parse import urlparse
+from app.bootstrap import comando_db_bootstrap
 from app.api.tempoReal import WebSocketHandler
 
-def create_database_if_not_exists():
-    db_url = os.getenv('SQLALCHEMY_DATABASE_URI')
-    parsed = urlparse(db_url)
-
-    db_name = parsed.path[1:]  
-    user = parsed.username
-    password = parsed.password
-    host = parsed.hostname
-    port = parsed.port or 5432
-
-    
-    conn = psycopg2.connect(
-        dbname='postgres',
-        user=user,
-        password=password,
-        host=host,
-        port=port
-    )
-    conn.autocommit = True
-    cur = conn.cursor()
-
-    cur.execute(f"SELECT 1 FROM pg_database WHERE datname = '{db_name}';")
-    exists = cur.fetchone()
-
-    if not exists:
-        cur.execute(f'CREATE DATABASE "{db_name}";')
-        print(f'[✓] Banco de dados "{db_name}" criado com sucesso.')
-    else:
-        print(f'[i] Banco de dados "{db_name}" já existe.')
-
-    cur.close()
-    conn.close()
-
 def create_app():
-    create_database_if_not_exists()  
-
+    """
+    Só monta a aplicação: nenhuma conexão ao banco acontece aqui.
+    Criação do banco e do esquema ficam em `flask db-bootstrap`.
+    """
     app = Flask(__name__)
     app.config.from_object(Config)
     CORS(app)
     jwt = JWTManager(app)
+    sessoes.init_app(app)
+    cache_contatos.init_app(app)
+    # Toda rota com @jwt_required() rejeita sessões encerradas (logout/exclusão)
+    jwt.token_in_blocklist_loader(sessoes.token_revogado)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+        **opcoes_engine(app.config)
+    }
     db.init_app(app)
     bcrypt.init_app(app)
+    servico_senhas.init_app(app)
     migrate.init_app(app, db)
     mail.init_app(app)
+    fila_email.init_app(app)
+    audit_log.init_app(app)
     socketio.init_app(
         app,
         async_mode=app.config['SOCKETIO_ASYNC_MODE'],
@@ -60,16 +48,23 @@ def create_app():
         logger=app.config['SOCKETIO_LOGGER'],
         engineio_logger=app.config['SOCKETIO_ENGINEIO_LOGGER'],
         ping_timeout=app.config['SOCKETIO_PING_TIMEOUT'],
-        ping_interval=app.config['SOCKETIO_PING_INTERVAL']
+        ping_interval=app.config['SOCKETIO_PING_INTERVAL'],
+        message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'],
+        channel=app.config['SOCKETIO_CHANNEL']
     )
+    presenca.init_app(app)
+    monitor_consultas.init_app(app)
+    metricas.init_app(app)
 
 
     init_api(app)
+    app.cli.add_command(logs_cli)
+    app.cli.add_command(comando_db_bootstrap)
     from app.routesUploadedFile import upload_bp
     app.register_blueprint(upload_bp)
     with app.app_context():
-        db.create_all()
-        ws_handler = WebSocketHandler(socketio)
+        configurar_engine(db.engine, app.config)
+    WebSocketHandler(socketio, app)
 
     return app
 
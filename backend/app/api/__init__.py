@@ -19,8 +19,11 @@ from app.api.contatos import (
 )
 from app.api.conversas import (
     ConversationResource,
-    MessageResource
+    MessageResource,
+    MessageBatchResource
 )
+from app.api.sincronizacao import SyncResource
+from app.api.auditoria import AuditLogResource
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')  
 api = Api(api_bp)
@@ -45,6 +48,11 @@ api.add_resource(ConversationResource, '/conversas', '/conversas/<string:convers
 api.add_resource(MessageResource, 
                 '/conversas/<string:conversa_id>/mensagens', 
                 '/conversas/<string:conversa_id>/mensagens/<string:mensagem_id>')
+api.add_resource(MessageBatchResource, '/conversas/mensagens/lote')
+# Sincronização incremental
+api.add_resource(SyncResource, '/sync')
+# Consulta de auditoria (administradores)
+api.add_resource(AuditLogResource, '/auditoria/logs')
 
 def init_app(app):
     """Função de inicialização que deve ser importada no app/__init__.py"""
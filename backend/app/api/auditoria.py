@@ -0,0 +1,165 @@
+from flask_restful import Resource, reqparse, inputs
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Response, current_app, stream_with_context
+from app.models import Log, LogCategoria, LogSeveridade
+from app.auditoria import registrar_log
+from app.api.paginacao import codificar_cursor, decodificar_cursor, CursorInvalido
+from sqlalchemy import tuple_
+import csv
+import io
+import json
+from uuid import UUID
+
+LIMITE_PADRAO_LOGS = 100
+LIMITE_MAXIMO_LOGS = 1000
+COLUNAS_EXPORTACAO = ("id", "timestamp", "id_usuario", "categoria", "severidade", "acao", "detalhe", "ip_origem", "metadados")
+
+
+def _eh_admin(usuario_id):
+    admins = current_app.config.get('AUDITORIA_ADMINS', '')
+    return str(usuario_id) in {item.strip() for item in admins.split(',') if item.strip()}
+
+
+def _ler_filtro_metadados(filtros):
+    """Converte ["conversa_id=abc", "agregado=3"] em {"conversa_id": "abc", "agregado": 3}"""
+    contido = {}
+    for filtro in filtros or []:
+        if '=' not in filtro:
+            raise ValueError(f"Filtro de metadados inválido: {filtro}")
+        chave, valor = filtro.split('=', 1)
+        try:
+            contido[chave] = json.loads(valor)
+        except ValueError:
+            contido[chave] = valor
+    return contido
+
+
+def _formatar(log):
+    return {
+        "id": str(log.id),
+        "timestamp": log.timestamp.isoformat(),
+        "id_usuario": str(log.id_usuario) if log.id_usuario else None,
+        "categoria": log.categoria,
+        "severidade": log.severidade,
+        "acao": log.acao,
+        "detalhe": log.detalhe,
+        "ip_origem": str(log.ip_origem) if log.ip_origem else None,
+        "metadados": log.metadados
+    }
+
+
+class AuditLogResource(Resource):
+    @jwt_required()
+    def get(self):
+        """
+        Consulta de logs para investigação (somente AUDITORIA_ADMINS).
+
+        Filtra por usuário, categoria, ação, intervalo de tempo (que restringe
+        as partições lidas) e pares chave=valor em metadados (índice GIN).
+        formato=json pagina por cursor; ndjson e csv exportam todo o resultado
+        em streaming.
+        """
+        parser = reqparse.RequestParser()
+        parser.add_argument('usuario', type=UUID, location='args', help="ID de usuário inválido")
+        parser.add_argument('categoria', type=str, location='args')
+        parser.add_argument('acao', type=str, location='args')
+        parser.add_argument('desde', type=inputs.datetime_from_iso8601, location='args')
+        parser.add_argument('ate', type=inputs.datetime_from_iso8601, location='args')
+        parser.add_argument('meta', type=str, action='append', location='args', help="Filtro chave=valor em metadados")
+        parser.add_argument('cursor', type=str, location='args')
+        parser.add_argument('limit', type=int, default=LIMITE_PADRAO_LOGS, location='args')
+        parser.add_argument('formato', type=str, default='json', choices=('json', 'ndjson', 'csv'), location='args')
+        args = parser.parse_args()
+
+        usuario_atual_id = get_jwt_identity()
+
+        if not _eh_admin(usuario_atual_id):
+            registrar_log(
+                usuario_id=usuario_atual_id,
+                categoria=LogCategoria.AUTENTICACAO,
+                severidade=LogSeveridade.ALERTA,
+                acao="AUDITORIA_ACESSO_NEGADO",
+                detalhe="Consulta de auditoria sem permissão"
+            )
+            return {"error": "Acesso negado"}, 403
+
+        try:
+            metadados = _ler_filtro_metadados(args['meta'])
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        consulta = Log.query
+        if args['usuario']:
+            consulta = consulta.filter(Log.id_usuario == args['usuario'])
+        if args['categoria']:
+            consulta = consulta.filter(Log.categoria == args['categoria'])
+        if args['acao']:
+            consulta = consulta.filter(Log.acao == args['acao'])
+        if args['desde']:
+            consulta = consulta.filter(Log.timestamp >= args['desde'])
+        if args['ate']:
+            consulta = consulta.filter(Log.timestamp < args['ate'])
+        if metadados:
+            consulta = consulta.filter(Log.metadados.contains(metadados))
+        if args['cursor']:
+            try:
+                data, id_registro = decodificar_cursor(args['cursor'])
+            except CursorInvalido:
+                return {"error": "Cursor inválido"}, 400
+            consulta = consulta.filter(tuple_(Log.timestamp, Log.id) < tuple_(data, id_registro))
+
+        consulta = consulta.order_by(Log.timestamp.desc(), Log.id.desc())
+
+        registrar_log(
+            usuario_id=usuario_atual_id,
+            categoria=LogCategoria.AUTENTICACAO,
+            severidade=LogSeveridade.INFO,
+            acao="AUDITORIA_CONSULTA",
+            detalhe=f"Consulta de auditoria ({args['formato']})",
+            metadados={
+                # UUID e datas não são serializáveis em JSON
+                chave: args[chave] if isinstance(args[chave], (str, list)) else str(args[chave])
+                for chave in ('usuario', 'categoria', 'acao', 'desde', 'ate', 'meta') if args[chave]
+            }
+        )
+
+        if args['formato'] == 'json':
+            limite = max(1, min(args['limit'], LIMITE_MAXIMO_LOGS))
+            logs = consulta.limit(limite + 1).all()
+            tem_mais = len(logs) > limite
+            logs = logs[:limite]
+            return {
+                "logs": [_formatar(log) for log in logs],
+                "next_cursor": codificar_cursor(logs[-1].timestamp, logs[-1].id) if tem_mais else None,
+                "tem_mais": tem_mais
+            }, 200
+
+        # Exportação: cursor do servidor, sem carregar o resultado inteiro em memória
+        linhas = consulta.execution_options(yield_per=1000)
+
+        if args['formato'] == 'ndjson':
+            def gerar():
+                for log in linhas:
+                    yield json.dumps(_formatar(log)) + '\n'
+
+            return Response(stream_with_context(gerar()), mimetype='application/x-ndjson')
+
+        def gerar_csv():
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer)
+            escritor.writerow(COLUNAS_EXPORTACAO)
+            for log in linhas:
+                item = _formatar(log)
+                item["metadados"] = json.dumps(item["metadados"]) if item["metadados"] is not None else ""
+                escritor.writerow([item[coluna] for coluna in COLUNAS_EXPORTACAO])
+                if buffer.tell() >= 64 * 1024:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+
+        return Response(
+            stream_with_context(gerar_csv()),
+            mimetype='text/csv',
+            headers={"Content-Disposition": "attachment; filename=auditoria.csv"}
+        )
@@ -1,85 +1,57 @@
 from flask_restful import Resource, reqparse
 from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, get_jwt
-from app import bcrypt, mail
-from app.models import Usuario, Sessao, Codigo2FA, Contato, Mensagem, Log, LogCategoria, LogSeveridade
-from app.extensions import db, mail
+from sqlalchemy import update
+from app.models import Usuario, Sessao, Codigo2FA, Contato, Conversa, Mensagem, LogCategoria, LogSeveridade, AlteracaoTipo
+from app.extensions import db
+from app.auditoria import registrar_log
+from app.sincronizacao import registrar_alteracao, registrar_alteracoes
+from app.sessoes import sessoes
+from app.cache_contatos import cache_contatos
+from app.correio import fila_email
+from app.senhas import servico_senhas, SenhaSobrecarregada
 from uuid import uuid4
 from datetime import datetime, timedelta, timezone
 from hashlib import sha256
-from flask_mail import Message
 import random
 from flask import request
-from enum import Enum
-import json
 
 
-#REGISTRAR LOG-------------------------------------------------------------------------------
+#enviar email-------------------------------------------------------------------------------
+
+def enviar_email_2fa(email, codigo, usuario_id=None):
+    """Agenda o envio do código; retorna False só se o e-mail não pôde ser enfileirado"""
+    plain_content = f"Your verification code is: {codigo}\nUse this code to complete your registration/login."
+    html_content = f"""<!DOCTYPE html>
+    <html><head><meta charset="utf-8"></head>
+    <body><p>Your code: <strong>{codigo}</strong></p></body></html>"""
+
+    envio_id = fila_email.enfileirar(
+        destinatario=email,
+        assunto="Code",
+        corpo=plain_content,
+        html=html_content,
+        usuario_id=usuario_id
+    )
+    return envio_id is not None
 
-def registrar_log(usuario_id, categoria, severidade, acao, detalhe=None, metadados=None, ip_origem=None):
+
+def registrar_perfil_alterado(usuario_id):
     """
-    Registra uma ação no sistema de logs aprimorado
-    :param usuario_id: UUID do usuário que realizou a ação
-    :param categoria: Categoria do log (usar LogCategoria)
-    :param severidade: Nível de severidade (usar LogSeveridade)
-    :param acao: Descrição da ação (máx. 255 chars)
-    :param detalhe: Detalhes adicionais (opcional)
-    :param metadados: Dados adicionais em formato JSON (opcional)
-    :param ip_origem: Endereço IP de origem (capturado automaticamente se None)
+    Nome e foto do usuário aparecem nas listas de quem o tem como contato ou
+    conversa: registra a alteração para esses usuários (invalida o ETag e
+    entra na sincronização). Não faz commit.
     """
-    if ip_origem is None:
-        ip_origem = request.remote_addr
-    
-    try:
-        novo_log = Log(
-            id=uuid4(),
-            id_usuario=usuario_id,
-            categoria=categoria.value if isinstance(categoria, Enum) else categoria,
-            severidade=severidade.value if isinstance(severidade, Enum) else severidade,
-            acao=acao,
-            detalhe=detalhe,
-            ip_origem=ip_origem,
-            metadados=json.dumps(metadados) if metadados else None
-        )
-        
-        db.session.add(novo_log)
-        db.session.commit()
-        return True
-    except Exception as e:
-        db.session.rollback()
-        print(f"Erro ao registrar log: {str(e)}")
-        return False
+    donos = [id_dono for (id_dono,) in db.session.query(Contato.id_usuario).filter(Contato.id_contato == usuario_id)]
+    registrar_alteracao(donos, AlteracaoTipo.CONTATO_ATUALIZADO, usuario_id)
+    conversas = Conversa.query.filter((Conversa.id_usuario1 == usuario_id) | (Conversa.id_usuario2 == usuario_id))
+    registrar_alteracoes(
+        [(conversa.outro_participante(usuario_id), conversa.id) for conversa in conversas],
+        AlteracaoTipo.CONVERSA_ATUALIZADA
+    )
 
-#enviar email-------------------------------------------------------------------------------
 
-def enviar_email_2fa(email, codigo):
-    try:
-        
-        plain_content = f"Your verification code is: {codigo}\nUse this code to complete your registration/login."
-        html_content = f"""<!DOCTYPE html>
-        <html><head><meta charset="utf-8"></head>
-        <body><p>Your code: <strong>{codigo}</strong></p></body></html>"""
-        
-        
-        
-        msg = Message(
-            subject="Code",  
-            recipients=[email],
-            charset='utf-8',
-            body=plain_content,
-            html=html_content
-        )
-        
-        
-        msg.extra_headers = {'Content-Transfer-Encoding': '8bit'}
-        
-        mail.send(msg)
-        return True
-    except Exception as e:
-        print(f"ERRO DETALHADO: {str(e)}")
-        print(f"Tipo do erro: {type(e)}")
-        if hasattr(e, 'args'):
-            print(f"Args do erro: {e.args}")
-        return False
+def servico_ocupado():
+    return {"error": "Serviço temporariamente sobrecarregado, tente novamente"}, 503, {"Retry-After": "1"}
 
 
 
@@ -96,13 +68,20 @@ class RegisterResource(Resource):
         
         usuario_existente = Usuario.query.filter_by(email=args['email']).first()
         
+        if usuario_existente and usuario_existente.dois_fatores_ativo:
+            return {"error": "E-mail já registrado e verificado"}, 400
+
+        try:
+            senha_hash = servico_senhas.gerar_hash(args['password'])
+        except SenhaSobrecarregada:
+            return servico_ocupado()
+
         if usuario_existente:
-            if usuario_existente.dois_fatores_ativo:
-                return {"error": "E-mail já registrado e verificado"}, 400
-            
-            
+            if usuario_existente.nome != args['nome']:
+                # Ex.: conta excluída e registrada de novo com o mesmo e-mail
+                registrar_perfil_alterado(usuario_existente.id)
             usuario_existente.nome = args['nome']
-            usuario_existente.senha_hash = bcrypt.generate_password_hash(args['password']).decode('utf-8')
+            usuario_existente.senha_hash = senha_hash
             
            
             Codigo2FA.query.filter_by(id_usuario=usuario_existente.id).delete()
@@ -113,12 +92,15 @@ class RegisterResource(Resource):
             usuario = Usuario(
                 nome=args['nome'],
                 email=args['email'],
-                senha_hash=bcrypt.generate_password_hash(args['password']).decode('utf-8'),
+                senha_hash=senha_hash,
                 dois_fatores_ativo=False
             )
             db.session.add(usuario)
         
         db.session.commit()
+        if usuario_existente:
+            # Nome novo aparece em listas de contatos já em cache
+            cache_contatos.invalidar_usuario(usuario.id)
 
         
         codigo = str(random.randint(100000, 999999))
@@ -142,7 +124,7 @@ class RegisterResource(Resource):
             detalhe=f"Novo registro para {args['email']}"
         )
         
-        if not enviar_email_2fa(usuario.email, codigo):
+        if not enviar_email_2fa(usuario.email, codigo, usuario.id):
             
             registrar_log(
                 usuario_id=usuario.id,
@@ -268,7 +250,12 @@ class LoginResource(Resource):
             detalhe="Tentativa de realizar login"
         )
 
-        if not usuario or not bcrypt.check_password_hash(usuario.senha_hash, args["password"]):
+        try:
+            senha_correta = usuario is not None and servico_senhas.verificar(usuario.senha_hash, args["password"])
+        except SenhaSobrecarregada:
+            return servico_ocupado()
+
+        if not senha_correta:
             registrar_log(
                 usuario_id=usuario.id if usuario else None,
                 categoria=LogCategoria.AUTENTICACAO,
@@ -289,6 +276,13 @@ class LoginResource(Resource):
             )
             return {"error": "Conta não verificada. Verifique seu email."}, 403
 
+        # BCRYPT_LOG_ROUNDS mudou: aproveita a senha em claro para atualizar o hash (gravado no commit abaixo)
+        if servico_senhas.precisa_rehash(usuario.senha_hash):
+            try:
+                usuario.senha_hash = servico_senhas.gerar_hash(args["password"])
+            except SenhaSobrecarregada:
+                pass
+
         
         codigo = str(random.randint(100000, 999999))
         hash_codigo = sha256(codigo.encode()).hexdigest()
@@ -302,7 +296,7 @@ class LoginResource(Resource):
         db.session.add(registro_2fa)
         db.session.commit()
 
-        if not enviar_email_2fa(usuario.email, codigo):
+        if not enviar_email_2fa(usuario.email, codigo, usuario.id):
             registrar_log(
                 usuario_id=usuario.id,
                 categoria=LogCategoria.AUTENTICACAO,
@@ -393,9 +387,6 @@ class VerificarLogin2FAResource(Resource):
         db.session.add(sessao)
         db.session.commit()
 
-        print(json.dumps({"success": True, "message": "Login verificado com sucesso!", "access_token": token, "user": {"id": str(usuario.id), "nome": usuario.nome, "email": usuario.email, "foto_perfil": usuario.foto_perfil if usuario.foto_perfil else ""}}, indent=None))
-        
-
         return {
             "success": True,
             "message": "Login verificado com sucesso!",
@@ -432,6 +423,7 @@ class LogoutResource(Resource):
             jwt_token=jti
         ).delete()
         db.session.commit()
+        sessoes.revogar(jti)
         
         return {"message": "Sessão atual encerrada com sucesso"}, 200
 
@@ -447,13 +439,7 @@ class UserProfileResource(Resource):
         jti = get_jwt()["jti"]
         
         
-        sessao = Sessao.query.filter_by(
-            id_usuario=usuario_id,
-            jwt_token=jti,
-            doisFatoresSessao=True
-        ).first()
-        
-        if not sessao:
+        if not sessoes.sessao_valida(usuario_id, jti):
             return {"error": "Sessão não encontrada ou não verificada"}, 401
         
         
@@ -503,7 +489,12 @@ class ExcluirContaResource(Resource):
             return {"error": "Usuário não encontrado"}, 404
             
         
-        if not bcrypt.check_password_hash(usuario.senha_hash, args['password']):
+        try:
+            senha_correta = servico_senhas.verificar(usuario.senha_hash, args['password'])
+        except SenhaSobrecarregada:
+            return servico_ocupado()
+
+        if not senha_correta:
             registrar_log(
                 usuario_id=usuario_id,
                 categoria=LogCategoria.CONTA,
@@ -515,12 +506,7 @@ class ExcluirContaResource(Resource):
 
         
         jti = get_jwt()["jti"]
-        sessao = Sessao.query.filter_by(
-            id_usuario=usuario_id,
-            jwt_token=jti
-        ).first()
-        
-        if not sessao or not sessao.doisFatoresSessao:
+        if not sessoes.sessao_valida(usuario_id, jti):
             registrar_log(
                 usuario_id=usuario_id,
                 categoria=LogCategoria.CONTA,
@@ -544,7 +530,7 @@ class ExcluirContaResource(Resource):
         db.session.add(registro_2fa)
         db.session.commit()
 
-        if not enviar_email_2fa(usuario.email, codigo):
+        if not enviar_email_2fa(usuario.email, codigo, usuario.id):
             registrar_log(
                 usuario_id=usuario_id,
                 categoria=LogCategoria.CONTA,
@@ -629,10 +615,15 @@ class ConfirmarExclusaoContaResource(Resource):
         
         usuario.email = f"deleted_{uuid4().hex}@deleted.com"
         usuario.nome = "Usuário Excluído"
-        usuario.senha_hash = bcrypt.generate_password_hash(uuid4().hex).decode('utf-8')
+        try:
+            usuario.senha_hash = servico_senhas.gerar_hash(uuid4().hex)
+        except SenhaSobrecarregada:
+            return servico_ocupado()
         usuario.foto_perfil = None
         usuario.dois_fatores_ativo = False
 
+        registrar_perfil_alterado(usuario_id)
+
         
         Contato.query.filter_by(id_usuario=usuario_id).delete()
 
@@ -643,12 +634,17 @@ class ConfirmarExclusaoContaResource(Resource):
         Codigo2FA.query.filter_by(id_usuario=usuario_id).delete()
 
         
-        mensagens = Mensagem.query.filter_by(id_usuario=usuario_id).all()
-        for msg in mensagens:
-            msg.texto_criptografado = "[mensagem removida]"
-            msg.exclusao = True
+        # Um único UPDATE em vez de carregar e alterar cada mensagem
+        db.session.execute(
+            update(Mensagem)
+            .where(Mensagem.id_usuario == usuario_id)
+            .values(texto_criptografado="[mensagem removida]", exclusao=True)
+            .execution_options(synchronize_session=False)
+        )
 
         db.session.commit()
+        sessoes.revogar_usuario(usuario_id)
+        cache_contatos.invalidar_usuario(usuario_id)
 
         registrar_log(
             usuario_id=usuario_id,
@@ -0,0 +1,36 @@
+from hashlib import sha1
+from flask import Response, request
+from werkzeug.http import http_date, quote_etag
+from app.models import VersaoUsuario
+
+
+def validar_condicional(usuario_id):
+    """
+    Validadores de cache das listagens do usuário.
+
+    O ETag combina a versão do usuário (avançada a cada alteração registrada)
+    com a URL pedida, já que página, cursor e filtros mudam o corpo.
+    Retorna (cabecalhos, resposta_304): quando If-None-Match/If-Modified-Since
+    ainda valem, resposta_304 vem pronta para ser devolvida sem consultar mais nada.
+    """
+    versao, modificado = VersaoUsuario.atual(usuario_id)
+    assinatura = sha1(request.full_path.encode()).hexdigest()[:16]
+    valor = f"{versao}-{assinatura}"
+
+    cabecalhos = {
+        "ETag": quote_etag(valor, weak=True),
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization"
+    }
+    if modificado is not None:
+        cabecalhos["Last-Modified"] = http_date(modificado)
+
+    if request.if_none_match:
+        if request.if_none_match.contains_weak(valor):
+            return cabecalhos, Response(status=304, headers=cabecalhos)
+    elif modificado is not None and request.if_modified_since is not None:
+        # Last-Modified tem resolução de segundos
+        if modificado.replace(microsecond=0) <= request.if_modified_since:
+            return cabecalhos, Response(status=304, headers=cabecalhos)
+
+    return cabecalhos, None
@@ -1,47 +1,13 @@
 from flask_restful import Resource, reqparse
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Usuario, Contato, Log, LogCategoria, LogSeveridade, Conversa
+from app.models import Usuario, Contato, LogCategoria, LogSeveridade, Conversa, AlteracaoTipo
 from app.extensions import db
+from app.auditoria import registrar_log
+from app.sincronizacao import registrar_alteracao
+from app.api.condicional import validar_condicional
+from app.cache_contatos import cache_contatos
 from uuid import uuid4
 from datetime import datetime
-from flask import request
-import json
-from enum import Enum
-
-# Função de log aprimorada
-def registrar_log(usuario_id, categoria, severidade, acao, detalhe=None, metadados=None, ip_origem=None):
-    """
-    Registra uma ação no sistema de logs aprimorado
-    :param usuario_id: UUID do usuário que realizou a ação
-    :param categoria: Categoria do log (usar LogCategoria)
-    :param severidade: Nível de severidade (usar LogSeveridade)
-    :param acao: Descrição da ação (máx. 255 chars)
-    :param detalhe: Detalhes adicionais (opcional)
-    :param metadados: Dados adicionais em formato JSON (opcional)
-    :param ip_origem: Endereço IP de origem (capturado automaticamente se None)
-    """
-    if ip_origem is None:
-        ip_origem = request.remote_addr
-    
-    try:
-        novo_log = Log(
-            id=uuid4(),
-            id_usuario=usuario_id,
-            categoria=categoria.value if isinstance(categoria, Enum) else categoria,
-            severidade=severidade.value if isinstance(severidade, Enum) else severidade,
-            acao=acao,
-            detalhe=detalhe,
-            ip_origem=ip_origem,
-            metadados=json.dumps(metadados) if metadados else None
-        )
-        
-        db.session.add(novo_log)
-        db.session.commit()
-        return True
-    except Exception as e:
-        db.session.rollback()
-        print(f"Erro ao registrar log: {str(e)}")
-        return False
 
 class ContactListResource(Resource):
     @jwt_required()
@@ -49,33 +15,40 @@ class ContactListResource(Resource):
         """Lista todos os contatos do usuário"""
         try:
             usuario_atual_id = get_jwt_identity()
-            
-            
-            contatos = db.session.query(
-                Contato,
-                Usuario.nome,
-                Usuario.email,
-                Usuario.foto_perfil
-            ).join(
-                Usuario, 
-                Usuario.id == Contato.id_contato
-            ).filter(
-                Contato.id_usuario == usuario_atual_id
-            ).order_by(
-                Usuario.nome.asc()
-            ).all()
 
-            
-            contatos_formatados = []
-            for contato, nome, email, foto_perfil in contatos:
-                contatos_formatados.append({
-                    "id": str(contato.id_contato),
-                    "nome": nome,
-                    "email": email,
-                    "foto_perfil": foto_perfil,
-                    "bloqueio": contato.bloqueio,
-                    "data_criacao": contato.data_criacao.isoformat()
-                })
+            cabecalhos, nao_modificado = validar_condicional(usuario_atual_id)
+            if nao_modificado:
+                return nao_modificado
+
+            contatos_formatados = cache_contatos.obter_lista(usuario_atual_id)
+            if contatos_formatados is None:
+                geracao = cache_contatos.geracao
+                contatos = db.session.query(
+                    Contato,
+                    Usuario.nome,
+                    Usuario.email,
+                    Usuario.foto_perfil
+                ).join(
+                    Usuario, 
+                    Usuario.id == Contato.id_contato
+                ).filter(
+                    Contato.id_usuario == usuario_atual_id
+                ).order_by(
+                    Usuario.nome.asc()
+                ).all()
+
+                
+                contatos_formatados = []
+                for contato, nome, email, foto_perfil in contatos:
+                    contatos_formatados.append({
+                        "id": str(contato.id_contato),
+                        "nome": nome,
+                        "email": email,
+                        "foto_perfil": foto_perfil,
+                        "bloqueio": contato.bloqueio,
+                        "data_criacao": contato.data_criacao.isoformat()
+                    })
+                cache_contatos.guardar_lista(usuario_atual_id, contatos_formatados, geracao)
 
             registrar_log(
                 usuario_id=usuario_atual_id,
@@ -89,7 +62,7 @@ class ContactListResource(Resource):
                 "message": "Lista de contatos obtida com sucesso",
                 "contatos": contatos_formatados,
                 "total": len(contatos_formatados)
-            }, 200
+            }, 200, cabecalhos
 
         except Exception as e:
             registrar_log(
@@ -161,7 +134,9 @@ class ContactListResource(Resource):
             )
 
             db.session.add(novo_contato)
+            registrar_alteracao([usuario_atual_id], AlteracaoTipo.CONTATO_NOVO, contato.id)
             db.session.commit()
+            cache_contatos.invalidar_dono(usuario_atual_id, contato.id)
 
             registrar_log(
                 usuario_id=usuario_atual_id,
@@ -209,73 +184,71 @@ class ContactDetailResource(Resource):
             return {"error": "ID do contato inválido"}, 400
         try:
             usuario_atual_id = get_jwt_identity()
-            
-            
-            contato = db.session.query(
-                Contato,
-                Usuario.nome,
-                Usuario.email,
-                Usuario.foto_perfil,
-                Usuario.data_criacao
-            ).join(
-                Usuario, 
-                Usuario.id == Contato.id_contato
-            ).filter(
-                Contato.id_usuario == usuario_atual_id,
-                Contato.id_contato == contato_id
-            ).first()
-
-            if not contato:
-                registrar_log(
-                    usuario_id=usuario_atual_id,
-                    categoria=LogCategoria.CONTATO,
-                    severidade=LogSeveridade.ALERTA,
-                    acao="VISUALIZAR_CONTATO_FALHA",
-                    detalhe="Contato não encontrado na lista do usuário",
-                    metadados={"id_contato": contato_id}
-                )
-                return {"error": "Contato não encontrado na sua lista"}, 404
-
-            contato_obj, nome, email, foto_perfil, data_criacao = contato
 
-            
-            conversa = db.session.query(Conversa).filter(
-                ((Conversa.id_usuario1 == usuario_atual_id) & 
-                (Conversa.id_usuario2 == contato_id)) |
-                ((Conversa.id_usuario1 == contato_id) & 
-                (Conversa.id_usuario2 == usuario_atual_id))
-            ).first()
-
-            
-            if conversa:
-                conversa_id = str(conversa.id)
-                tem_conversa = True
-            else:
-                conversa_id = None
-                tem_conversa = False
+            detalhe = cache_contatos.obter_detalhe(usuario_atual_id, contato_id)
+            if detalhe is None:
+                try:
+                    id_usuario1, id_usuario2 = Conversa.ordenar_participantes(usuario_atual_id, contato_id)
+                except ValueError:
+                    return {"error": "ID do contato inválido"}, 400
+
+                geracao = cache_contatos.geracao
+                # Contato, perfil e conversa existente numa única consulta (LEFT JOIN pela unique da conversa)
+                contato = db.session.query(
+                    Contato,
+                    Usuario.nome,
+                    Usuario.email,
+                    Usuario.foto_perfil,
+                    Usuario.data_criacao,
+                    Conversa.id.label('conversa_id')
+                ).join(
+                    Usuario, 
+                    Usuario.id == Contato.id_contato
+                ).outerjoin(
+                    Conversa,
+                    (Conversa.id_usuario1 == id_usuario1) & (Conversa.id_usuario2 == id_usuario2)
+                ).filter(
+                    Contato.id_usuario == usuario_atual_id,
+                    Contato.id_contato == contato_id
+                ).first()
+
+                if not contato:
+                    registrar_log(
+                        usuario_id=usuario_atual_id,
+                        categoria=LogCategoria.CONTATO,
+                        severidade=LogSeveridade.ALERTA,
+                        acao="VISUALIZAR_CONTATO_FALHA",
+                        detalhe="Contato não encontrado na lista do usuário",
+                        metadados={"id_contato": contato_id}
+                    )
+                    return {"error": "Contato não encontrado na sua lista"}, 404
+
+                contato_obj, nome, email, foto_perfil, data_criacao, conversa_id = contato
+                detalhe = {
+                    "id": contato_id,
+                    "nome": nome,
+                    "email": email,
+                    "foto_perfil": foto_perfil,
+                    "data_cadastro": data_criacao.isoformat(),
+                    "bloqueado": contato_obj.bloqueio,
+                    "data_adicionado": contato_obj.data_criacao.isoformat(),
+                    "tem_conversa": conversa_id is not None,
+                    "conversa_id": str(conversa_id) if conversa_id else None
+                }
+                cache_contatos.guardar_detalhe(usuario_atual_id, contato_id, detalhe, geracao)
 
             registrar_log(
                 usuario_id=usuario_atual_id,
                 categoria=LogCategoria.CONTATO,
                 severidade=LogSeveridade.INFO,
                 acao="VISUALIZAR_CONTATO_SUCESSO",
-                detalhe=f"Visualizado contato {nome}",
+                detalhe=f"Visualizado contato {detalhe['nome']}",
                 metadados={"id_contato": contato_id}
             )
 
             return {
                 "message": "Informações do contato obtidas com sucesso",
-                "contato": {
-                    "id": contato_id,
-                    "nome": nome,
-                    "email": email,
-                    "foto_perfil": foto_perfil,
-                    "data_cadastro": data_criacao.isoformat(),
-                    "bloqueado": contato_obj.bloqueio,
-                    "data_adicionado": contato_obj.data_criacao.isoformat(),
-                    "tem_conversa": conversa is not None,
-                    "conversa_id": str(conversa.id) if conversa else None
-                }
+                "contato": detalhe
             }, 200
 
         except Exception as e:
@@ -317,7 +290,9 @@ class ContactBlockResource(Resource):
             
             novo_status = not contato.bloqueio
             contato.bloqueio = novo_status
+            registrar_alteracao([usuario_atual_id], AlteracaoTipo.CONTATO_ATUALIZADO, contato.id_contato)
             db.session.commit()
+            cache_contatos.invalidar_dono(usuario_atual_id, contato.id_contato)
 
             acao = "BLOQUEAR_CONTATO" if novo_status else "DESBLOQUEAR_CONTATO"
             registrar_log(
@@ -385,7 +360,9 @@ class ContactUnblockResource(Resource):
 
             
             contato.bloqueio = False
+            registrar_alteracao([usuario_atual_id], AlteracaoTipo.CONTATO_ATUALIZADO, contato.id_contato)
             db.session.commit()
+            cache_contatos.invalidar_dono(usuario_atual_id, contato.id_contato)
 
             registrar_log(
                 usuario_id=usuario_atual_id,
@@ -440,7 +417,9 @@ class ContactDeleteResource(Resource):
 
             
             db.session.delete(contato)
+            registrar_alteracao([usuario_atual_id], AlteracaoTipo.CONTATO_REMOVIDO, contato.id_contato)
             db.session.commit()
+            cache_contatos.invalidar_dono(usuario_atual_id, contato.id_contato)
 
             registrar_log(
                 usuario_id=usuario_atual_id,
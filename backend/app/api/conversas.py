@@ -1,37 +1,21 @@
-from flask_restful import Resource, reqparse
+from flask_restful import Resource, reqparse, inputs
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Usuario, Conversa, Mensagem, Contato, Log, LogCategoria, LogSeveridade
-from app.extensions import db
-from uuid import uuid4
-from datetime import datetime
-from flask import request
-import json
-from enum import Enum
-
-def registrar_log(usuario_id, categoria, severidade, acao, detalhe=None, metadados=None, ip_origem=None):
-    """Função de log reutilizada do contatos.py"""
-    if ip_origem is None:
-        ip_origem = request.remote_addr
-    
-    try:
-        novo_log = Log(
-            id=uuid4(),
-            id_usuario=usuario_id,
-            categoria=categoria.value if isinstance(categoria, Enum) else categoria,
-            severidade=severidade.value if isinstance(severidade, Enum) else severidade,
-            acao=acao,
-            detalhe=detalhe,
-            ip_origem=ip_origem,
-            metadados=json.dumps(metadados) if metadados else None
-        )
-        
-        db.session.add(novo_log)
-        db.session.commit()
-        return True
-    except Exception as e:
-        db.session.rollback()
-        print(f"Erro ao registrar log: {str(e)}")
-        return False
+from app.models import Usuario, Conversa, Mensagem, Contato, EstadoConversa, LogCategoria, LogSeveridade, AlteracaoTipo
+from app.extensions import db, socketio
+from app.presenca import sala_usuario
+from app.auditoria import registrar_log
+from app.sincronizacao import registrar_alteracao, registrar_alteracoes
+from app.api.paginacao import codificar_cursor, decodificar_cursor, CursorInvalido
+from app.api.condicional import validar_condicional
+from app.cache_contatos import cache_contatos
+from sqlalchemy import case, func, select, true, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from uuid import uuid4, UUID
+from datetime import datetime, timedelta, timezone
+
+LIMITE_MAXIMO_CONVERSAS = 200
+LIMITE_MAXIMO_MENSAGENS = 100
+LIMITE_MAXIMO_LOTE = 500
 
 class ConversationResource(Resource):
     @jwt_required()
@@ -70,12 +54,7 @@ class ConversationResource(Resource):
                 return {"error": "Contato não encontrado ou está bloqueado"}, 403
 
             
-            conversa_existente = Conversa.query.filter(
-                ((Conversa.id_usuario1 == usuario_atual_id) & 
-                 (Conversa.id_usuario2 == contato_id)) |
-                ((Conversa.id_usuario1 == contato_id) & 
-                 (Conversa.id_usuario2 == usuario_atual_id))
-            ).first()
+            conversa_existente = Conversa.entre(usuario_atual_id, contato_id)
 
             if conversa_existente:
                 registrar_log(
@@ -95,14 +74,17 @@ class ConversationResource(Resource):
                 }, 200
 
             
+            id_usuario1, id_usuario2 = Conversa.ordenar_participantes(usuario_atual_id, contato_id)
             nova_conversa = Conversa(
                 id=uuid4(),
-                id_usuario1=usuario_atual_id,
-                id_usuario2=contato_id
+                id_usuario1=id_usuario1,
+                id_usuario2=id_usuario2
             )
 
             db.session.add(nova_conversa)
+            registrar_alteracao([id_usuario1, id_usuario2], AlteracaoTipo.CONVERSA_NOVA, nova_conversa.id)
             db.session.commit()
+            cache_contatos.invalidar_conversa(id_usuario1, id_usuario2)
 
             registrar_log(
                 usuario_id=usuario_atual_id,
@@ -136,39 +118,102 @@ class ConversationResource(Resource):
 
     @jwt_required()
     def get(self):
-        """Lista todas as conversas do usuário"""
+        """Lista as conversas do usuário, das mais recentes para as mais antigas"""
+        parser = reqparse.RequestParser()
+        parser.add_argument('limit', type=int, default=None, help="Quantidade máxima de conversas", location='args')
+        parser.add_argument('cursor', type=str, default=None, help="Cursor retornado na página anterior", location='args')
+        args = parser.parse_args()
+
         try:
             usuario_atual_id = get_jwt_identity()
 
-            
-            conversas = db.session.query(Conversa).filter(
+            cabecalhos, nao_modificado = validar_condicional(usuario_atual_id)
+            if nao_modificado:
+                return nao_modificado
+
+            limite = args['limit']
+            if limite is not None:
+                limite = max(1, min(limite, LIMITE_MAXIMO_CONVERSAS))
+
+            # Uma única consulta: participante, última mensagem (LATERAL) e ordenação por recência
+            outro_usuario_id = case(
+                (Conversa.id_usuario1 == usuario_atual_id, Conversa.id_usuario2),
+                else_=Conversa.id_usuario1
+            )
+            ultima_mensagem = select(
+                Mensagem.data_envio
+            ).where(
+                Mensagem.id_conversa == Conversa.id
+            ).order_by(
+                Mensagem.data_envio.desc()
+            ).limit(1).correlate(Conversa).lateral('ultima_mensagem')
+            recencia = func.coalesce(ultima_mensagem.c.data_envio, Conversa.data_criacao)
+            # Não lidas derivadas da marca de leitura do usuário (índice id_conversa, data_envio)
+            nao_lidas = select(
+                func.count()
+            ).where(
+                Mensagem.id_conversa == Conversa.id,
+                Mensagem.id_usuario != usuario_atual_id,
+                Mensagem.exclusao.is_(False),
+                EstadoConversa.lida_ate.is_(None) | (Mensagem.data_envio > EstadoConversa.lida_ate)
+            ).correlate(Conversa, EstadoConversa).scalar_subquery()
+
+            consulta = db.session.query(
+                Conversa.id,
+                Conversa.data_criacao,
+                Usuario.id.label('outro_usuario_id'),
+                Usuario.nome,
+                Usuario.email,
+                ultima_mensagem.c.data_envio.label('ultima_mensagem_em'),
+                recencia.label('recencia'),
+                EstadoConversa.lida_ate,
+                nao_lidas.label('nao_lidas')
+            ).join(
+                Usuario,
+                Usuario.id == outro_usuario_id
+            ).outerjoin(
+                ultima_mensagem,
+                true()
+            ).outerjoin(
+                EstadoConversa,
+                (EstadoConversa.id_conversa == Conversa.id) &
+                (EstadoConversa.id_usuario == usuario_atual_id)
+            ).filter(
                 (Conversa.id_usuario1 == usuario_atual_id) |
                 (Conversa.id_usuario2 == usuario_atual_id)
-            ).all()
+            )
 
-            
-            conversas_formatadas = []
-            for conversa in conversas:
-                
-                outro_usuario_id = conversa.id_usuario2 if conversa.id_usuario1 == usuario_atual_id else conversa.id_usuario1
-                
-                
-                outro_usuario = Usuario.query.get(outro_usuario_id)
-                if not outro_usuario:
-                    continue
+            if args['cursor']:
+                try:
+                    cursor_data, cursor_id = decodificar_cursor(args['cursor'])
+                except CursorInvalido:
+                    return {"error": "Cursor inválido"}, 400
+                consulta = consulta.filter(
+                    tuple_(recencia, Conversa.id) < tuple_(cursor_data, cursor_id)
+                )
+
+            consulta = consulta.order_by(recencia.desc(), Conversa.id.desc())
+            if limite is not None:
+                consulta = consulta.limit(limite + 1)
+
+            conversas = consulta.all()
 
-                
-                ultima_mensagem = Mensagem.query.filter_by(
-                    id_conversa=conversa.id
-                ).order_by(Mensagem.data_envio.desc()).first()
+            next_cursor = None
+            if limite is not None and len(conversas) > limite:
+                conversas = conversas[:limite]
+                next_cursor = codificar_cursor(conversas[-1].recencia, conversas[-1].id)
 
+            conversas_formatadas = []
+            for conversa in conversas:
                 conversas_formatadas.append({
                     "id": str(conversa.id),
-                    "outro_usuario": str(outro_usuario.id),
-                    "nome": outro_usuario.nome,
-                    "email": outro_usuario.email,
-                    "prioridade": ultima_mensagem.data_envio.isoformat() if ultima_mensagem else None,
-                    "data_criacao": conversa.data_criacao.isoformat()
+                    "outro_usuario": str(conversa.outro_usuario_id),
+                    "nome": conversa.nome,
+                    "email": conversa.email,
+                    "prioridade": conversa.ultima_mensagem_em.isoformat() if conversa.ultima_mensagem_em else None,
+                    "data_criacao": conversa.data_criacao.isoformat(),
+                    "lida_ate": conversa.lida_ate.isoformat() if conversa.lida_ate else None,
+                    "nao_lidas": conversa.nao_lidas
                 })
 
             registrar_log(
@@ -182,8 +227,9 @@ class ConversationResource(Resource):
             return {
                 "message": "Lista de conversas obtida com sucesso",
                 "conversas": conversas_formatadas,
-                "total": len(conversas_formatadas)
-            }, 200
+                "total": len(conversas_formatadas),
+                "next_cursor": next_cursor
+            }, 200, cabecalhos
 
         except Exception as e:
             registrar_log(
@@ -207,11 +253,7 @@ class ConversationResource(Resource):
 
         try:
             
-            conversa = Conversa.query.filter(
-                ((Conversa.id_usuario1 == usuario_atual_id) |
-                 (Conversa.id_usuario2 == usuario_atual_id)) &
-                (Conversa.id == conversa_id)
-            ).first()
+            conversa = Conversa.do_usuario(conversa_id, usuario_atual_id)
 
             if not conversa:
                 registrar_log(
@@ -225,10 +267,18 @@ class ConversationResource(Resource):
                 return {"error": "Conversa não encontrada"}, 404
 
             
-            Mensagem.query.filter_by(
-                id_conversa=conversa_id,
-                id_usuario=usuario_atual_id
-            ).update({"exclusao": True})
+            ocultadas = db.session.execute(
+                update(Mensagem).where(
+                    Mensagem.id_conversa == conversa.id,
+                    Mensagem.id_usuario == usuario_atual_id,
+                    Mensagem.exclusao.is_(False)
+                ).values(exclusao=True).returning(Mensagem.id)
+            ).scalars().all()
+            registrar_alteracao(
+                [conversa.id_usuario1, conversa.id_usuario2],
+                AlteracaoTipo.MENSAGEM_REMOVIDA,
+                ocultadas
+            )
 
             db.session.commit()
 
@@ -260,6 +310,16 @@ class ConversationResource(Resource):
 
 
 class MessageResource(Resource):
+    @staticmethod
+    def _formatar(mensagem):
+        return {
+            "id": str(mensagem.id),
+            "id_conversa": str(mensagem.id_conversa),
+            "texto": mensagem.texto_criptografado,
+            "id_usuario": str(mensagem.id_usuario),
+            "data_envio": mensagem.data_envio.isoformat() if mensagem.data_envio else None
+        }
+
     @jwt_required()
     def post(self, conversa_id):
         """Envia uma mensagem em uma conversa"""
@@ -278,11 +338,7 @@ class MessageResource(Resource):
 
         try:
             # Verifica se a conversa existe e pertence ao usuário
-            conversa = Conversa.query.filter(
-                ((Conversa.id_usuario1 == usuario_atual_id) |
-                (Conversa.id_usuario2 == usuario_atual_id)) &
-                (Conversa.id == str(conversa_id))  # Garanta que ambos são strings
-            ).first()
+            conversa = Conversa.do_usuario(conversa_id, usuario_atual_id)
 
             if not conversa:
                 registrar_log(
@@ -296,7 +352,7 @@ class MessageResource(Resource):
                 return {"error": "Conversa não encontrada"}, 404
 
             
-            id_destino = conversa.id_usuario2 if str(conversa.id_usuario1) == usuario_atual_id else conversa.id_usuario1
+            id_destino = conversa.outro_participante(usuario_atual_id)
 
             
             if not args['texto'].strip():
@@ -311,6 +367,7 @@ class MessageResource(Resource):
             )
 
             db.session.add(nova_mensagem)
+            registrar_alteracao([usuario_atual_id, id_destino], AlteracaoTipo.MENSAGEM_NOVA, nova_mensagem.id)
             db.session.commit()
 
             
@@ -355,19 +412,18 @@ class MessageResource(Resource):
         parser = reqparse.RequestParser()
         parser.add_argument('page', type=int, default=1, help="Número da página", location='args')
         parser.add_argument('per_page', type=int, default=20, help="Itens por página", location='args')
+        parser.add_argument('before', type=str, default=None, help="Cursor: mensagens anteriores a ele", location='args')
+        parser.add_argument('after', type=str, default=None, help="Cursor: mensagens posteriores a ele", location='args')
+        parser.add_argument('total', type=inputs.boolean, default=None, help="Calcula total e páginas", location='args')
         args = parser.parse_args()
 
         usuario_atual_id = get_jwt_identity()
 
         try:
             conversa_id = str(conversa_id)
-            
-            
-            conversa = Conversa.query.filter(
-                ((Conversa.id_usuario1 == usuario_atual_id) |
-                (Conversa.id_usuario2 == usuario_atual_id)) &
-                (Conversa.id == conversa_id)
-            ).first()
+
+            # Pertinência antes do ETag: sem ela um 304 responderia por qualquer conversa
+            conversa = Conversa.do_usuario(conversa_id, usuario_atual_id)
 
             if not conversa:
                 registrar_log(
@@ -380,36 +436,77 @@ class MessageResource(Resource):
                 )
                 return {"error": "Conversa não encontrada"}, 404
 
-            
-            mensagens = Mensagem.query.filter_by(
-                id_conversa=conversa_id
-            ).order_by(
-                Mensagem.data_envio.desc()
+            cabecalhos, nao_modificado = validar_condicional(usuario_atual_id)
+            if nao_modificado:
+                return nao_modificado
+
+            per_page = max(1, min(args['per_page'], LIMITE_MAXIMO_MENSAGENS))
+            consulta = Mensagem.query.filter(Mensagem.id_conversa == conversa_id)
+
+            if args['before'] or args['after']:
+                # Modo cursor (keyset): não usa OFFSET e só conta se for pedido
+                try:
+                    cursor_data, cursor_id = decodificar_cursor(args['before'] or args['after'])
+                except CursorInvalido:
+                    return {"error": "Cursor inválido"}, 400
+
+                chave = tuple_(Mensagem.data_envio, Mensagem.id)
+                if args['before']:
+                    consulta_pagina = consulta.filter(
+                        chave < tuple_(cursor_data, cursor_id)
+                    ).order_by(Mensagem.data_envio.desc(), Mensagem.id.desc())
+                else:
+                    consulta_pagina = consulta.filter(
+                        chave > tuple_(cursor_data, cursor_id)
+                    ).order_by(Mensagem.data_envio.asc(), Mensagem.id.asc())
+
+                itens = consulta_pagina.limit(per_page + 1).all()
+                tem_mais = len(itens) > per_page
+                itens = itens[:per_page]
+
+                next_cursor = None
+                if itens:
+                    ultimo = itens[-1]
+                    next_cursor = codificar_cursor(ultimo.data_envio, ultimo.id)
+                if args['after']:
+                    # Mantém a ordem da resposta: da mais recente para a mais antiga
+                    itens.reverse()
+                elif not tem_mais:
+                    next_cursor = None
+
+                resposta = {
+                    "message": "Mensagens obtidas com sucesso",
+                    "mensagens": [self._formatar(mensagem) for mensagem in itens],
+                    "next_cursor": next_cursor,
+                    "tem_mais": tem_mais
+                }
+                if args['total']:
+                    resposta["total"] = consulta.order_by(None).count()
+                return resposta, 200, cabecalhos
+
+            contar = args['total'] if args['total'] is not None else True
+            mensagens = consulta.order_by(
+                Mensagem.data_envio.desc(),
+                Mensagem.id.desc()
             ).paginate(
                 page=args['page'],
-                per_page=args['per_page'],
-                error_out=False
+                per_page=per_page,
+                error_out=False,
+                count=contar
             )
 
-            
-            mensagens_formatadas = []
-            for mensagem in mensagens.items:
-                mensagem_data = {
-                    "id": str(mensagem.id),
-                    "id_conversa":str(mensagem.id_conversa),
-                    "texto": mensagem.texto_criptografado,
-                    "id_usuario": str(mensagem.id_usuario),
-                    "data_envio": mensagem.data_envio.isoformat() if mensagem.data_envio else None
-                }
-                mensagens_formatadas.append(mensagem_data)
-
-            return {
+            itens = mensagens.items
+            resposta = {
                 "message": "Mensagens obtidas com sucesso",
-                "mensagens": mensagens_formatadas,
-                "total": mensagens.total,
-                "paginas": mensagens.pages,
-                "pagina_atual": mensagens.page
-            }, 200
+                "mensagens": [self._formatar(mensagem) for mensagem in itens],
+                "pagina_atual": mensagens.page,
+                # Permite continuar em modo cursor a partir desta página
+                "next_cursor": codificar_cursor(itens[-1].data_envio, itens[-1].id) if itens else None
+            }
+            if contar:
+                resposta["total"] = mensagens.total
+                resposta["paginas"] = mensagens.pages
+            return resposta, 200, cabecalhos
 
         except Exception as e:
             registrar_log(
@@ -435,11 +532,7 @@ class MessageResource(Resource):
 
         try:
             
-            conversa = Conversa.query.filter(
-                ((Conversa.id_usuario1 == usuario_atual_id) |
-                 (Conversa.id_usuario2 == usuario_atual_id)) &
-                (Conversa.id == conversa_id)
-            ).first()
+            conversa = Conversa.do_usuario(conversa_id, usuario_atual_id)
 
             if not conversa:
                 registrar_log(
@@ -476,8 +569,13 @@ class MessageResource(Resource):
                 return {"error": "Mensagem não encontrada"}, 404
 
             
-            if mensagem.id_usuario == usuario_atual_id:
+            if str(mensagem.id_usuario) == str(usuario_atual_id):
                 mensagem.exclusao = True
+                registrar_alteracao(
+                    [conversa.id_usuario1, conversa.id_usuario2],
+                    AlteracaoTipo.MENSAGEM_REMOVIDA,
+                    mensagem.id
+                )
                 db.session.commit()
 
                 registrar_log(
@@ -526,3 +624,170 @@ class MessageResource(Resource):
             return {"error": "Erro ao excluir mensagem"}, 500
         
 
+
+
+class MessageBatchResource(Resource):
+    @jwt_required()
+    def post(self):
+        """Envia várias mensagens de uma vez (fila offline), de forma idempotente por client_msg_id"""
+        parser = reqparse.RequestParser()
+        parser.add_argument('mensagens', type=dict, action='append', required=True, location='json',
+                            help="Lista de mensagens é obrigatória")
+        args = parser.parse_args()
+
+        usuario_atual_id = get_jwt_identity()
+        itens = args['mensagens']
+
+        if len(itens) > LIMITE_MAXIMO_LOTE:
+            return {"error": f"Máximo de {LIMITE_MAXIMO_LOTE} mensagens por lote"}, 413
+
+        try:
+            resultados = [None] * len(itens)
+            validos = []
+            for indice, item in enumerate(itens):
+                client_msg_id = item.get('client_msg_id')
+                texto = item.get('texto')
+                try:
+                    conversa_id = UUID(str(item.get('conversa_id')))
+                except ValueError:
+                    conversa_id = None
+
+                if not client_msg_id or not isinstance(client_msg_id, str) or len(client_msg_id) > 64:
+                    erro = "client_msg_id inválido"
+                elif conversa_id is None:
+                    erro = "ID da conversa inválido"
+                elif not isinstance(texto, str) or not texto.strip():
+                    erro = "O texto da mensagem não pode estar vazio"
+                else:
+                    erro = None
+
+                if erro:
+                    resultados[indice] = {"client_msg_id": client_msg_id, "status": "erro", "error": erro}
+                else:
+                    validos.append((indice, client_msg_id, conversa_id, texto))
+
+            # Todas as conversas do lote numa única consulta
+            conversas = {}
+            ids_conversas = {conversa_id for _, _, conversa_id, _ in validos}
+            if ids_conversas:
+                for conversa in Conversa.query.filter(Conversa.id.in_(ids_conversas)).all():
+                    if conversa.participa(usuario_atual_id):
+                        conversas[conversa.id] = conversa
+
+            agora = datetime.now(timezone.utc)
+            linhas = []
+            indices_por_cliente = {}
+            for indice, client_msg_id, conversa_id, texto in validos:
+                if conversa_id not in conversas:
+                    resultados[indice] = {"client_msg_id": client_msg_id, "status": "erro",
+                                          "error": "Conversa não encontrada"}
+                    continue
+                if client_msg_id in indices_por_cliente:
+                    # Repetida dentro do próprio lote: resolvida junto com a primeira ocorrência
+                    indices_por_cliente[client_msg_id].append(indice)
+                    continue
+                indices_por_cliente[client_msg_id] = [indice]
+                linhas.append({
+                    "id": uuid4(),
+                    "id_conversa": conversa_id,
+                    "id_usuario": usuario_atual_id,
+                    "texto_criptografado": texto,
+                    # Microssegundos preservam a ordem do lote na paginação por data_envio
+                    "data_envio": agora + timedelta(microseconds=len(linhas)),
+                    "client_msg_id": client_msg_id
+                })
+
+            inseridas = {}
+            existentes = {}
+            if linhas:
+                inseridas = {
+                    linha.client_msg_id: linha
+                    for linha in db.session.execute(
+                        insert(Mensagem).values(linhas).on_conflict_do_nothing(
+                            constraint='unique_mensagem_cliente'
+                        ).returning(
+                            Mensagem.id, Mensagem.client_msg_id, Mensagem.id_conversa, Mensagem.data_envio
+                        )
+                    )
+                }
+                # Um upsert de versões e um INSERT para o lote inteiro, não dois por mensagem
+                registrar_alteracoes(
+                    [
+                        (participante, registro.id)
+                        for registro in inseridas.values()
+                        for participante in (conversas[registro.id_conversa].id_usuario1,
+                                             conversas[registro.id_conversa].id_usuario2)
+                    ],
+                    AlteracaoTipo.MENSAGEM_NOVA
+                )
+                repetidas = [linha["client_msg_id"] for linha in linhas if linha["client_msg_id"] not in inseridas]
+                if repetidas:
+                    existentes = {
+                        linha.client_msg_id: linha
+                        for linha in db.session.query(
+                            Mensagem.id, Mensagem.client_msg_id, Mensagem.id_conversa, Mensagem.data_envio
+                        ).filter(
+                            Mensagem.id_usuario == usuario_atual_id,
+                            Mensagem.client_msg_id.in_(repetidas)
+                        )
+                    }
+                db.session.commit()
+
+            for linha in linhas:
+                client_msg_id = linha["client_msg_id"]
+                if client_msg_id in inseridas:
+                    status, registro = "criada", inseridas[client_msg_id]
+                else:
+                    status, registro = "duplicada", existentes.get(client_msg_id)
+                for indice in indices_por_cliente[client_msg_id]:
+                    resultados[indice] = {
+                        "client_msg_id": client_msg_id,
+                        "status": status,
+                        "id": str(registro.id) if registro else None,
+                        "conversa_id": str(registro.id_conversa) if registro else None,
+                        "data_envio": registro.data_envio.isoformat() if registro else None
+                    }
+
+            textos = {linha["id"]: linha["texto_criptografado"] for linha in linhas}
+            for registro in inseridas.values():
+                destinatario_id = conversas[registro.id_conversa].outro_participante(usuario_atual_id)
+                socketio.emit('receive_message', {
+                    'mensagem_id': str(registro.id),
+                    'conversa_id': str(registro.id_conversa),
+                    'texto': textos[registro.id],
+                    'data_envio': registro.data_envio.isoformat(),
+                    'remetente_id': str(usuario_atual_id)
+                }, room=sala_usuario(destinatario_id))
+
+            total_erros = sum(1 for resultado in resultados if resultado["status"] == "erro")
+            registrar_log(
+                usuario_id=usuario_atual_id,
+                categoria=LogCategoria.MENSAGEM,
+                severidade=LogSeveridade.INFO,
+                acao="ENVIAR_MENSAGENS_LOTE",
+                detalhe=f"Lote com {len(itens)} mensagens",
+                metadados={
+                    "criadas": len(inseridas),
+                    "duplicadas": len(itens) - len(inseridas) - total_erros,
+                    "erros": total_erros
+                }
+            )
+
+            return {
+                "message": "Lote processado",
+                "resultados": resultados,
+                "criadas": len(inseridas),
+                "erros": total_erros
+            }, 200
+
+        except Exception as e:
+            db.session.rollback()
+            registrar_log(
+                usuario_id=usuario_atual_id,
+                categoria=LogCategoria.MENSAGEM,
+                severidade=LogSeveridade.ERRO,
+                acao="ENVIAR_MENSAGENS_LOTE_ERRO",
+                detalhe=str(e),
+                metadados={"quantidade": len(itens)}
+            )
+            return {"error": "Erro ao enviar lote de mensagens"}, 500
@@ -0,0 +1,24 @@
+import base64
+from datetime import datetime
+from uuid import UUID
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(data, id_registro):
+    """Gera um cursor opaco a partir do par (data, id) do último item retornado"""
+    bruto = f"{data.isoformat()}|{id_registro}"
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Converte um cursor gerado por codificar_cursor de volta para (data, UUID)"""
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        bruto = base64.urlsafe_b64decode(cursor + preenchimento).decode()
+        data, id_registro = bruto.split('|', 1)
+        return datetime.fromisoformat(data), UUID(id_registro)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CursorInvalido("Cursor inválido") from e
@@ -0,0 +1,149 @@
+from flask_restful import Resource, reqparse
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Response, stream_with_context
+from sqlalchemy import func
+from app.models import Usuario, Contato, Conversa, Mensagem, Alteracao, AlteracaoTipo, LogCategoria, LogSeveridade
+from app.extensions import db
+from app.auditoria import registrar_log
+import json
+
+LIMITE_PADRAO_ALTERACOES = 1000
+LIMITE_MAXIMO_ALTERACOES = 5000
+
+
+class SyncResource(Resource):
+    @jwt_required()
+    def get(self):
+        """Retorna tudo o que mudou para o usuário desde o cursor informado, numa única resposta"""
+        parser = reqparse.RequestParser()
+        parser.add_argument('since', type=str, default='0', help="Cursor da última sincronização", location='args')
+        parser.add_argument('limit', type=int, default=LIMITE_PADRAO_ALTERACOES, location='args')
+        args = parser.parse_args()
+
+        usuario_atual_id = get_jwt_identity()
+
+        cursor = (args['since'] or '0').strip()
+        try:
+            # "s<seq>": sequência do usuário; número puro: cursor antigo (id global de alteracoes)
+            legado = not cursor.startswith('s')
+            desde = int(cursor if legado else cursor[1:])
+        except ValueError:
+            return {"error": "Cursor inválido"}, 400
+        limite = max(1, min(args['limit'], LIMITE_MAXIMO_ALTERACOES))
+
+        try:
+            if legado and desde:
+                desde = db.session.query(func.max(Alteracao.seq)).filter(
+                    Alteracao.id_usuario == usuario_atual_id,
+                    Alteracao.id <= desde
+                ).scalar() or 0
+
+            alteracoes = db.session.query(
+                Alteracao.seq, Alteracao.tipo, Alteracao.id_objeto
+            ).filter(
+                Alteracao.id_usuario == usuario_atual_id,
+                Alteracao.seq > desde
+            ).order_by(Alteracao.seq).limit(limite + 1).all()
+
+            tem_mais = len(alteracoes) > limite
+            alteracoes = alteracoes[:limite]
+            novo_cursor = f"s{alteracoes[-1].seq if alteracoes else desde}"
+
+            # Só o último estado de cada objeto interessa
+            mensagens, mensagens_removidas = set(), set()
+            contatos, contatos_removidos = set(), set()
+            conversas = set()
+            for alteracao in alteracoes:
+                tipo, id_objeto = alteracao.tipo, alteracao.id_objeto
+                if tipo == AlteracaoTipo.MENSAGEM_NOVA.value:
+                    mensagens.add(id_objeto)
+                elif tipo == AlteracaoTipo.MENSAGEM_REMOVIDA.value:
+                    mensagens.discard(id_objeto)
+                    mensagens_removidas.add(id_objeto)
+                elif tipo in (AlteracaoTipo.CONTATO_NOVO.value, AlteracaoTipo.CONTATO_ATUALIZADO.value):
+                    contatos_removidos.discard(id_objeto)
+                    contatos.add(id_objeto)
+                elif tipo == AlteracaoTipo.CONTATO_REMOVIDO.value:
+                    contatos.discard(id_objeto)
+                    contatos_removidos.add(id_objeto)
+                elif tipo in (AlteracaoTipo.CONVERSA_NOVA.value, AlteracaoTipo.CONVERSA_ATUALIZADA.value):
+                    conversas.add(id_objeto)
+
+            registrar_log(
+                usuario_id=usuario_atual_id,
+                categoria=LogCategoria.SISTEMA,
+                severidade=LogSeveridade.INFO,
+                acao="SINCRONIZAR",
+                detalhe=f"{len(alteracoes)} alterações desde {cursor}",
+                metadados={"since": cursor, "cursor": novo_cursor}
+            )
+
+        except Exception as e:
+            registrar_log(
+                usuario_id=usuario_atual_id,
+                categoria=LogCategoria.SISTEMA,
+                severidade=LogSeveridade.ERRO,
+                acao="SINCRONIZAR_ERRO",
+                detalhe=str(e),
+                metadados={"since": args['since']}
+            )
+            return {"error": "Erro ao sincronizar"}, 500
+
+        def gerar():
+            yield '{"cursor": %s, "tem_mais": %s' % (json.dumps(novo_cursor), json.dumps(tem_mais))
+
+            yield ', "mensagens": ['
+            if mensagens:
+                consulta = Mensagem.query.filter(
+                    Mensagem.id.in_(mensagens)
+                ).order_by(Mensagem.data_envio, Mensagem.id).yield_per(500)
+                for indice, mensagem in enumerate(consulta):
+                    yield (',' if indice else '') + json.dumps({
+                        "id": str(mensagem.id),
+                        "id_conversa": str(mensagem.id_conversa),
+                        "texto": mensagem.texto_criptografado,
+                        "id_usuario": str(mensagem.id_usuario),
+                        "data_envio": mensagem.data_envio.isoformat() if mensagem.data_envio else None,
+                        "excluida": mensagem.exclusao
+                    })
+            yield ']'
+
+            yield ', "mensagens_removidas": ' + json.dumps([str(id_objeto) for id_objeto in mensagens_removidas])
+
+            yield ', "conversas": ['
+            if conversas:
+                consulta = Conversa.query.filter(Conversa.id.in_(conversas))
+                for indice, conversa in enumerate(consulta):
+                    yield (',' if indice else '') + json.dumps({
+                        "id": str(conversa.id),
+                        "outro_usuario": str(conversa.outro_participante(usuario_atual_id)),
+                        "data_criacao": conversa.data_criacao.isoformat() if conversa.data_criacao else None
+                    })
+            yield ']'
+
+            yield ', "contatos": ['
+            if contatos:
+                consulta = db.session.query(
+                    Contato, Usuario.nome, Usuario.email, Usuario.foto_perfil
+                ).join(
+                    Usuario,
+                    Usuario.id == Contato.id_contato
+                ).filter(
+                    Contato.id_usuario == usuario_atual_id,
+                    Contato.id_contato.in_(contatos)
+                )
+                for indice, (contato, nome, email, foto_perfil) in enumerate(consulta):
+                    yield (',' if indice else '') + json.dumps({
+                        "id": str(contato.id_contato),
+                        "nome": nome,
+                        "email": email,
+                        "foto_perfil": foto_perfil,
+                        "bloqueio": contato.bloqueio,
+                        "data_criacao": contato.data_criacao.isoformat() if contato.data_criacao else None
+                    })
+            yield ']'
+
+            yield ', "contatos_removidos": ' + json.dumps([str(id_objeto) for id_objeto in contatos_removidos])
+            yield '}'
+
+        return Response(stream_with_context(gerar()), mimetype='application/json')
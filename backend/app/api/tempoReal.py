@@ -1,52 +1,125 @@
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from flask import request
-from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from app.models import Usuario, Mensagem, Log, LogCategoria, LogSeveridade
+from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
+from flask import request, current_app
+from flask_jwt_extended import decode_token
+from app.models import Usuario, Conversa, Mensagem, EstadoConversa, LogCategoria, LogSeveridade, AlteracaoTipo
 from app.extensions import db
+from app.auditoria import registrar_log
+from app.sincronizacao import registrar_alteracao
+from app.presenca import presenca, sala_usuario
+from app.sessoes import sessoes
+from app.metricas import metricas
+from app.consultas import monitor_consultas
 from uuid import uuid4
-import json
-from enum import Enum
-from datetime import datetime
-
-def registrar_log(usuario_id, categoria, severidade, acao, detalhe=None, metadados=None, ip_origem=None):
-    """Função de log reutilizada"""
-    if ip_origem is None:
-        ip_origem = request.remote_addr if request else None
-    
-    try:
-        novo_log = Log(
-            id=uuid4(),
-            id_usuario=usuario_id,
-            categoria=categoria.value if isinstance(categoria, Enum) else categoria,
-            severidade=severidade.value if isinstance(severidade, Enum) else severidade,
-            acao=acao,
-            detalhe=detalhe,
-            ip_origem=ip_origem,
-            metadados=json.dumps(metadados) if metadados else None
-        )
-        
-        db.session.add(novo_log)
-        db.session.commit()
-        return True
-    except Exception as e:
-        db.session.rollback()
-        print(f"Erro ao registrar log: {str(e)}")
-        return False
+from datetime import datetime, timezone
+from functools import wraps
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
 
 
 class WebSocketHandler:
-    def __init__(self, socketio):
+    def __init__(self, socketio, app=None):
         self.socketio = socketio
-        self.connected_users = {}  
+        self.presenca = presenca
+        self.app = app or current_app._get_current_object()
+        # sid -> identidade verificada no connect (válida para todos os eventos da conexão)
+        self.identidades = {}
+        self._revalidacao_pid = None
+        self.app.extensions['websocket'] = self
+        # Logout/exclusão de conta em qualquer worker derrubam os sockets locais da sessão
+        sessoes.ao_revogar(self.revogar)
         self.setup_handlers()
 
+    def usuario_atual(self):
+        identidade = self.identidades.get(request.sid)
+        return identidade['usuario_id'] if identidade else None
+
+    def _autenticado(self, handler):
+        """Exige a identidade guardada no connect em vez de decodificar o JWT a cada evento"""
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            if request.sid not in self.identidades:
+                emit('error', {'error': 'Conexão não autenticada'})
+                disconnect()
+                return None
+            return handler(*args, **kwargs)
+        return wrapper
+
+    def _autenticar(self, auth):
+        # Só o payload de auth do handshake: token na URL acaba em logs de proxy e de acesso
+        token = auth.get('token') if isinstance(auth, dict) else None
+        if not token:
+            raise ConnectionRefusedError('Token ausente')
+
+        try:
+            claims = decode_token(token)
+        except Exception:
+            raise ConnectionRefusedError('Token inválido ou expirado')
+
+        if not sessoes.sessao_valida(claims['sub'], claims['jti']):
+            raise ConnectionRefusedError('Sessão não encontrada ou não verificada')
+
+        return {'usuario_id': claims['sub'], 'jti': claims['jti'], 'exp': claims.get('exp')}
+
+    def revogar(self, jti=None, usuario_id=None):
+        """Desconecta imediatamente os sockets locais de uma sessão ou de um usuário"""
+        for sid, identidade in list(self.identidades.items()):
+            if (jti and identidade['jti'] == jti) or (usuario_id and identidade['usuario_id'] == str(usuario_id)):
+                self._desconectar(sid)
+
+    def _desconectar(self, sid):
+        self.identidades.pop(sid, None)
+        self.socketio.emit('session_revoked', {'message': 'Sessão encerrada'}, to=sid)
+        self.socketio.server.disconnect(sid, namespace='/')
+
+    def _iniciar_revalidacao(self):
+        # Uma tarefa por processo (workers pré-forkados iniciam a sua no primeiro connect)
+        if self._revalidacao_pid == os.getpid():
+            return
+        self._revalidacao_pid = os.getpid()
+        self.socketio.start_background_task(self._revalidar_periodicamente)
+
+    def _revalidar_periodicamente(self):
+        intervalo = self.app.config.get('SOCKET_REVALIDACAO_INTERVALO', 60)
+        while True:
+            self.socketio.sleep(intervalo)
+            try:
+                with self.app.app_context():
+                    self.revalidar()
+            except Exception as e:
+                logger.error("Erro ao revalidar sessões de sockets: %s", e)
+
+    def revalidar(self):
+        """Derruba sockets cuja sessão foi encerrada (logout/exclusão) ou cujo token expirou"""
+        identidades = list(self.identidades.items())
+        if not identidades:
+            return
+
+        # Consultas ao banco só para jtis fora do cache de sessões
+        agora = time.time()
+        for sid, identidade in identidades:
+            expirado = identidade['exp'] is not None and identidade['exp'] <= agora
+            if expirado or not sessoes.sessao_valida(identidade['usuario_id'], identidade['jti']):
+                self._desconectar(sid)
+        db.session.remove()
+
     def setup_handlers(self):
         @self.socketio.on('connect')
-        @jwt_required()
-        def handle_connect():
+        @metricas.evento('connect')
+        @monitor_consultas.evento('connect')
+        def handle_connect(auth=None):
+            # Recusa a conexão (ConnectionRefusedError) se o token ou a sessão não forem válidos
+            identidade = self._autenticar(auth)
+
             try:
-                usuario_atual_id = get_jwt_identity()
-                self.connected_users[usuario_atual_id] = request.sid
+                usuario_atual_id = identidade['usuario_id']
+                self.identidades[request.sid] = identidade
+                self.presenca.registrar(usuario_atual_id, request.sid)
+                # Entregas ao usuário passam pela sala dele, que a fila compartilhada alcança em qualquer worker
+                join_room(sala_usuario(usuario_atual_id))
+                self._iniciar_revalidacao()
 
                 registrar_log(
                     usuario_id=usuario_atual_id,
@@ -58,19 +131,19 @@ class WebSocketHandler:
 
                 emit('connection_success', {'message': 'Conectado com sucesso'})
             except Exception as e:
+                self.identidades.pop(request.sid, None)
                 emit('connection_error', {'error': str(e)})
                 return False
 
         @self.socketio.on('disconnect')
-        def handle_disconnect():
-            usuario_atual_id = None
-            for user_id, sid in self.connected_users.items():
-                if sid == request.sid:
-                    usuario_atual_id = user_id
-                    break
+        @metricas.evento('disconnect')
+        @monitor_consultas.evento('disconnect')
+        def handle_disconnect(reason=None):
+            # reason: repassado pelas versões recentes do Flask-SocketIO (sem ele o handler seria chamado duas vezes)
+            self.identidades.pop(request.sid, None)
+            usuario_atual_id = self.presenca.remover(request.sid)
 
             if usuario_atual_id:
-                self.connected_users.pop(usuario_atual_id, None)
                 registrar_log(
                     usuario_id=usuario_atual_id,
                     categoria=LogCategoria.CONVERSA,
@@ -80,10 +153,12 @@ class WebSocketHandler:
                 )
 
         @self.socketio.on('join_conversation')
-        @jwt_required()
+        @metricas.evento('join_conversation')
+        @monitor_consultas.evento('join_conversation')
+        @self._autenticado
         def handle_join_conversation(data):
             try:
-                usuario_atual_id = get_jwt_identity()
+                usuario_atual_id = self.usuario_atual()
                 conversa_id = data.get('conversa_id')
 
                 if not conversa_id:
@@ -109,10 +184,12 @@ class WebSocketHandler:
                 emit('error', {'error': str(e)})
 
         @self.socketio.on('leave_conversation')
-        @jwt_required()
+        @metricas.evento('leave_conversation')
+        @monitor_consultas.evento('leave_conversation')
+        @self._autenticado
         def handle_leave_conversation(data):
             try:
-                usuario_atual_id = get_jwt_identity()
+                usuario_atual_id = self.usuario_atual()
                 conversa_id = data.get('conversa_id')
 
                 if not conversa_id:
@@ -137,11 +214,104 @@ class WebSocketHandler:
             except Exception as e:
                 emit('error', {'error': str(e)})
 
+        @self.socketio.on('send_message')
+        @metricas.evento('send_message')
+        @monitor_consultas.evento('send_message')
+        @self._autenticado
+        def handle_send_message(data):
+            """Persiste a mensagem, confirma ao remetente (ack) e entrega ao destinatário num único evento"""
+            data = data or {}
+            try:
+                usuario_atual_id = self.usuario_atual()
+                conversa_id = data.get('conversa_id')
+                texto = data.get('texto') or ''
+
+                if not conversa_id:
+                    return {'ok': False, 'error': 'ID da conversa é obrigatório'}
+
+                if not texto.strip():
+                    return {'ok': False, 'error': 'O texto da mensagem não pode estar vazio'}
+
+                conversa = Conversa.do_usuario(conversa_id, usuario_atual_id)
+                if not conversa:
+                    registrar_log(
+                        usuario_id=usuario_atual_id,
+                        categoria=LogCategoria.MENSAGEM,
+                        severidade=LogSeveridade.ALERTA,
+                        acao="ENVIAR_MENSAGEM_FALHA",
+                        detalhe="Conversa não encontrada",
+                        metadados={"conversa_id": conversa_id}
+                    )
+                    return {'ok': False, 'error': 'Conversa não encontrada'}
+
+                destinatario_id = conversa.outro_participante(usuario_atual_id)
+
+                # Id e data gerados aqui para não precisar reler a linha após o commit
+                mensagem_payload = {
+                    'mensagem_id': str(uuid4()),
+                    'conversa_id': str(conversa.id),
+                    'texto': texto,
+                    'data_envio': datetime.now(timezone.utc).isoformat(),
+                    'remetente_id': str(usuario_atual_id)
+                }
+
+                db.session.add(Mensagem(
+                    id=mensagem_payload['mensagem_id'],
+                    id_conversa=conversa.id,
+                    id_usuario=usuario_atual_id,
+                    texto_criptografado=texto,
+                    data_envio=datetime.fromisoformat(mensagem_payload['data_envio'])
+                ))
+                registrar_alteracao(
+                    [usuario_atual_id, destinatario_id],
+                    AlteracaoTipo.MENSAGEM_NOVA,
+                    mensagem_payload['mensagem_id']
+                )
+                db.session.commit()
+
+                emit('receive_message', mensagem_payload, room=sala_usuario(destinatario_id))
+                # Demais abas/dispositivos do remetente
+                emit('receive_message', mensagem_payload, room=sala_usuario(usuario_atual_id), skip_sid=request.sid)
+
+                registrar_log(
+                    usuario_id=usuario_atual_id,
+                    categoria=LogCategoria.MENSAGEM,
+                    severidade=LogSeveridade.INFO,
+                    acao="ENVIAR_MENSAGEM_SUCESSO",
+                    detalhe="Mensagem enviada via WebSocket",
+                    metadados={
+                        "conversa_id": mensagem_payload['conversa_id'],
+                        "mensagem_id": mensagem_payload['mensagem_id'],
+                        "destinatario_id": str(destinatario_id)
+                    }
+                )
+
+                return {
+                    'ok': True,
+                    'mensagem_id': mensagem_payload['mensagem_id'],
+                    'conversa_id': mensagem_payload['conversa_id'],
+                    'data_envio': mensagem_payload['data_envio']
+                }
+
+            except Exception as e:
+                db.session.rollback()
+                registrar_log(
+                    usuario_id=usuario_atual_id if 'usuario_atual_id' in locals() else None,
+                    categoria=LogCategoria.MENSAGEM,
+                    severidade=LogSeveridade.ERRO,
+                    acao="ENVIAR_MENSAGEM_ERRO",
+                    detalhe=str(e),
+                    metadados={"conversa_id": data.get('conversa_id')}
+                )
+                return {'ok': False, 'error': 'Erro ao enviar mensagem'}
+
         @self.socketio.on('new_message')
-        @jwt_required()
+        @metricas.evento('new_message')
+        @monitor_consultas.evento('new_message')
+        @self._autenticado
         def handle_new_message(data):
             try:
-                usuario_atual_id = get_jwt_identity()
+                usuario_atual_id = self.usuario_atual()
                 conversa_id = data.get('conversa_id')
                 mensagem_id = data.get('mensagem_id')
 
@@ -149,33 +319,30 @@ class WebSocketHandler:
                     emit('error', {'error': 'Dados incompletos'})
                     return
 
-                
-                mensagem = Mensagem.query.filter_by(
-                    id=mensagem_id,
-                    id_conversa=conversa_id
+                # Mensagem e conversa juntas, sem o carregamento preguiçoso de mensagem.conversa
+                linha = db.session.query(Mensagem, Conversa).join(
+                    Conversa,
+                    Conversa.id == Mensagem.id_conversa
+                ).filter(
+                    Mensagem.id == mensagem_id,
+                    Mensagem.id_conversa == conversa_id
                 ).first()
 
-                if not mensagem:
+                if not linha:
                     emit('error', {'error': 'Mensagem não encontrada'})
                     return
 
-                
-                conversa = mensagem.conversa
-                destinatario_id = conversa.id_usuario2 if conversa.id_usuario1 == usuario_atual_id else conversa.id_usuario1
+                mensagem, conversa = linha
+                destinatario_id = conversa.outro_participante(usuario_atual_id)
 
                 
-                if destinatario_id in self.connected_users:
-                    emit('receive_message', {
-                        'mensagem_id': str(mensagem.id),
-                        'conversa_id': str(mensagem.id_conversa),
-                        'texto': mensagem.texto_criptografado,
-                        'data_envio': mensagem.data_envio.isoformat(),
-                        'remetente_id': str(mensagem.id_usuario)
-                    }, room=self.connected_users[destinatario_id])
-
-                    
-                    mensagem.entregue = True
-                    db.session.commit()
+                emit('receive_message', {
+                    'mensagem_id': str(mensagem.id),
+                    'conversa_id': str(mensagem.id_conversa),
+                    'texto': mensagem.texto_criptografado,
+                    'data_envio': mensagem.data_envio.isoformat(),
+                    'remetente_id': str(mensagem.id_usuario)
+                }, room=sala_usuario(destinatario_id))
 
                 registrar_log(
                     usuario_id=usuario_atual_id,
@@ -202,11 +369,69 @@ class WebSocketHandler:
                     metadados=data
                 )
 
+        @self.socketio.on('mark_read_up_to')
+        @metricas.evento('mark_read_up_to')
+        @monitor_consultas.evento('mark_read_up_to')
+        @self._autenticado
+        def handle_mark_read_up_to(data):
+            """Marca como lidas todas as mensagens da conversa até uma mensagem ou instante"""
+            data = data or {}
+            try:
+                usuario_atual_id = self.usuario_atual()
+                conversa_id = data.get('conversa_id')
+
+                if not conversa_id:
+                    return {'ok': False, 'error': 'ID da conversa é obrigatório'}
+
+                conversa = Conversa.do_usuario(conversa_id, usuario_atual_id)
+                if not conversa:
+                    return {'ok': False, 'error': 'Conversa não encontrada'}
+
+                if data.get('mensagem_id'):
+                    lida_ate = db.session.query(Mensagem.data_envio).filter(
+                        Mensagem.id == data['mensagem_id'],
+                        Mensagem.id_conversa == conversa.id
+                    ).scalar()
+                    if lida_ate is None:
+                        return {'ok': False, 'error': 'Mensagem não encontrada'}
+                elif data.get('timestamp'):
+                    try:
+                        lida_ate = datetime.fromisoformat(data['timestamp'])
+                    except (TypeError, ValueError):
+                        return {'ok': False, 'error': 'Timestamp inválido'}
+                    if lida_ate.tzinfo is None:
+                        lida_ate = lida_ate.replace(tzinfo=timezone.utc)
+                    lida_ate = min(lida_ate, datetime.now(timezone.utc))
+                else:
+                    return {'ok': False, 'error': 'Informe mensagem_id ou timestamp'}
+
+                lida_ate = self._marcar_lida(usuario_atual_id, conversa, lida_ate)
+                return {
+                    'ok': True,
+                    'conversa_id': str(conversa.id),
+                    'lida_ate': lida_ate.isoformat() if lida_ate else None
+                }
+
+            except Exception as e:
+                db.session.rollback()
+                registrar_log(
+                    usuario_id=usuario_atual_id if 'usuario_atual_id' in locals() else None,
+                    categoria=LogCategoria.MENSAGEM,
+                    severidade=LogSeveridade.ERRO,
+                    acao="WEBSOCKET_MESSAGE_READ_ERROR",
+                    detalhe=str(e),
+                    metadados=data
+                )
+                return {'ok': False, 'error': 'Erro ao marcar mensagens como lidas'}
+
         @self.socketio.on('message_read')
-        @jwt_required()
+        @metricas.evento('message_read')
+        @monitor_consultas.evento('message_read')
+        @self._autenticado
         def handle_message_read(data):
+            """Compatibilidade: marca a conversa como lida até a mensagem informada"""
             try:
-                usuario_atual_id = get_jwt_identity()
+                usuario_atual_id = self.usuario_atual()
                 mensagem_id = data.get('mensagem_id')
 
                 if not mensagem_id:
@@ -214,38 +439,31 @@ class WebSocketHandler:
                     return
 
                 
-                mensagem = Mensagem.query.get(mensagem_id)
+                mensagem = db.session.query(
+                    Mensagem.id, Mensagem.id_usuario, Mensagem.data_envio, Conversa
+                ).join(
+                    Conversa,
+                    Conversa.id == Mensagem.id_conversa
+                ).filter(
+                    Mensagem.id == mensagem_id
+                ).first()
 
                 if not mensagem:
                     emit('error', {'error': 'Mensagem não encontrada'})
                     return
 
-                
-                conversa = mensagem.conversa
-                if usuario_atual_id not in [str(conversa.id_usuario1), str(conversa.id_usuario2)]:
+                if not mensagem.Conversa.participa(usuario_atual_id):
                     emit('error', {'error': 'Você não tem permissão para marcar esta mensagem como lida'})
                     return
 
-                
-                if mensagem.id_usuario != usuario_atual_id and not mensagem.data_visualizacao:
-                    mensagem.data_visualizacao = datetime.utcnow()
-                    db.session.commit()
-
-                    
-                    if str(mensagem.id_usuario) in self.connected_users:
-                        emit('message_read_confirmation', {
-                            'mensagem_id': str(mensagem.id),
-                            'data_visualizacao': mensagem.data_visualizacao.isoformat()
-                        }, room=self.connected_users[str(mensagem.id_usuario)])
+                self._marcar_lida(usuario_atual_id, mensagem.Conversa, mensagem.data_envio)
 
-                    registrar_log(
-                        usuario_id=usuario_atual_id,
-                        categoria=LogCategoria.MENSAGEM,
-                        severidade=LogSeveridade.INFO,
-                        acao="WEBSOCKET_MESSAGE_READ",
-                        detalhe="Mensagem marcada como lida",
-                        metadados={"mensagem_id": mensagem_id}
-                    )
+                # Clientes antigos do remetente só entendem a confirmação por mensagem
+                if str(mensagem.id_usuario) != str(usuario_atual_id):
+                    emit('message_read_confirmation', {
+                        'mensagem_id': str(mensagem.id),
+                        'data_visualizacao': datetime.now(timezone.utc).isoformat()
+                    }, room=sala_usuario(mensagem.id_usuario))
 
                 emit('read_success', {
                     'message': 'Mensagem marcada como lida',
@@ -264,5 +482,39 @@ class WebSocketHandler:
                     metadados=data
                 )
 
+    def _marcar_lida(self, usuario_id, conversa, lida_ate):
+        """
+        Avança a marca de leitura e avisa os participantes com um único evento.
+        Retorna a marca vigente, avançada ou não.
+        """
+        nova_marca = EstadoConversa.avancar(usuario_id, conversa.id, lida_ate)
+        if nova_marca is not None:
+            # lida_ate/nao_lidas mudam na listagem do leitor: invalida o ETag e entra na sincronização
+            registrar_alteracao([usuario_id], AlteracaoTipo.CONVERSA_ATUALIZADA, conversa.id)
+        db.session.commit()
 
-
+        if nova_marca is None:
+            # A marca já era igual ou posterior: nada a avisar
+            return db.session.query(EstadoConversa.lida_ate).filter_by(
+                id_usuario=usuario_id,
+                id_conversa=conversa.id
+            ).scalar()
+
+        confirmacao = {
+            'conversa_id': str(conversa.id),
+            'leitor_id': str(usuario_id),
+            'lida_ate': nova_marca.isoformat()
+        }
+        self.socketio.emit('messages_read_up_to', confirmacao, room=sala_usuario(conversa.outro_participante(usuario_id)))
+        # Demais dispositivos do leitor atualizam o contador de não lidas
+        self.socketio.emit('messages_read_up_to', confirmacao, room=sala_usuario(usuario_id), skip_sid=request.sid)
+
+        registrar_log(
+            usuario_id=usuario_id,
+            categoria=LogCategoria.MENSAGEM,
+            severidade=LogSeveridade.INFO,
+            acao="WEBSOCKET_MESSAGE_READ",
+            detalhe="Conversa marcada como lida",
+            metadados=confirmacao
+        )
+        return nova_marca
@@ -0,0 +1,380 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from enum import Enum
+from uuid import uuid4
+
+from flask import has_request_context, request
+from app.extensions import db
+from app.models import Log, LogCategoria, LogSeveridade
+
+logger = logging.getLogger(__name__)
+
+POLITICAS_OVERFLOW = ('block', 'drop_info', 'spill')
+
+_ORDEM_SEVERIDADE = {severidade.value: ordem for ordem, severidade in enumerate(LogSeveridade)}
+_NOME_CATEGORIA = {categoria.value: categoria.name for categoria in LogCategoria}
+
+
+def _ler_mapa(valor):
+    """Aceita dict ou texto "CHAVE=valor,OUTRA=valor" (formato das variáveis de ambiente)"""
+    if isinstance(valor, dict):
+        return dict(valor)
+    mapa = {}
+    for item in (valor or '').split(','):
+        if '=' in item:
+            chave, conteudo = item.split('=', 1)
+            mapa[chave.strip()] = conteudo.strip()
+    return mapa
+
+
+def _ler_conjunto(valor):
+    if isinstance(valor, (set, list, tuple)):
+        return set(valor)
+    return {item.strip() for item in (valor or '').split(',') if item.strip()}
+
+
+class PoliticaAuditoria:
+    """
+    Decide o que de fato vira linha em logs.
+
+    Para cada entrada, na ordem:
+    - categorias de segurança (AUDITORIA_CATEGORIAS_SEGURANCA) e eventos de
+      severidade ALERTA ou maior nunca são amostrados nem agregados;
+    - severidade abaixo do mínimo configurado para a ação, a categoria ou
+      "*" (AUDITORIA_NIVEIS) é descartada, exceto nas categorias de segurança;
+    - ações INFO em AUDITORIA_AGREGAR viram contadores por (usuário,
+      categoria, ação), gravados como uma linha a cada
+      AUDITORIA_AGREGACAO_INTERVALO segundos;
+    - ações INFO em AUDITORIA_AMOSTRAGEM são gravadas com a probabilidade
+      configurada, anotando a taxa em metadados para extrapolação.
+    """
+
+    def __init__(self):
+        self.niveis = {}
+        self.amostragem = {}
+        self.agregar = set()
+        self.seguranca = {LogCategoria.AUTENTICACAO.name, LogCategoria.CONTA.name}
+        self.intervalo = 60.0
+        self.max_chaves = 10000
+        self._contadores = {}
+        self._inicio_janela = time.monotonic()
+        self._lock = threading.Lock()
+        self.estatisticas = {"gravados": 0, "descartados": 0, "fora_da_amostra": 0, "agregados": 0}
+
+    def init_app(self, app):
+        self.niveis = {
+            chave: LogSeveridade[nome].value
+            for chave, nome in _ler_mapa(app.config.get('AUDITORIA_NIVEIS')).items()
+        }
+        self.amostragem = {
+            acao: float(taxa)
+            for acao, taxa in _ler_mapa(app.config.get('AUDITORIA_AMOSTRAGEM')).items()
+        }
+        self.agregar = _ler_conjunto(app.config.get('AUDITORIA_AGREGAR'))
+        self.seguranca = _ler_conjunto(app.config.get('AUDITORIA_CATEGORIAS_SEGURANCA', 'AUTENTICACAO,CONTA'))
+        self.intervalo = app.config.get('AUDITORIA_AGREGACAO_INTERVALO', 60.0)
+        self.max_chaves = app.config.get('AUDITORIA_AGREGACAO_MAX_CHAVES', 10000)
+
+    def avaliar(self, entrada):
+        """Retorna a entrada a gravar ou None (descartada, fora da amostra ou agregada)"""
+        acao = entrada['acao']
+        categoria = _NOME_CATEGORIA.get(entrada['categoria'], entrada['categoria'])
+        severidade = _ORDEM_SEVERIDADE.get(entrada['severidade'], 0)
+
+        if categoria in self.seguranca:
+            return self._gravar(entrada)
+
+        minimo = self.niveis.get(acao) or self.niveis.get(categoria) or self.niveis.get('*')
+        if minimo is not None and severidade < _ORDEM_SEVERIDADE[minimo]:
+            self._contar("descartados")
+            return None
+
+        if severidade > _ORDEM_SEVERIDADE[LogSeveridade.INFO.value]:
+            return self._gravar(entrada)
+
+        if acao in self.agregar:
+            self._acumular(entrada)
+            return None
+
+        taxa = self.amostragem.get(acao)
+        if taxa is not None and taxa < 1.0:
+            if random.random() >= taxa:
+                self._contar("fora_da_amostra")
+                return None
+            entrada['metadados'] = dict(entrada['metadados'] or {}, amostragem=taxa)
+
+        return self._gravar(entrada)
+
+    def _contar(self, chave, quantidade=1):
+        # avaliar() roda nas threads de requisição: += em dict não é atômico
+        with self._lock:
+            self.estatisticas[chave] += quantidade
+
+    def _gravar(self, entrada):
+        self._contar("gravados")
+        return entrada
+
+    def _acumular(self, entrada):
+        chave = (entrada['id_usuario'], entrada['categoria'], entrada['acao'])
+        with self._lock:
+            contador = self._contadores.get(chave)
+            if contador is None:
+                self._contadores[chave] = [1, entrada['timestamp'], entrada['timestamp']]
+            else:
+                contador[0] += 1
+                contador[2] = entrada['timestamp']
+            self.estatisticas["agregados"] += 1
+
+    def drenar(self, forcar=False):
+        """Entradas com os contadores da janela, se ela terminou (ou se forcar/lotou)"""
+        agora = time.monotonic()
+        with self._lock:
+            if not self._contadores:
+                self._inicio_janela = agora
+                return []
+            vencida = agora - self._inicio_janela >= self.intervalo
+            if not (forcar or vencida or len(self._contadores) >= self.max_chaves):
+                return []
+            contadores, self._contadores = self._contadores, {}
+            self._inicio_janela = agora
+
+        entradas = []
+        for (usuario_id, categoria, acao), (total, desde, ate) in contadores.items():
+            entradas.append({
+                'id': uuid4(),
+                'id_usuario': usuario_id,
+                'categoria': categoria,
+                'severidade': LogSeveridade.INFO.value,
+                'acao': acao,
+                'detalhe': f"{total} ocorrência(s) agregada(s)",
+                'ip_origem': None,
+                'timestamp': ate,
+                'metadados': {"agregado": total, "desde": desde.isoformat(), "ate": ate.isoformat()}
+            })
+        self._contar("gravados", len(entradas))
+        return entradas
+
+
+class AuditLogWriter:
+    """
+    Escritor assíncrono da tabela de logs.
+
+    As entradas são colocadas numa fila limitada em memória e uma thread em
+    segundo plano grava em lote (INSERT de várias linhas) quando o lote atinge
+    AUDIT_LOG_BATCH_SIZE ou quando passa AUDIT_LOG_FLUSH_INTERVAL segundos.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._fila = None
+        self._thread = None
+        self._pid = None
+        self._atexit_registrado = False
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self._lock_spill = threading.Lock()
+        self.politica = PoliticaAuditoria()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.assincrono = app.config.get('AUDIT_LOG_ASYNC', True)
+        self.tamanho_lote = app.config.get('AUDIT_LOG_BATCH_SIZE', 200)
+        self.intervalo = app.config.get('AUDIT_LOG_FLUSH_INTERVAL', 1.0)
+        self.overflow = app.config.get('AUDIT_LOG_OVERFLOW', 'block')
+        self.timeout_bloqueio = app.config.get('AUDIT_LOG_BLOCK_TIMEOUT', 5.0)
+        self.arquivo_spill = app.config.get('AUDIT_LOG_SPILL_PATH', 'logs/auditoria_spill.jsonl')
+        self.politica.init_app(app)
+
+        if self.overflow not in POLITICAS_OVERFLOW:
+            raise ValueError(f"AUDIT_LOG_OVERFLOW inválido: {self.overflow}")
+
+        self._fila = queue.Queue(maxsize=app.config.get('AUDIT_LOG_QUEUE_SIZE', 10000))
+        app.extensions['audit_log'] = self
+        # Cada create_app() (testes, CLI) chama init_app: um único hook basta
+        with self._lock:
+            if not self._atexit_registrado:
+                atexit.register(self.parar)
+                self._atexit_registrado = True
+
+    # ------------------------------------------------------------------
+    # Produção de entradas
+    # ------------------------------------------------------------------
+
+    def enfileirar(self, entrada):
+        """Entrega uma entrada para gravação. Retorna False se ela foi descartada."""
+        if self.app is None or not self.assincrono:
+            return self._gravar_sincrono([entrada] + self.politica.drenar())
+
+        self._garantir_thread()
+
+        try:
+            self._fila.put_nowait(entrada)
+            return True
+        except queue.Full:
+            return self._tratar_overflow(entrada)
+
+    def agendar_agregados(self):
+        """Garante que contadores da política sejam gravados mesmo sem novas entradas"""
+        if self.app is None or not self.assincrono:
+            agregados = self.politica.drenar()
+            if agregados:
+                self._gravar_sincrono(agregados)
+        else:
+            self._garantir_thread()
+
+    def _tratar_overflow(self, entrada):
+        if self.overflow == 'spill':
+            self._spill([entrada])
+            return True
+
+        if self.overflow == 'drop_info' and entrada['severidade'] == LogSeveridade.INFO.value:
+            return False
+
+        try:
+            self._fila.put(entrada, timeout=self.timeout_bloqueio)
+            return True
+        except queue.Full:
+            # Último recurso: não perder eventos que não são INFO
+            self._spill([entrada])
+            return True
+
+    def _garantir_thread(self):
+        # A thread é criada sob demanda para sobreviver a fork de workers
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._parar.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._executar,
+                name='audit-log-writer',
+                daemon=True
+            )
+            self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Consumo e gravação em lote
+    # ------------------------------------------------------------------
+
+    def _executar(self):
+        while not self._parar.is_set():
+            lote = self._coletar_lote() + self.politica.drenar()
+            if lote:
+                self._gravar(lote)
+        self._drenar()
+
+    def _coletar_lote(self):
+        lote = []
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tamanho_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _drenar(self):
+        lote = self.politica.drenar(forcar=True)
+        while True:
+            try:
+                lote.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+            if len(lote) >= self.tamanho_lote:
+                self._gravar(lote)
+                lote = []
+        if lote:
+            self._gravar(lote)
+
+    def _gravar(self, lote):
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(Log.__table__.insert(), lote)
+        except Exception as e:
+            logger.error("Erro ao gravar lote de %d logs: %s", len(lote), e)
+            self._spill(lote)
+
+    def _gravar_sincrono(self, lote):
+        try:
+            db.session.execute(Log.__table__.insert(), lote)
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Erro ao registrar log: %s", e)
+            return False
+
+    def _spill(self, lote):
+        """Grava entradas em arquivo local (JSON por linha) quando o banco não as aceita."""
+        try:
+            pasta = os.path.dirname(self.arquivo_spill)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            with self._lock_spill, open(self.arquivo_spill, 'a', encoding='utf-8') as arquivo:
+                for entrada in lote:
+                    arquivo.write(json.dumps(entrada, default=str) + '\n')
+        except OSError as e:
+            logger.error("Erro ao gravar logs em %s: %s", self.arquivo_spill, e)
+
+    def parar(self, timeout=10.0):
+        """Encerra a thread garantindo que a fila seja gravada antes de sair."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._parar.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def tamanho_fila(self):
+        return self._fila.qsize() if self._fila is not None else 0
+
+
+audit_log = AuditLogWriter()
+
+
+def registrar_log(usuario_id, categoria, severidade, acao, detalhe=None, metadados=None, ip_origem=None):
+    """
+    Registra uma ação no sistema de logs aprimorado
+    :param usuario_id: UUID do usuário que realizou a ação
+    :param categoria: Categoria do log (usar LogCategoria)
+    :param severidade: Nível de severidade (usar LogSeveridade)
+    :param acao: Descrição da ação (máx. 255 chars)
+    :param detalhe: Detalhes adicionais (opcional)
+    :param metadados: Dados adicionais como dict, gravado em JSONB (opcional)
+    :param ip_origem: Endereço IP de origem (capturado automaticamente se None)
+    """
+    if ip_origem is None and has_request_context():
+        ip_origem = request.remote_addr
+
+    entrada = {
+        'id': uuid4(),
+        'id_usuario': usuario_id,
+        'categoria': categoria.value if isinstance(categoria, Enum) else categoria,
+        'severidade': severidade.value if isinstance(severidade, Enum) else severidade,
+        'acao': acao,
+        'detalhe': detalhe,
+        'ip_origem': ip_origem,
+        'timestamp': datetime.now(timezone.utc),
+        'metadados': metadados or None
+    }
+
+    entrada = audit_log.politica.avaliar(entrada)
+    if entrada is None:
+        audit_log.agendar_agregados()
+        return False
+    return audit_log.enfileirar(entrada)
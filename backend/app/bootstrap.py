@@ -0,0 +1,58 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import inspect
+from sqlalchemy.engine import make_url
+
+# Primeira revisão: equivale ao esquema que db.create_all criava antes das migrações
+REVISAO_ESQUEMA_INICIAL = 'eb43d3af751e'
+
+
+def criar_banco_se_nao_existir(url_banco):
+    """Cria o banco de SQLALCHEMY_DATABASE_URI conectando-se ao banco de manutenção 'postgres'"""
+    import psycopg2
+    from psycopg2 import sql
+
+    url = make_url(url_banco)
+    conn = psycopg2.connect(
+        dbname='postgres',
+        user=url.username,
+        password=url.password,
+        host=url.host,
+        port=url.port or 5432
+    )
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (url.database,))
+            if cur.fetchone():
+                return False
+            cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(url.database)))
+            return True
+    finally:
+        conn.close()
+
+
+@click.command('db-bootstrap')
+@click.option('--sem-criar-banco', is_flag=True, help="Não tenta criar o banco (usuário sem CREATEDB)")
+@with_appcontext
+def comando_db_bootstrap(sem_criar_banco):
+    """Cria o banco se preciso e aplica todas as migrações"""
+    from flask_migrate import stamp, upgrade
+    from app.extensions import db
+
+    if not sem_criar_banco:
+        nome = make_url(current_app.config['SQLALCHEMY_DATABASE_URI']).database
+        if criar_banco_se_nao_existir(current_app.config['SQLALCHEMY_DATABASE_URI']):
+            click.echo(f'[✓] Banco de dados "{nome}" criado com sucesso.')
+        else:
+            click.echo(f'[i] Banco de dados "{nome}" já existe.')
+
+    tabelas = set(inspect(db.engine).get_table_names())
+    if 'usuarios' in tabelas and 'alembic_version' not in tabelas:
+        # Banco criado pelo antigo db.create_all: parte do esquema inicial
+        click.echo(f'[i] Esquema sem controle de versão, marcando como {REVISAO_ESQUEMA_INICIAL}.')
+        stamp(revision=REVISAO_ESQUEMA_INICIAL)
+
+    upgrade()
+    click.echo('[✓] Esquema atualizado.')
@@ -0,0 +1,138 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_AUSENTE = object()
+
+
+class CacheTTL:
+    """Cache LRU em memória, limitado em tamanho e com expiração por item"""
+
+    def __init__(self, tamanho_maximo=10000, ttl=300):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+
+    def obter(self, chave, padrao=None, contar=True):
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave, _AUSENTE)
+            if item is _AUSENTE or item[1] <= agora:
+                if item is not _AUSENTE:
+                    del self._itens[chave]
+                if contar:
+                    self.falhas += 1
+                return padrao
+            self._itens.move_to_end(chave)
+            if contar:
+                self.acertos += 1
+            return item[0]
+
+    def contem(self, chave, contar=True):
+        """contar=False para consultas de rotina que não devem pesar na taxa de acertos"""
+        return self.obter(chave, _AUSENTE, contar=contar) is not _AUSENTE
+
+    def definir(self, chave, valor, ttl=None):
+        expira_em = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def remover(self, chave):
+        with self._lock:
+            if self._itens.pop(chave, _AUSENTE) is not _AUSENTE:
+                self.remocoes += 1
+
+    def remover_se(self, predicado):
+        """Remove todos os itens cujo (chave, valor) satisfaz o predicado"""
+        with self._lock:
+            chaves = [chave for chave, (valor, _) in self._itens.items() if predicado(chave, valor)]
+            for chave in chaves:
+                del self._itens[chave]
+            self.remocoes += len(chaves)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self):
+        consultas = self.acertos + self.falhas
+        return {
+            "tamanho": len(self._itens),
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "remocoes": self.remocoes,
+            "taxa_acerto": self.acertos / consultas if consultas else 0.0
+        }
+
+
+class CanalLocal:
+    """Canal de invalidação restrito ao processo atual"""
+
+    distribuido = False
+
+    def __init__(self):
+        self._assinantes = []
+
+    def assinar(self, callback):
+        self._assinantes.append(callback)
+
+    def publicar(self, mensagem):
+        for callback in self._assinantes:
+            callback(mensagem)
+
+
+class CanalRedis(CanalLocal):
+    """Canal de invalidação entre workers/nós via Redis pub/sub"""
+
+    distribuido = True
+
+    def __init__(self, url, nome):
+        super().__init__()
+        import redis
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._nome = nome
+        self._thread = None
+
+    def assinar(self, callback):
+        super().assinar(callback)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._escutar, name=f'canal-{self._nome}', daemon=True)
+            self._thread.start()
+
+    def publicar(self, mensagem):
+        # Os assinantes locais também recebem pela assinatura do próprio canal
+        self._redis.publish(self._nome, json.dumps(mensagem))
+
+    def _escutar(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._nome)
+                for evento in pubsub.listen():
+                    mensagem = json.loads(evento['data'])
+                    for callback in self._assinantes:
+                        callback(mensagem)
+            except Exception as e:
+                logger.error("Canal %s interrompido: %s", self._nome, e)
+                time.sleep(1)
+
+
+def criar_canal(app, nome):
+    """Canal configurado por CACHE_CANAL_BACKEND (memoria | redis)"""
+    tipo = app.config.get('CACHE_CANAL_BACKEND', 'memoria')
+    if tipo == 'redis':
+        return CanalRedis(app.config['CACHE_REDIS_URL'], nome)
+    if tipo == 'memoria':
+        return CanalLocal()
+    raise ValueError(f"CACHE_CANAL_BACKEND inválido: {tipo}")
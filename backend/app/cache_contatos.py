@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+
+from app.cache import CacheTTL, criar_canal
+
+logger = logging.getLogger(__name__)
+
+
+class CacheContatos:
+    """
+    Cache das listas e dos detalhes de contatos, por usuário.
+
+    Os valores ficam num LRU com TTL em cada processo; as invalidações
+    (escritas do dono, mudança de perfil do contato, conversa criada) passam
+    pelo canal configurado em CACHE_CANAL_BACKEND e chegam a todos os workers.
+
+    Uma leitura só é guardada se nenhuma invalidação aconteceu entre o início
+    da consulta e o guardar (geracao), para não reinserir dados já vencidos.
+    """
+
+    def __init__(self, app=None):
+        self._listas = CacheTTL()
+        self._detalhes = CacheTTL()
+        self._canal = None
+        self._geracao = 0
+        self._lock = threading.Lock()
+        self.invalidacoes = 0
+        self.descartes_por_corrida = 0
+        self.servidos = 0
+        self.idade_total = 0.0
+        self.idade_maxima = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        tamanho = app.config.get('CONTATOS_CACHE_TAMANHO', 5000)
+        ttl = app.config.get('CONTATOS_CACHE_TTL', 300)
+        self._listas = CacheTTL(tamanho_maximo=tamanho, ttl=ttl)
+        self._detalhes = CacheTTL(tamanho_maximo=tamanho, ttl=ttl)
+        self._canal = criar_canal(app, 'contatos')
+        self._canal.assinar(self._aplicar)
+        app.extensions['cache_contatos'] = self
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    @property
+    def geracao(self):
+        """Capturar antes da consulta e repassar ao guardar_*"""
+        return self._geracao
+
+    def obter_lista(self, usuario_id):
+        return self._servir(self._listas.obter(str(usuario_id)))
+
+    def guardar_lista(self, usuario_id, contatos, geracao):
+        ids = {contato["id"] for contato in contatos}
+        self._guardar(self._listas, str(usuario_id), {"valor": contatos, "ids": ids}, geracao)
+
+    def obter_detalhe(self, usuario_id, contato_id):
+        return self._servir(self._detalhes.obter((str(usuario_id), str(contato_id))))
+
+    def guardar_detalhe(self, usuario_id, contato_id, detalhe, geracao):
+        self._guardar(self._detalhes, (str(usuario_id), str(contato_id)), {"valor": detalhe}, geracao)
+
+    def _servir(self, entrada):
+        if entrada is None:
+            return None
+        idade = time.monotonic() - entrada["criado_em"]
+        self.servidos += 1
+        self.idade_total += idade
+        self.idade_maxima = max(self.idade_maxima, idade)
+        return entrada["valor"]
+
+    def _guardar(self, cache, chave, entrada, geracao):
+        entrada["criado_em"] = time.monotonic()
+        with self._lock:
+            if geracao != self._geracao:
+                self.descartes_por_corrida += 1
+                return
+            cache.definir(chave, entrada)
+
+    # ------------------------------------------------------------------
+    # Invalidação (chamar depois do commit)
+    # ------------------------------------------------------------------
+
+    def invalidar_dono(self, usuario_id, contato_id=None):
+        """O usuário mudou a própria lista (adicionou, bloqueou, removeu)"""
+        self._publicar({"tipo": "dono", "usuario": str(usuario_id), "contato": str(contato_id) if contato_id else None})
+
+    def invalidar_usuario(self, usuario_id):
+        """Nome/foto/e-mail do usuário mudaram: vale para todas as listas em que ele aparece"""
+        self._publicar({"tipo": "usuario", "usuario": str(usuario_id)})
+
+    def invalidar_conversa(self, usuario1, usuario2):
+        """tem_conversa/conversa_id mudaram no detalhe de cada participante"""
+        self._publicar({"tipo": "conversa", "usuarios": [str(usuario1), str(usuario2)]})
+
+    def _publicar(self, mensagem):
+        # Aplica já neste processo (ler a própria escrita); o eco vindo do Redis é inofensivo
+        self._aplicar(mensagem)
+        if self._canal is not None and self._canal.distribuido:
+            try:
+                self._canal.publicar(mensagem)
+            except Exception as e:
+                logger.error("Erro ao publicar invalidação de contatos: %s", e)
+
+    def _aplicar(self, mensagem):
+        with self._lock:
+            self._geracao += 1
+        self.invalidacoes += 1
+
+        if mensagem["tipo"] == "dono":
+            self._listas.remover(mensagem["usuario"])
+            if mensagem["contato"]:
+                self._detalhes.remover((mensagem["usuario"], mensagem["contato"]))
+            else:
+                self._detalhes.remover_se(lambda chave, _: chave[0] == mensagem["usuario"])
+        elif mensagem["tipo"] == "usuario":
+            usuario_id = mensagem["usuario"]
+            self._listas.remover_se(lambda chave, entrada: chave == usuario_id or usuario_id in entrada["ids"])
+            self._detalhes.remover_se(lambda chave, _: usuario_id in chave)
+        elif mensagem["tipo"] == "conversa":
+            usuario1, usuario2 = mensagem["usuarios"]
+            self._detalhes.remover((usuario1, usuario2))
+            self._detalhes.remover((usuario2, usuario1))
+
+    def estatisticas(self):
+        return {
+            "listas": self._listas.estatisticas(),
+            "detalhes": self._detalhes.estatisticas(),
+            "invalidacoes": self.invalidacoes,
+            "descartes_por_corrida": self.descartes_por_corrida,
+            # Idade dos valores entregues: quanto tempo depois da consulta ao banco foram servidos
+            "idade_media_servida": self.idade_total / self.servidos if self.servidos else 0.0,
+            "idade_maxima_servida": self.idade_maxima
+        }
+
+
+cache_contatos = CacheContatos()
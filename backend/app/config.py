@@ -1,3 +1,4 @@
+import json
 import os
 from datetime import timedelta
 from dotenv import load_dotenv
@@ -7,6 +8,18 @@ load_dotenv()
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # UUIDs e datas em metadados (JSONB) viram texto em vez de derrubar o lote de logs
+    SQLALCHEMY_ENGINE_OPTIONS = {"json_serializer": lambda valor: json.dumps(valor, default=str)}
+    # Pool de conexões (completam SQLALCHEMY_ENGINE_OPTIONS em create_app, ver app/pool.py)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('true', '1', 't')
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '15000'))  # 0 = sem limite
+    DB_APPLICATION_NAME = os.getenv('DB_APPLICATION_NAME', 'nexsay')
+    # PgBouncer em pool_mode=transaction: sem estado de sessão (timeout via SET LOCAL)
+    DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').lower() in ('true', '1', 't')
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads/fotos_posts')
     SECRET_KEY = os.getenv('SECRET_KEY')
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
@@ -21,6 +34,39 @@ class Config:
     SOCKETIO_ENGINEIO_LOGGER = os.getenv('SOCKETIO_ENGINEIO_LOGGER', 'false').lower() in ('true', '1', 't')
     SOCKETIO_PING_TIMEOUT = int(os.getenv('SOCKETIO_PING_TIMEOUT', '60'))
     SOCKETIO_PING_INTERVAL = int(os.getenv('SOCKETIO_PING_INTERVAL', '25'))
+    # Fila compartilhada entre workers (ex.: redis://localhost:6379/0); vazio = processo único
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE') or None
+    SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'flask-socketio')
+    # Intervalo (s) para derrubar sockets de sessões encerradas em outros workers
+    SOCKET_REVALIDACAO_INTERVALO = int(os.getenv('SOCKET_REVALIDACAO_INTERVALO', '60'))
+
+    # servidor.py (produção, eventlet)
+    SERVIDOR_HOST = os.getenv('SERVIDOR_HOST', '0.0.0.0')
+    SERVIDOR_PORTA = int(os.getenv('SERVIDOR_PORTA', '5000'))
+    SERVIDOR_WORKERS = int(os.getenv('SERVIDOR_WORKERS', '1'))
+    SERVIDOR_BACKLOG = int(os.getenv('SERVIDOR_BACKLOG', '2048'))
+    # Green threads simultâneas por worker (cada socket aberto ocupa uma)
+    SERVIDOR_MAX_CONEXOES = int(os.getenv('SERVIDOR_MAX_CONEXOES', '10000'))
+    # Segundos para requisições em andamento terminarem após SIGTERM, antes de derrubar os sockets
+    SERVIDOR_TEMPO_ENCERRAMENTO = float(os.getenv('SERVIDOR_TEMPO_ENCERRAMENTO', '10'))
+
+    # /metrics (Prometheus). Com workers pré-forkados defina também PROMETHEUS_MULTIPROC_DIR
+    METRICAS_HABILITADAS = os.getenv('METRICAS_HABILITADAS', 'true').lower() in ('true', '1', 't')
+    METRICAS_INTERVALO = float(os.getenv('METRICAS_INTERVALO', '15'))  # leitura de filas, pool e presença
+    METRICAS_TOKEN = os.getenv('METRICAS_TOKEN')  # se definido, exige Authorization: Bearer <token>
+
+    # Orçamento de consultas SQL por escopo. Chaves: endpoint (api.conversationresource),
+    # evento Socket.IO (socket:send_message) ou "*"; 0 = sem limite
+    SQL_ORCAMENTOS = os.getenv('SQL_ORCAMENTOS', '*=30')
+    # Mesma instrução repetida este número de vezes no escopo = provável N+1 (0 desliga)
+    SQL_REPETICOES_N1 = int(os.getenv('SQL_REPETICOES_N1', '5'))
+    # Estouro vira exceção (OrcamentoConsultasExcedido) em vez de aviso no log; use nos testes
+    SQL_ORCAMENTO_ESTRITO = os.getenv('SQL_ORCAMENTO_ESTRITO', 'false').lower() in ('true', '1', 't')
+
+    PRESENCA_BACKEND = os.getenv('PRESENCA_BACKEND', 'memoria')  # memoria | redis
+    PRESENCA_REDIS_URL = os.getenv('PRESENCA_REDIS_URL') or SOCKETIO_MESSAGE_QUEUE
+    # Segundos sem batimento até os sids de um worker morto serem removidos (renovado a cada TTL/3)
+    PRESENCA_TTL = int(os.getenv('PRESENCA_TTL', '60'))
 
     MAIL_SERVER = os.getenv('MAIL_SERVER')
     MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
@@ -31,5 +77,62 @@ class Config:
     MAIL_DEBUG = os.getenv('MAIL_DEBUG', 'false').lower() in ('true', '1', 't')
     MAIL_DEFAULT_CHARSET = 'utf-8'
     MAIL_ASCII_ATTACHMENTS = False  
+    # Fila de envio (EMAIL_FILA_ASYNC=false envia durante a requisição, útil em testes com aiosmtpd)
+    EMAIL_FILA_ASYNC = os.getenv('EMAIL_FILA_ASYNC', 'true').lower() in ('true', '1', 't')
+    EMAIL_FILA_TAMANHO = int(os.getenv('EMAIL_FILA_TAMANHO', '1000'))
+    EMAIL_WORKERS = int(os.getenv('EMAIL_WORKERS', '2'))
+    EMAIL_MAX_TENTATIVAS = int(os.getenv('EMAIL_MAX_TENTATIVAS', '5'))
+    EMAIL_BACKOFF_BASE = float(os.getenv('EMAIL_BACKOFF_BASE', '2.0'))
+    EMAIL_BACKOFF_MAXIMO = float(os.getenv('EMAIL_BACKOFF_MAXIMO', '300'))
+    # Segundos sem envios até o worker fechar a conexão SMTP reaproveitada
+    EMAIL_CONEXAO_OCIOSA = float(os.getenv('EMAIL_CONEXAO_OCIOSA', '30'))
+
+    # Custo do bcrypt; hashes com outro custo são refeitos no próximo login
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', '12'))
+    # Processos dedicados ao bcrypt (0 = na thread da requisição) e limite de espera antes do 503
+    SENHA_WORKERS = int(os.getenv('SENHA_WORKERS', str(os.cpu_count() or 1)))
+    SENHA_FILA_MAXIMA = int(os.getenv('SENHA_FILA_MAXIMA', '32'))
+    SENHA_TIMEOUT = float(os.getenv('SENHA_TIMEOUT', '5.0'))
+
+    SESSAO_CACHE_TAMANHO = int(os.getenv('SESSAO_CACHE_TAMANHO', '10000'))
+    SESSAO_CACHE_TTL = int(os.getenv('SESSAO_CACHE_TTL', '300'))
+    CONTATOS_CACHE_TAMANHO = int(os.getenv('CONTATOS_CACHE_TAMANHO', '5000'))
+    CONTATOS_CACHE_TTL = int(os.getenv('CONTATOS_CACHE_TTL', '300'))
+    # Invalidação de caches entre workers: memoria (processo único) | redis
+    CACHE_CANAL_BACKEND = os.getenv('CACHE_CANAL_BACKEND', 'memoria')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL') or SOCKETIO_MESSAGE_QUEUE
+
+    # Partições mensais de logs: criadas com antecedência e removidas após a retenção
+    LOGS_PARTICOES_ADIANTE = int(os.getenv('LOGS_PARTICOES_ADIANTE', '3'))
+    LOGS_RETENCAO_MESES = int(os.getenv('LOGS_RETENCAO_MESES', '12'))
+    LOGS_ARQUIVO_PASTA = os.getenv('LOGS_ARQUIVO_PASTA', 'logs/arquivo')
+    # Segundos entre execuções de `flask logs manutencao` disparadas pelo servidor.py (0 desliga)
+    LOGS_MANUTENCAO_INTERVALO = int(os.getenv('LOGS_MANUTENCAO_INTERVALO', '86400'))
+
+    AUDIT_LOG_ASYNC = os.getenv('AUDIT_LOG_ASYNC', 'true').lower() in ('true', '1', 't')
+    AUDIT_LOG_QUEUE_SIZE = int(os.getenv('AUDIT_LOG_QUEUE_SIZE', '10000'))
+    AUDIT_LOG_BATCH_SIZE = int(os.getenv('AUDIT_LOG_BATCH_SIZE', '200'))
+    AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv('AUDIT_LOG_FLUSH_INTERVAL', '1.0'))
+    AUDIT_LOG_OVERFLOW = os.getenv('AUDIT_LOG_OVERFLOW', 'block')  # block | drop_info | spill
+    AUDIT_LOG_BLOCK_TIMEOUT = float(os.getenv('AUDIT_LOG_BLOCK_TIMEOUT', '5.0'))
+    AUDIT_LOG_SPILL_PATH = os.getenv('AUDIT_LOG_SPILL_PATH', 'logs/auditoria_spill.jsonl')
+
+    # Política de auditoria. Chaves são ações (LISTAR_CONVERSAS), categorias (MENSAGEM) ou "*";
+    # severidades pelo nome (INFO, ALERTA, ERRO, CRITICO). Categorias de segurança ignoram a política.
+    AUDITORIA_CATEGORIAS_SEGURANCA = os.getenv('AUDITORIA_CATEGORIAS_SEGURANCA', 'AUTENTICACAO,CONTA')
+    AUDITORIA_NIVEIS = os.getenv('AUDITORIA_NIVEIS', '')  # ex.: CONTATO=ALERTA,*=INFO
+    AUDITORIA_AMOSTRAGEM = os.getenv(
+        'AUDITORIA_AMOSTRAGEM',
+        'LISTAR_CONVERSAS=0.05,LISTAR_CONTATOS=0.05,VISUALIZAR_CONTATO_SUCESSO=0.05,SINCRONIZAR=0.05'
+    )
+    AUDITORIA_AGREGAR = os.getenv(
+        'AUDITORIA_AGREGAR',
+        'WEBSOCKET_CONNECT,WEBSOCKET_DISCONNECT,WEBSOCKET_JOIN_CONVERSATION,WEBSOCKET_LEAVE_CONVERSATION,'
+        'WEBSOCKET_MESSAGE_SENT,WEBSOCKET_MESSAGE_READ,ENVIAR_MENSAGEM_SUCESSO'
+    )
+    AUDITORIA_AGREGACAO_INTERVALO = float(os.getenv('AUDITORIA_AGREGACAO_INTERVALO', '60'))
+    AUDITORIA_AGREGACAO_MAX_CHAVES = int(os.getenv('AUDITORIA_AGREGACAO_MAX_CHAVES', '10000'))
+    # IDs de usuário (separados por vírgula) com acesso a /api/auditoria/logs
+    AUDITORIA_ADMINS = os.getenv('AUDITORIA_ADMINS', '')
 
     DEBUG = os.getenv("DEBUG", "false").lower() in ("true", "1", "t")
\ No newline at end of file
@@ -0,0 +1,145 @@
+import logging
+import time
+from collections import Counter
+from functools import wraps
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from app.auditoria import _ler_mapa
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+class OrcamentoConsultasExcedido(Exception):
+    """Requisição ou evento passou do orçamento de consultas (modo estrito)"""
+
+
+class MonitorConsultas:
+    """
+    Conta e cronometra as instruções SQL de cada requisição e evento Socket.IO.
+
+    Ao fim do escopo compara a contagem com o orçamento do endpoint
+    (SQL_ORCAMENTOS: "api.conversationresource=5,socket:send_message=6,*=30")
+    e procura instruções idênticas repetidas SQL_REPETICOES_N1 vezes ou mais,
+    sinal típico de N+1 (a mesma consulta parametrizada dentro de um laço).
+    Por padrão só registra avisos; com SQL_ORCAMENTO_ESTRITO levanta
+    OrcamentoConsultasExcedido, o que faz os testes falharem.
+    Em DEBUG, as respostas REST trazem X-Query-Count e X-Query-Time.
+    Instruções executadas com execution_options(monitor_consultas=False) não contam.
+    """
+
+    def __init__(self, app=None):
+        self.orcamentos = {}
+        self.repeticoes_n1 = 0
+        self.estrito = False
+        self.cabecalho = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.orcamentos = {
+            chave: int(limite)
+            for chave, limite in _ler_mapa(app.config.get('SQL_ORCAMENTOS')).items()
+        }
+        self.repeticoes_n1 = app.config.get('SQL_REPETICOES_N1', 5)
+        self.estrito = app.config.get('SQL_ORCAMENTO_ESTRITO', False)
+        self.cabecalho = app.debug
+
+        app.before_request(self.iniciar)
+        app.after_request(self._depois_requisicao)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', _antes_execucao)
+            event.listen(db.engine, 'after_cursor_execute', _depois_execucao)
+        app.extensions['monitor_consultas'] = self
+
+    # ------------------------------------------------------------------
+    # Escopo (requisição ou evento)
+    # ------------------------------------------------------------------
+
+    def iniciar(self):
+        g.consultas_sql = 0
+        g.tempo_sql = 0.0
+        g.formas_sql = Counter()
+
+    @staticmethod
+    def contagem():
+        return g.get('consultas_sql', 0) if has_request_context() else 0
+
+    def _depois_requisicao(self, resposta):
+        if 'formas_sql' not in g:
+            return resposta
+        if self.cabecalho:
+            resposta.headers['X-Query-Count'] = str(g.consultas_sql)
+            resposta.headers['X-Query-Time'] = f"{g.tempo_sql * 1000:.1f}ms"
+        self.verificar(request.endpoint or 'desconhecido')
+        return resposta
+
+    @staticmethod
+    def encerrar():
+        """Fecha o escopo: nada mais é contado, mas a contagem continua legível (métricas)"""
+        g.pop('formas_sql', None)
+
+    def evento(self, nome):
+        """Decorador dos handlers Socket.IO: cada evento é um escopo próprio (socket:<nome>)"""
+        def decorador(handler):
+            @wraps(handler)
+            def wrapper(*args, **kwargs):
+                self.iniciar()
+                try:
+                    resultado = handler(*args, **kwargs)
+                    self.verificar(f"socket:{nome}")
+                    return resultado
+                finally:
+                    # Também quando o handler levanta: senão o escopo fica aberto e
+                    # consultas de fora do evento entram na conta dele
+                    self.encerrar()
+            return wrapper
+        return decorador
+
+    def verificar(self, escopo):
+        problemas = []
+
+        orcamento = self.orcamentos.get(escopo, self.orcamentos.get('*', 0))
+        if orcamento and g.consultas_sql > orcamento:
+            problemas.append(f"{g.consultas_sql} consultas (orçamento {orcamento})")
+
+        if self.repeticoes_n1:
+            for forma, vezes in g.formas_sql.most_common():
+                if vezes < self.repeticoes_n1:
+                    break
+                problemas.append(f"provável N+1, {vezes}x: {' '.join(forma.split())[:200]}")
+
+        if not problemas:
+            return
+        mensagem = f"{escopo}: " + "; ".join(problemas)
+        if self.estrito:
+            raise OrcamentoConsultasExcedido(mensagem)
+        logger.warning("Consultas SQL em %s", mensagem)
+
+
+def _escopo_ativo():
+    # Threads de fundo (auditoria, e-mail) não têm requisição: ficam fora da conta
+    return has_request_context() and 'formas_sql' in g
+
+
+def _antes_execucao(conn, cursor, statement, parameters, context, executemany):
+    if not _escopo_ativo():
+        return
+    # Instruções de infraestrutura (ex.: SET LOCAL statement_timeout do PgBouncer) ficam de fora
+    if context is not None and not context.execution_options.get('monitor_consultas', True):
+        return
+    g.consultas_sql += 1
+    # Instruções parametrizadas: o texto já é a "forma", sem os valores
+    g.formas_sql[statement] += 1
+    context._inicio_consulta = time.perf_counter()
+
+
+def _depois_execucao(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, '_inicio_consulta', None)
+    if inicio is not None and _escopo_ativo():
+        g.tempo_sql += time.perf_counter() - inicio
+
+
+monitor_consultas = MonitorConsultas()
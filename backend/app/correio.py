@@ -0,0 +1,291 @@
+import atexit
+import heapq
+import itertools
+import logging
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from flask_mail import Message
+from sqlalchemy import update
+from app.extensions import db, mail
+from app.models import EnvioEmail, EnvioEmailStatus
+
+logger = logging.getLogger(__name__)
+
+# Recusas definitivas do servidor: repetir não adianta
+ERROS_PERMANENTES = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
+
+
+class FilaEmail:
+    """
+    Fila de envio de e-mails em segundo plano.
+
+    A requisição só registra o envio em envios_email (sem o corpo, que pode
+    conter códigos 2FA) e coloca a mensagem numa fila em memória. Um grupo de
+    EMAIL_WORKERS threads consome a fila mantendo cada uma a sua conexão SMTP
+    aberta entre envios; falhas temporárias são repetidas com backoff
+    exponencial até EMAIL_MAX_TENTATIVAS.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._fila = None
+        self._agendados = []
+        self._sequencia = itertools.count()
+        self._threads = []
+        self._pid = None
+        self._atexit_registrado = False
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.assincrono = app.config.get('EMAIL_FILA_ASYNC', True)
+        self.workers = app.config.get('EMAIL_WORKERS', 2)
+        self.max_tentativas = app.config.get('EMAIL_MAX_TENTATIVAS', 5)
+        self.backoff_base = app.config.get('EMAIL_BACKOFF_BASE', 2.0)
+        self.backoff_maximo = app.config.get('EMAIL_BACKOFF_MAXIMO', 300.0)
+        self.conexao_ociosa = app.config.get('EMAIL_CONEXAO_OCIOSA', 30.0)
+
+        app.extensions['fila_email'] = self
+        # Cada create_app() (testes, CLI) chama init_app: workers já rodando continuam com a
+        # fila que consomem e um único hook de encerramento basta
+        with self._lock:
+            if self._fila is None or not self._threads:
+                self._fila = queue.Queue(maxsize=app.config.get('EMAIL_FILA_TAMANHO', 1000))
+            if not self._atexit_registrado:
+                atexit.register(self.parar)
+                self._atexit_registrado = True
+
+    # ------------------------------------------------------------------
+    # Produção
+    # ------------------------------------------------------------------
+
+    def enfileirar(self, destinatario, assunto, corpo, html=None, usuario_id=None):
+        """
+        Registra e agenda o envio. Retorna o id do envio, ou None se ele não
+        pôde ser aceito (fila cheia ou erro ao registrar).
+        """
+        trabalho = {
+            'id': uuid4(),
+            'destinatario': destinatario,
+            'assunto': assunto,
+            'corpo': corpo,
+            'html': html,
+            'tentativas': 0
+        }
+
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(EnvioEmail.__table__.insert(), {
+                    'id': trabalho['id'],
+                    'id_usuario': usuario_id,
+                    'destinatario': destinatario,
+                    'assunto': assunto,
+                    'status': EnvioEmailStatus.PENDENTE.value,
+                    'tentativas': 0
+                })
+        except Exception as e:
+            logger.error("Erro ao registrar envio de e-mail: %s", e)
+            return None
+
+        if self.app is None or not self.assincrono:
+            conexao = self._abrir()
+            if conexao is None:
+                self._falhar(trabalho, "Não foi possível conectar ao servidor SMTP")
+                return None
+            try:
+                enviado = self._enviar(conexao, trabalho)
+            finally:
+                self._fechar(conexao)
+            return trabalho['id'] if enviado else None
+
+        self._garantir_workers()
+
+        try:
+            self._fila.put_nowait(trabalho)
+        except queue.Full:
+            self._atualizar(trabalho['id'], status=EnvioEmailStatus.FALHOU.value, ultimo_erro="Fila de e-mails cheia")
+            return None
+        return trabalho['id']
+
+    def _garantir_workers(self):
+        # Threads criadas sob demanda para sobreviver a fork de workers
+        if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+                return
+            if self._pid != os.getpid():
+                self._threads = []
+                self._agendados = []
+            self._parar.clear()
+            self._pid = os.getpid()
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for indice in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._executar, name=f'email-worker-{indice}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    # ------------------------------------------------------------------
+    # Consumo
+    # ------------------------------------------------------------------
+
+    def _executar(self):
+        with self.app.app_context():
+            conexao = None
+            while True:
+                self._liberar_agendados()
+                try:
+                    trabalho = self._fila.get(timeout=self._espera())
+                except queue.Empty:
+                    if self._parar.is_set():
+                        break
+                    if conexao is not None and time.monotonic() - conexao.ultimo_uso >= self.conexao_ociosa:
+                        conexao = self._fechar(conexao)
+                    continue
+
+                if conexao is None:
+                    conexao = self._abrir()
+                if conexao is None:
+                    self._falhar(trabalho, "Não foi possível conectar ao servidor SMTP")
+                    continue
+
+                if not self._enviar(conexao, trabalho):
+                    # A conexão pode ter ficado num estado inválido
+                    conexao = self._fechar(conexao)
+                else:
+                    conexao.ultimo_uso = time.monotonic()
+
+            self._fechar(conexao)
+
+    def _espera(self):
+        """Quanto esperar na fila até o próximo reenvio agendado ou verificação de ociosidade"""
+        espera = min(self.conexao_ociosa, 1.0)
+        with self._lock:
+            if self._agendados:
+                espera = min(espera, max(0.0, self._agendados[0][0] - time.monotonic()))
+        return espera
+
+    def _liberar_agendados(self):
+        agora = time.monotonic()
+        prontos = []
+        with self._lock:
+            while self._agendados and self._agendados[0][0] <= agora:
+                prontos.append(heapq.heappop(self._agendados)[2])
+        for trabalho in prontos:
+            self._fila.put(trabalho)
+
+    def _abrir(self):
+        try:
+            conexao = mail.connect()
+            conexao.__enter__()
+            conexao.ultimo_uso = time.monotonic()
+            return conexao
+        except Exception as e:
+            logger.error("Erro ao conectar ao servidor SMTP: %s", e)
+            return None
+
+    def _fechar(self, conexao):
+        if conexao is not None:
+            try:
+                conexao.__exit__(None, None, None)
+            except Exception:
+                pass
+        return None
+
+    def _enviar(self, conexao, trabalho):
+        trabalho['tentativas'] += 1
+        try:
+            msg = Message(
+                subject=trabalho['assunto'],
+                recipients=[trabalho['destinatario']],
+                charset='utf-8',
+                body=trabalho['corpo'],
+                html=trabalho['html']
+            )
+            msg.extra_headers = {'Content-Transfer-Encoding': '8bit'}
+            conexao.send(msg)
+        except ERROS_PERMANENTES as e:
+            self._falhar(trabalho, str(e))
+            return False
+        except Exception as e:
+            self._repetir(trabalho, str(e))
+            return False
+
+        self._atualizar(
+            trabalho['id'],
+            status=EnvioEmailStatus.ENVIADO.value,
+            tentativas=trabalho['tentativas'],
+            ultimo_erro=None,
+            enviado_em=datetime.now(timezone.utc)
+        )
+        return True
+
+    def _repetir(self, trabalho, erro):
+        if not self.assincrono or trabalho['tentativas'] >= self.max_tentativas:
+            self._falhar(trabalho, erro)
+            return
+
+        atraso = min(self.backoff_maximo, self.backoff_base * 2 ** (trabalho['tentativas'] - 1))
+        atraso *= random.uniform(0.8, 1.2)
+        logger.warning("Envio de e-mail %s falhou (tentativa %d), repetindo em %.1fs: %s",
+                       trabalho['id'], trabalho['tentativas'], atraso, erro)
+        self._atualizar(
+            trabalho['id'],
+            status=EnvioEmailStatus.REPETINDO.value,
+            tentativas=trabalho['tentativas'],
+            ultimo_erro=erro
+        )
+        with self._lock:
+            heapq.heappush(self._agendados, (time.monotonic() + atraso, next(self._sequencia), trabalho))
+
+    def _falhar(self, trabalho, erro):
+        logger.error("Envio de e-mail %s descartado após %d tentativa(s): %s",
+                     trabalho['id'], trabalho['tentativas'], erro)
+        self._atualizar(
+            trabalho['id'],
+            status=EnvioEmailStatus.FALHOU.value,
+            tentativas=trabalho['tentativas'],
+            ultimo_erro=erro
+        )
+
+    def _atualizar(self, envio_id, **valores):
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    update(EnvioEmail)
+                    .where(EnvioEmail.id == envio_id)
+                    .values(atualizado_em=datetime.now(timezone.utc), **valores)
+                )
+        except Exception as e:
+            logger.error("Erro ao atualizar envio de e-mail %s: %s", envio_id, e)
+
+    def parar(self, timeout=10.0):
+        """Encerra os workers depois de esvaziar a fila (reenvios ainda agendados são perdidos)"""
+        if not self._threads or self._pid != os.getpid():
+            return
+        self._parar.set()
+        limite = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, limite - time.monotonic()))
+        self._threads = []
+
+    @property
+    def tamanho_fila(self):
+        return self._fila.qsize() if self._fila is not None else 0
+
+    @property
+    def reenvios_agendados(self):
+        return len(self._agendados)
+
+
+fila_email = FilaEmail()
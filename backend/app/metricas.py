@@ -0,0 +1,282 @@
+import hmac
+import logging
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import Response, g, request
+
+from app.auditoria import audit_log
+from app.cache_contatos import cache_contatos
+from app.consultas import monitor_consultas
+from app.correio import fila_email
+from app.extensions import db
+from app.pool import FAIXAS_ESPERA, estatisticas_pool, observar_checkouts
+from app.presenca import presenca
+from app.senhas import servico_senhas
+from app.sessoes import sessoes
+
+logger = logging.getLogger(__name__)
+
+# Limites do histograma de consultas SQL por requisição/evento
+FAIXAS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100, float('inf'))
+
+
+class Instrumentos:
+    """
+    Contadores, histogramas e gauges do processo. O prometheus_client só é
+    importado aqui, na primeira aplicação com METRICAS_HABILITADAS: CLI,
+    testes e create_app() com métricas desligadas não pagam essa importação.
+    """
+
+    def __init__(self):
+        from prometheus_client import Counter, Gauge, Histogram
+
+        self.http_latencia = Histogram(
+            'nexsay_http_latencia_segundos', 'Duração das requisições REST', ['endpoint', 'metodo']
+        )
+        self.http_respostas = Counter(
+            'nexsay_http_respostas_total', 'Respostas REST por status', ['endpoint', 'metodo', 'status']
+        )
+        self.http_consultas = Histogram(
+            'nexsay_http_consultas_sql', 'Consultas SQL por requisição REST', ['endpoint', 'metodo'],
+            buckets=FAIXAS_CONSULTAS
+        )
+        self.socket_latencia = Histogram(
+            'nexsay_socketio_latencia_segundos', 'Duração dos handlers Socket.IO', ['evento']
+        )
+        self.socket_erros = Counter(
+            'nexsay_socketio_erros_total', 'Exceções que escaparam dos handlers Socket.IO', ['evento']
+        )
+        self.socket_consultas = Histogram(
+            'nexsay_socketio_consultas_sql', 'Consultas SQL por evento Socket.IO', ['evento'],
+            buckets=FAIXAS_CONSULTAS
+        )
+        self.pool_espera = Histogram(
+            'nexsay_db_pool_espera_segundos', 'Espera por uma conexão livre no checkout', buckets=FAIXAS_ESPERA
+        )
+        self.pool_timeouts = Counter(
+            'nexsay_db_pool_timeouts_total', 'Checkouts que esgotaram DB_POOL_TIMEOUT'
+        )
+
+        # Gauges lidos periodicamente do estado de cada processo. Em modo multiprocesso
+        # "live*" descarta os valores de workers mortos (ver servidor.py).
+        self.sockets_conectados = Gauge(
+            'nexsay_socketio_conexoes', 'Sockets autenticados abertos', multiprocess_mode='livesum'
+        )
+        # Com PRESENCA_BACKEND=redis todos os workers leem o mesmo total
+        self.usuarios_online = Gauge(
+            'nexsay_usuarios_online', 'Usuários com ao menos uma conexão', multiprocess_mode='livemax'
+        )
+        self.pool_conexoes = Gauge(
+            'nexsay_db_pool_conexoes', 'Conexões do pool por estado', ['estado'], multiprocess_mode='livesum'
+        )
+        self.fila_auditoria = Gauge(
+            'nexsay_auditoria_fila', 'Entradas de auditoria aguardando gravação', multiprocess_mode='livesum'
+        )
+        self.fila_email = Gauge(
+            'nexsay_email_fila', 'E-mails aguardando envio', ['estado'], multiprocess_mode='livesum'
+        )
+        self.senha_vagas = Gauge(
+            'nexsay_senhas_vagas_livres', 'Operações de bcrypt que ainda cabem antes do 503',
+            multiprocess_mode='livesum'
+        )
+
+        # Caches em memória: contadores acumulados desde o início do processo.
+        # Taxa de acerto = rate(acerto) / rate(acerto + falha) no Prometheus.
+        self.cache_consultas = Gauge(
+            'nexsay_cache_consultas', 'Consultas aos caches por resultado', ['cache', 'resultado'],
+            multiprocess_mode='livesum'
+        )
+        self.cache_itens = Gauge(
+            'nexsay_cache_itens', 'Itens guardados em cada cache', ['cache'], multiprocess_mode='livesum'
+        )
+        self.cache_remocoes = Gauge(
+            'nexsay_cache_remocoes', 'Itens removidos por invalidação', ['cache'], multiprocess_mode='livesum'
+        )
+        self.contatos_invalidacoes = Gauge(
+            'nexsay_contatos_cache_invalidacoes', 'Invalidações do cache de contatos recebidas',
+            multiprocess_mode='livesum'
+        )
+        self.contatos_descartes = Gauge(
+            'nexsay_contatos_cache_descartes_corrida',
+            'Leituras não guardadas porque uma invalidação chegou durante a consulta', multiprocess_mode='livesum'
+        )
+        self.contatos_idade = Gauge(
+            'nexsay_contatos_cache_idade_servida_segundos', 'Idade dos valores de contatos servidos do cache',
+            ['estatistica'], multiprocess_mode='livemax'
+        )
+
+        observar_checkouts(self._medir_checkout)
+
+    def _medir_checkout(self, espera, esgotado):
+        if esgotado:
+            self.pool_timeouts.inc()
+        else:
+            self.pool_espera.observe(espera)
+
+
+class Metricas:
+    """
+    Métricas no formato do Prometheus, expostas em /metrics.
+
+    No caminho da requisição só há contadores e histogramas (uma observação
+    por requisição/evento); filas, pool e presença são lidos por uma thread
+    a cada METRICAS_INTERVALO segundos. Com PROMETHEUS_MULTIPROC_DIR definido
+    (workers pré-forkados) cada processo grava seus valores em arquivos da
+    pasta e /metrics, em qualquer worker, soma todos.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.instrumentos = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('METRICAS_HABILITADAS', True):
+            return
+        with self._lock:
+            # Métricas vão para o registro global do processo: criadas uma única vez
+            if self.instrumentos is None:
+                self.instrumentos = Instrumentos()
+        self.app = app
+        self.intervalo = app.config.get('METRICAS_INTERVALO', 15.0)
+        self.token = app.config.get('METRICAS_TOKEN')
+
+        app.before_request(self._antes_requisicao)
+        app.after_request(self._depois_requisicao)
+        app.add_url_rule('/metrics', 'metricas', self.expor)
+        app.extensions['metricas'] = self
+
+    # ------------------------------------------------------------------
+    # REST
+    # ------------------------------------------------------------------
+
+    def _antes_requisicao(self):
+        g.inicio_requisicao = time.perf_counter()
+        self._garantir_coleta()
+
+    def _depois_requisicao(self, resposta):
+        inicio = g.pop('inicio_requisicao', None)
+        if inicio is None or request.endpoint == 'metricas':
+            return resposta
+        # Respostas em streaming são medidas até o envio dos cabeçalhos
+        endpoint = request.endpoint or 'desconhecido'
+        instrumentos = self.instrumentos
+        instrumentos.http_latencia.labels(endpoint, request.method).observe(time.perf_counter() - inicio)
+        instrumentos.http_respostas.labels(endpoint, request.method, str(resposta.status_code)).inc()
+        instrumentos.http_consultas.labels(endpoint, request.method).observe(monitor_consultas.contagem())
+        return resposta
+
+    # ------------------------------------------------------------------
+    # Socket.IO
+    # ------------------------------------------------------------------
+
+    def evento(self, nome):
+        """
+        Decorador dos handlers Socket.IO: contagem, duração e consultas SQL por evento.
+        Aplicar por fora de monitor_consultas.evento, que abre o escopo das consultas.
+        """
+        def decorador(handler):
+            @wraps(handler)
+            def wrapper(*args, **kwargs):
+                if self.app is None:
+                    return handler(*args, **kwargs)
+                self._garantir_coleta()
+                inicio = time.perf_counter()
+                try:
+                    return handler(*args, **kwargs)
+                except ConnectionRefusedError:
+                    # Recusa de autenticação no connect, não é falha do handler
+                    raise
+                except Exception:
+                    self.instrumentos.socket_erros.labels(nome).inc()
+                    raise
+                finally:
+                    self.instrumentos.socket_latencia.labels(nome).observe(time.perf_counter() - inicio)
+                    self.instrumentos.socket_consultas.labels(nome).observe(monitor_consultas.contagem())
+            return wrapper
+        return decorador
+
+    # ------------------------------------------------------------------
+    # Estado dos componentes
+    # ------------------------------------------------------------------
+
+    def _garantir_coleta(self):
+        # A thread é criada sob demanda para sobreviver a fork de workers
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._coletar_periodicamente, name='metricas', daemon=True).start()
+
+    def _coletar_periodicamente(self):
+        while True:
+            try:
+                self.atualizar()
+            except Exception as e:
+                logger.error("Erro ao coletar métricas: %s", e)
+            time.sleep(self.intervalo)
+
+    def atualizar(self):
+        """Copia para os gauges o estado atual deste processo"""
+        instrumentos = self.instrumentos
+        websocket = self.app.extensions.get('websocket')
+        instrumentos.sockets_conectados.set(len(websocket.identidades) if websocket is not None else 0)
+        instrumentos.usuarios_online.set(presenca.estatisticas()["usuarios_online"])
+        instrumentos.fila_auditoria.set(audit_log.tamanho_fila)
+        instrumentos.fila_email.labels('fila').set(fila_email.tamanho_fila)
+        instrumentos.fila_email.labels('reenvio').set(fila_email.reenvios_agendados)
+        instrumentos.senha_vagas.set(servico_senhas.estatisticas()["vagas_livres"])
+        validacao = sessoes.estatisticas()
+        self._exportar_cache('sessoes_validas', validacao["validas"])
+        self._exportar_cache('sessoes_revogadas', validacao["revogadas"])
+        contatos = cache_contatos.estatisticas()
+        self._exportar_cache('contatos_listas', contatos["listas"])
+        self._exportar_cache('contatos_detalhes', contatos["detalhes"])
+        instrumentos.contatos_invalidacoes.set(contatos["invalidacoes"])
+        instrumentos.contatos_descartes.set(contatos["descartes_por_corrida"])
+        instrumentos.contatos_idade.labels('media').set(contatos["idade_media_servida"])
+        instrumentos.contatos_idade.labels('maxima').set(contatos["idade_maxima_servida"])
+        with self.app.app_context():
+            pool = estatisticas_pool(db.engine)
+        for estado in ('em_uso', 'livres', 'overflow'):
+            if estado in pool:
+                instrumentos.pool_conexoes.labels(estado).set(pool[estado])
+
+    def _exportar_cache(self, nome, estatisticas):
+        """Copia as estatísticas de um CacheTTL para os gauges de cache"""
+        instrumentos = self.instrumentos
+        instrumentos.cache_consultas.labels(nome, 'acerto').set(estatisticas["acertos"])
+        instrumentos.cache_consultas.labels(nome, 'falha').set(estatisticas["falhas"])
+        instrumentos.cache_itens.labels(nome).set(estatisticas["tamanho"])
+        instrumentos.cache_remocoes.labels(nome).set(estatisticas["remocoes"])
+
+    # ------------------------------------------------------------------
+    # Exposição
+    # ------------------------------------------------------------------
+
+    def expor(self):
+        if self.token:
+            cabecalho = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(cabecalho.encode(), f"Bearer {self.token}".encode()):
+                return Response(status=401)
+
+        from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+        self.atualizar()
+        if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+            registro = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registro)
+        else:
+            registro = REGISTRY
+        return Response(generate_latest(registro), content_type=CONTENT_TYPE_LATEST)
+
+
+metricas = Metricas()
@@ -1,10 +1,9 @@
 from datetime import datetime
 import uuid
-from flask_login import UserMixin
-from marshmallow import Schema, fields
 from app.extensions import db
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, UniqueConstraint, func
-from sqlalchemy.dialects.postgresql import UUID, INET
+from app.particoes import criar_particoes_logs
+from sqlalchemy import event, Column, String, Boolean, Integer, BigInteger, Identity, DateTime, ForeignKey, Text, UniqueConstraint, CheckConstraint, Index, func
+from sqlalchemy.dialects.postgresql import UUID, INET, JSONB, insert
 from sqlalchemy.orm import relationship
 from enum import Enum
 
@@ -41,7 +40,7 @@ class Sessao(db.Model):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     id_usuario = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"))
-    jwt_token = Column(Text, nullable=False)
+    jwt_token = Column(Text, nullable=False, index=True)
     doisFatoresSessao = Column(Boolean, default=False)
 
     usuario = relationship("Usuario", back_populates="sessoes")
@@ -56,7 +55,7 @@ class Contato(db.Model):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     id_usuario = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"))
-    id_contato = Column(UUID(as_uuid=True), nullable=False)
+    id_contato = Column(UUID(as_uuid=True), nullable=False, index=True)
     bloqueio = Column(Boolean, default=False)
     data_criacao = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -68,17 +67,51 @@ class Contato(db.Model):
 # -----------------------------------------------------------------------------------------------
 class Conversa(db.Model):
     __tablename__ = "conversas"
-    __table_args__ = (UniqueConstraint("id_usuario1", "id_usuario2", name="unique_conversa_usuarios"),)
+    __table_args__ = (
+        UniqueConstraint("id_usuario1", "id_usuario2", name="unique_conversa_usuarios"),
+        # Participantes sempre em ordem canônica (menor UUID primeiro)
+        CheckConstraint("id_usuario1 <= id_usuario2", name="ck_conversa_participantes_ordenados"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     id_usuario1 = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"))
-    id_usuario2 = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"))
+    id_usuario2 = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), index=True)
     data_criacao = Column(DateTime(timezone=True), server_default=func.now())
 
     usuario1 = relationship("Usuario", back_populates="conversas1", foreign_keys=[id_usuario1])
     usuario2 = relationship("Usuario", back_populates="conversas2", foreign_keys=[id_usuario2])
     mensagens = relationship("Mensagem", back_populates="conversa", cascade="all, delete")
 
+    @staticmethod
+    def ordenar_participantes(usuario_a, usuario_b):
+        """Retorna o par de participantes na ordem canônica usada por id_usuario1/id_usuario2"""
+        usuario_a, usuario_b = uuid.UUID(str(usuario_a)), uuid.UUID(str(usuario_b))
+        return (usuario_a, usuario_b) if usuario_a <= usuario_b else (usuario_b, usuario_a)
+
+    @classmethod
+    def entre(cls, usuario_a, usuario_b):
+        """Busca a conversa entre dois usuários com uma única consulta pela unique"""
+        id_usuario1, id_usuario2 = cls.ordenar_participantes(usuario_a, usuario_b)
+        return cls.query.filter_by(id_usuario1=id_usuario1, id_usuario2=id_usuario2).first()
+
+    @classmethod
+    def do_usuario(cls, conversa_id, usuario_id):
+        """Busca a conversa pela chave primária e confirma que o usuário participa dela"""
+        try:
+            conversa_id = uuid.UUID(str(conversa_id))
+        except ValueError:
+            return None
+        conversa = db.session.get(cls, conversa_id)
+        if conversa is None or not conversa.participa(usuario_id):
+            return None
+        return conversa
+
+    def participa(self, usuario_id):
+        return str(usuario_id) in (str(self.id_usuario1), str(self.id_usuario2))
+
+    def outro_participante(self, usuario_id):
+        return self.id_usuario2 if str(self.id_usuario1) == str(usuario_id) else self.id_usuario1
+
 
 
 # TABELA: mensagens
@@ -88,17 +121,124 @@ class Mensagem(db.Model):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     id_conversa = Column(UUID(as_uuid=True), ForeignKey("conversas.id", ondelete="CASCADE"))
-    id_usuario = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"))
+    id_usuario = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), index=True)
     texto_criptografado = Column(Text, nullable=False)
     data_envio = Column(DateTime(timezone=True), server_default=func.now())
+    # Chave de idempotência gerada pelo cliente (fila offline)
+    client_msg_id = Column(Text, nullable=True)
+    exclusao = Column(Boolean, default=False, server_default="false", nullable=False)
     conversa = relationship("Conversa", back_populates="mensagens")
     usuario = relationship("Usuario", back_populates="mensagens", foreign_keys=[id_usuario])
 
+    __table_args__ = (
+        # Histórico paginado por cursor: WHERE id_conversa = ? ORDER BY data_envio DESC, id DESC
+        Index("ix_mensagens_conversa_data_envio", id_conversa, data_envio.desc(), id.desc()),
+        UniqueConstraint("id_usuario", "client_msg_id", name="unique_mensagem_cliente"),
+    )
+
+
+# TABELA: estado_conversas (marca de leitura de cada participante)
+# -----------------------------------------------------------------------------------------------
+class EstadoConversa(db.Model):
+    __tablename__ = "estado_conversas"
+
+    id_usuario = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    id_conversa = Column(UUID(as_uuid=True), ForeignKey("conversas.id", ondelete="CASCADE"), primary_key=True)
+    # Mensagens com data_envio <= lida_ate estão lidas por id_usuario
+    lida_ate = Column(DateTime(timezone=True), nullable=True)
+    atualizado_em = Column(DateTime(timezone=True), server_default=func.now())
+
+    @classmethod
+    def avancar(cls, usuario_id, conversa_id, lida_ate):
+        """
+        Avança a marca de leitura com um único upsert. Nunca retrocede.
+        Retorna a nova marca, ou None se a atual já era igual ou posterior.
+        """
+        stmt = insert(cls).values(
+            id_usuario=usuario_id,
+            id_conversa=conversa_id,
+            lida_ate=lida_ate,
+            atualizado_em=func.now()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.id_usuario, cls.id_conversa],
+            set_={"lida_ate": stmt.excluded.lida_ate, "atualizado_em": func.now()},
+            where=(cls.lida_ate.is_(None)) | (cls.lida_ate < stmt.excluded.lida_ate)
+        ).returning(cls.lida_ate)
+        return db.session.execute(stmt).scalar()
+
+
+
+# TABELA: alteracoes (sequência de mudanças por usuário, usada pela sincronização incremental)
+# -----------------------------------------------------------------------------------------------
+class AlteracaoTipo(Enum):
+    MENSAGEM_NOVA = "mensagem_nova"
+    MENSAGEM_REMOVIDA = "mensagem_removida"
+    CONVERSA_NOVA = "conversa_nova"
+    CONVERSA_ATUALIZADA = "conversa_atualizada"
+    CONTATO_NOVO = "contato_novo"
+    CONTATO_ATUALIZADO = "contato_atualizado"
+    CONTATO_REMOVIDO = "contato_removido"
+
+class Alteracao(db.Model):
+    __tablename__ = "alteracoes"
+
+    id = Column(BigInteger, Identity(), primary_key=True)
+    id_usuario = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    # Cursor de /sync: número tirado de versoes_usuario sob a trava da linha do usuário,
+    # por isso os commits de cada usuário acontecem na ordem de seq (o id global não garante isso)
+    seq = Column(BigInteger, nullable=False)
+    tipo = Column(Text, nullable=False)
+    id_objeto = Column(UUID(as_uuid=True), nullable=False)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Só para traduzir cursores antigos (id global)
+        Index("ix_alteracoes_usuario_id", id_usuario, id),
+        UniqueConstraint("id_usuario", "seq", name="unique_alteracao_usuario_seq"),
+    )
+
+
+# TABELA: versoes_usuario (contador por usuário, base dos ETags das listagens)
+# -----------------------------------------------------------------------------------------------
+class VersaoUsuario(db.Model):
+    __tablename__ = "versoes_usuario"
+
+    id_usuario = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    # Incrementado na mesma transação de cada alteração: só muda de valor depois do commit
+    versao = Column(BigInteger, nullable=False, default=1)
+    atualizado_em = Column(DateTime(timezone=True), server_default=func.now())
+
+    @classmethod
+    def reservar(cls, quantidades):
+        """
+        Soma quantidades[usuario] à versão de cada usuário e retorna {usuario: nova versão}.
+        O upsert trava as linhas até o commit: a faixa (nova - quantidade, nova] é exclusiva
+        da transação, e a próxima que reservar para o mesmo usuário espera por este commit.
+        """
+        # Ordem fixa para que transações concorrentes travem as linhas na mesma sequência
+        linhas = [{"id_usuario": usuario_id, "versao": quantidade} for usuario_id, quantidade in sorted(quantidades.items())]
+        if not linhas:
+            return {}
+        stmt = insert(cls).values(linhas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.id_usuario],
+            set_={"versao": cls.versao + stmt.excluded.versao, "atualizado_em": func.now()}
+        ).returning(cls.id_usuario, cls.versao)
+        return {str(linha.id_usuario): linha.versao for linha in db.session.execute(stmt)}
+
+    @classmethod
+    def atual(cls, usuario_id):
+        """(versao, atualizado_em) do usuário, ou (0, None) se nada mudou ainda"""
+        linha = db.session.query(cls.versao, cls.atualizado_em).filter(cls.id_usuario == usuario_id).first()
+        return (linha.versao, linha.atualizado_em) if linha else (0, None)
+
 
 # TABELAs: logs
 
 class LogCategoria(Enum):
     AUTENTICACAO = "Autenticação"
+    CONTA = "Conta"
     CONTATO = "Contato"
     CONVERSA = "Conversa"
     MENSAGEM = "Mensagem"
@@ -113,6 +253,7 @@ class LogSeveridade(Enum):
 class Log(db.Model):
     __tablename__ = "logs"
 
+    # Particionada por mês em timestamp, que por isso também entra na chave primária
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     id_usuario = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"))
     categoria = Column(Text, nullable=False)  
@@ -120,11 +261,25 @@ class Log(db.Model):
     acao = Column(Text, nullable=False)
     detalhe = Column(Text, nullable=True)
     ip_origem = Column(INET, nullable=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
-    metadados = Column(Text, nullable=True)  
+    timestamp = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    metadados = Column(JSONB, nullable=True)
 
     usuario = relationship("Usuario", back_populates="logs")
 
+    __table_args__ = (
+        Index("ix_logs_usuario_timestamp", id_usuario, timestamp),
+        # Filtros de contenção: metadados @> '{"conversa_id": "..."}'
+        Index("ix_logs_metadados", metadados, postgresql_using="gin", postgresql_ops={"metadados": "jsonb_path_ops"}),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+# create_all cria só a tabela pai; sem partições nenhum INSERT seria aceito
+event.listen(
+    Log.__table__,
+    "after_create",
+    lambda tabela, conn, **kw: criar_particoes_logs(conn)
+)
+
 
 
 # TABELA: 2FA
@@ -138,3 +293,31 @@ class Codigo2FA(db.Model):
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
 
     usuario = relationship("Usuario", back_populates="codigos_2fa")
+
+    __table_args__ = (
+        # Último código válido do usuário: WHERE id_usuario = ? AND timestamp >= ? ORDER BY timestamp DESC
+        Index("ix_doisfatores_usuario_timestamp", id_usuario, timestamp.desc()),
+    )
+
+
+# TABELA: envios_email (acompanhamento da fila de e-mails; o conteúdo nunca é gravado)
+# -----------------------------------------------------------------------------------------------
+class EnvioEmailStatus(Enum):
+    PENDENTE = "pendente"
+    ENVIADO = "enviado"
+    REPETINDO = "repetindo"
+    FALHOU = "falhou"
+
+class EnvioEmail(db.Model):
+    __tablename__ = "envios_email"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id_usuario = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="SET NULL"), nullable=True, index=True)
+    destinatario = Column(Text, nullable=False)
+    assunto = Column(Text, nullable=False)
+    status = Column(Text, nullable=False, default=EnvioEmailStatus.PENDENTE.value)
+    tentativas = Column(Integer, nullable=False, default=0)
+    ultimo_erro = Column(Text, nullable=True)
+    criado_em = Column(DateTime(timezone=True), server_default=func.now())
+    atualizado_em = Column(DateTime(timezone=True), server_default=func.now())
+    enviado_em = Column(DateTime(timezone=True), nullable=True)
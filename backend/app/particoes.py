@@ -0,0 +1,262 @@
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+TABELA_LOGS = "logs"
+PARTICAO_PADRAO = "logs_padrao"
+# Chave do pg_try_advisory_lock: uma manutenção por vez, venha ela de um worker ou do cron
+CHAVE_MANUTENCAO = 0x4E58_4C47
+_NOME_PARTICAO = re.compile(r"^logs_(\d{4})_(\d{2})$")
+
+
+def _inicio_mes(dia):
+    return date(dia.year, dia.month, 1)
+
+
+def _somar_meses(dia, meses):
+    total = dia.year * 12 + dia.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def nome_particao(inicio):
+    return f"logs_{inicio.year:04d}_{inicio.month:02d}"
+
+
+def criar_particoes_logs(conn, meses_adiante=3, a_partir=None):
+    """
+    Garante as partições mensais de logs do mês de a_partir (padrão: mês
+    atual) até meses_adiante meses à frente, além da partição DEFAULT que
+    recebe qualquer linha fora delas. Retorna os nomes criados agora.
+    """
+    inicio = _inicio_mes(a_partir or datetime.now(timezone.utc).date())
+    existentes = set(listar_particoes_logs(conn))
+
+    criadas = []
+    if PARTICAO_PADRAO not in existentes:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {PARTICAO_PADRAO} PARTITION OF {TABELA_LOGS} DEFAULT"))
+        existentes.add(PARTICAO_PADRAO)
+        criadas.append(PARTICAO_PADRAO)
+
+    for deslocamento in range(meses_adiante + 1):
+        de = _somar_meses(inicio, deslocamento)
+        nome = nome_particao(de)
+        if nome in existentes:
+            continue
+        _criar_particao(conn, nome, de, _somar_meses(de, 1), PARTICAO_PADRAO in existentes)
+        criadas.append(nome)
+    return criadas
+
+
+def _criar_particao(conn, nome, de, ate, tem_padrao):
+    intervalo = f"FOR VALUES FROM ('{de.isoformat()}') TO ('{ate.isoformat()}')"
+    faixa = f"timestamp >= '{de.isoformat()}' AND timestamp < '{ate.isoformat()}'"
+
+    if tem_padrao:
+        # Bloqueia INSERTs que cairiam na DEFAULT até o fim da transação (só ela, não as mensais)
+        conn.execute(text(f"LOCK TABLE {PARTICAO_PADRAO} IN SHARE ROW EXCLUSIVE MODE"))
+        tem_linhas = conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {PARTICAO_PADRAO} WHERE {faixa})")).scalar()
+    else:
+        tem_linhas = False
+
+    if not tem_linhas:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {nome} PARTITION OF {TABELA_LOGS} {intervalo}"))
+        return
+
+    # A DEFAULT já recebeu linhas do mês (partição não criada a tempo): CREATE ... PARTITION OF
+    # falharia. Cria a tabela solta, move as linhas e só então anexa (índices e FKs vêm do pai).
+    conn.execute(text(f"CREATE TABLE {nome} (LIKE {TABELA_LOGS} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    movidas = conn.execute(text(
+        f"WITH movidas AS (DELETE FROM {PARTICAO_PADRAO} WHERE {faixa} RETURNING *) "
+        f"INSERT INTO {nome} SELECT * FROM movidas"
+    )).rowcount
+    conn.execute(text(f"ALTER TABLE {TABELA_LOGS} ATTACH PARTITION {nome} {intervalo}"))
+    logger.info("Partição %s criada com %d linhas vindas de %s", nome, movidas, PARTICAO_PADRAO)
+
+
+def listar_particoes_logs(conn):
+    return [
+        nome for (nome,) in conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :tabela ORDER BY c.relname"
+        ), {"tabela": TABELA_LOGS})
+    ]
+
+
+def _listar_tabelas_mensais(conn):
+    """(nome, anexada) de cada tabela logs_AAAA_MM, inclusive as desanexadas e ainda não removidas"""
+    return [
+        (nome, anexada) for nome, anexada in conn.execute(text(
+            "SELECT c.relname, c.relispartition FROM pg_class c "
+            "WHERE c.relkind = 'r' AND c.relname ~ '^logs_[0-9]{4}_[0-9]{2}$' "
+            "AND pg_table_is_visible(c.oid) ORDER BY c.relname"
+        ))
+    ]
+
+
+def _limite_retencao(meses_retencao, hoje=None):
+    return _somar_meses(_inicio_mes(hoje or datetime.now(timezone.utc).date()), -meses_retencao)
+
+
+def particoes_expiradas(conn, meses_retencao, hoje=None):
+    """
+    Tabelas mensais cujo intervalo terminou antes do início da janela de retenção,
+    como (nome, anexada): uma retenção interrompida deixa tabelas já desanexadas.
+    """
+    limite = _limite_retencao(meses_retencao, hoje)
+    expiradas = []
+    for nome, anexada in _listar_tabelas_mensais(conn):
+        combinacao = _NOME_PARTICAO.match(nome)
+        if combinacao and date(int(combinacao.group(1)), int(combinacao.group(2)), 1) < limite:
+            expiradas.append((nome, anexada))
+    return expiradas
+
+
+def _copiar(conn, consulta, caminho):
+    cursor = conn.connection.cursor()
+    try:
+        with gzip.open(caminho, 'wt', encoding='utf-8') as arquivo:
+            cursor.copy_expert(f"COPY {consulta} TO STDOUT WITH (FORMAT csv, HEADER true)", arquivo)
+    finally:
+        cursor.close()
+
+
+def arquivar_particao(conn, nome, pasta):
+    """Exporta a partição (já desanexada) para <pasta>/<nome>.csv.gz via COPY"""
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"{nome}.csv.gz")
+    _copiar(conn, nome, caminho)
+    return caminho
+
+
+def aplicar_retencao_logs(engine, meses_retencao, pasta_arquivo=None, hoje=None):
+    """
+    Desanexa e remove as partições de logs fora da janela de retenção,
+    arquivando antes em CSV comprimido quando pasta_arquivo é informada.
+
+    Só o DETACH trava a tabela logs, numa transação curta e com lock_timeout;
+    o COPY roda sobre a tabela já desanexada, sem bloquear a gravação da
+    auditoria, e o DROP vem depois numa transação própria. Linhas antigas da
+    partição DEFAULT saem pelo mesmo critério.
+    """
+    with engine.connect() as conn:
+        expiradas = particoes_expiradas(conn, meses_retencao, hoje)
+
+    removidas = []
+    for nome, anexada in expiradas:
+        if anexada:
+            with engine.begin() as conn:
+                # Não enfileirar atrás de consultas longas: a fila bloquearia os INSERTs da auditoria
+                conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+                conn.execute(text(f"ALTER TABLE {TABELA_LOGS} DETACH PARTITION {nome}"))
+        if pasta_arquivo:
+            with engine.connect() as conn:
+                caminho = arquivar_particao(conn, nome, pasta_arquivo)
+            logger.info("Partição %s arquivada em %s", nome, caminho)
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE {nome}"))
+        removidas.append(nome)
+
+    if _aplicar_retencao_padrao(engine, _limite_retencao(meses_retencao, hoje), pasta_arquivo):
+        removidas.append(PARTICAO_PADRAO)
+    return removidas
+
+
+def _aplicar_retencao_padrao(engine, limite, pasta_arquivo=None):
+    """Remove (e arquiva) as linhas da DEFAULT anteriores ao limite. Retorna quantas saíram."""
+    faixa = f"timestamp < '{limite.isoformat()}'"
+    # Mesmo snapshot para COPY e DELETE: nada é removido sem ter sido arquivado
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        with conn.begin():
+            if not conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {PARTICAO_PADRAO} WHERE {faixa})")).scalar():
+                return 0
+            if pasta_arquivo:
+                os.makedirs(pasta_arquivo, exist_ok=True)
+                # Carimbo da execução: rodadas seguintes não sobrescrevem arquivos anteriores
+                carimbo = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+                caminho = os.path.join(pasta_arquivo, f"{PARTICAO_PADRAO}_{carimbo}.csv.gz")
+                _copiar(conn, f"(SELECT * FROM {PARTICAO_PADRAO} WHERE {faixa})", caminho)
+                logger.info("Linhas antigas de %s arquivadas em %s", PARTICAO_PADRAO, caminho)
+            return conn.execute(text(f"DELETE FROM {PARTICAO_PADRAO} WHERE {faixa}")).rowcount
+
+
+def manter_logs(engine, meses_adiante, meses_retencao, pasta_arquivo=None):
+    """
+    Cria as partições dos próximos meses e aplica a retenção. Retorna
+    (criadas, removidas), ou None se outro processo já está fazendo isso.
+    """
+    with engine.connect() as trava:
+        # Lock de sessão: vale entre as várias transações da retenção
+        if not trava.execute(text("SELECT pg_try_advisory_lock(:chave)"), {"chave": CHAVE_MANUTENCAO}).scalar():
+            trava.rollback()
+            return None
+        trava.commit()
+        try:
+            with engine.begin() as conn:
+                criadas = criar_particoes_logs(conn, meses_adiante)
+            removidas = aplicar_retencao_logs(engine, meses_retencao, pasta_arquivo)
+        finally:
+            trava.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_MANUTENCAO})
+            trava.commit()
+    return criadas, removidas
+
+
+# ----------------------------------------------------------------------
+# Comandos: flask logs criar-particoes | retencao | manutencao
+# ----------------------------------------------------------------------
+
+logs_cli = AppGroup('logs', help="Manutenção das partições da tabela de logs")
+
+
+@logs_cli.command('criar-particoes')
+@click.option('--meses', type=int, default=None, help="Meses à frente (padrão: LOGS_PARTICOES_ADIANTE)")
+def comando_criar_particoes(meses):
+    from app.extensions import db
+
+    if meses is None:
+        meses = current_app.config['LOGS_PARTICOES_ADIANTE']
+    with db.engine.begin() as conn:
+        criadas = criar_particoes_logs(conn, meses)
+    click.echo(f"Partições criadas: {', '.join(criadas)}" if criadas else "Nenhuma partição nova")
+
+
+@logs_cli.command('retencao')
+@click.option('--meses', type=int, default=None, help="Meses mantidos (padrão: LOGS_RETENCAO_MESES)")
+@click.option('--arquivar/--sem-arquivo', default=True, help="Exportar para CSV gzip antes de remover")
+def comando_retencao(meses, arquivar):
+    from app.extensions import db
+
+    if meses is None:
+        meses = current_app.config['LOGS_RETENCAO_MESES']
+    pasta = current_app.config['LOGS_ARQUIVO_PASTA'] if arquivar else None
+    removidas = aplicar_retencao_logs(db.engine, meses, pasta)
+    click.echo(f"Partições removidas: {', '.join(removidas)}" if removidas else "Nenhuma partição expirada")
+
+
+@logs_cli.command('manutencao')
+def comando_manutencao():
+    """Criação de partições e retenção numa só execução (agendada pelo servidor.py ou pelo cron)"""
+    from app.extensions import db
+
+    config = current_app.config
+    resultado = manter_logs(
+        db.engine,
+        config['LOGS_PARTICOES_ADIANTE'],
+        config['LOGS_RETENCAO_MESES'],
+        config['LOGS_ARQUIVO_PASTA'] or None
+    )
+    if resultado is None:
+        click.echo("Manutenção já em andamento em outro processo")
+        return
+    criadas, removidas = resultado
+    click.echo(f"Partições criadas: {', '.join(criadas) or 'nenhuma'}; removidas: {', '.join(removidas) or 'nenhuma'}")
@@ -0,0 +1,114 @@
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+# Limites (s) do histograma de espera por conexão
+FAIXAS_ESPERA = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+# callback(espera, esgotado) chamados a cada checkout medido (ver observar_checkouts)
+_observadores = []
+
+
+def observar_checkouts(callback):
+    """Registra um callback para cada checkout; esgotado indica que DB_POOL_TIMEOUT estourou"""
+    _observadores.append(callback)
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mede quanto cada checkout esperou por uma conexão livre"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_medidas = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self.histograma_espera = [0] * len(FAIXAS_ESPERA)
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexao = super()._do_get()
+        except PoolTimeout:
+            with self._lock_medidas:
+                self.timeouts += 1
+            self._notificar(time.perf_counter() - inicio, True)
+            raise
+        espera = time.perf_counter() - inicio
+        self._registrar_espera(espera)
+        self._notificar(espera, False)
+        return conexao
+
+    def _notificar(self, espera, esgotado):
+        for callback in _observadores:
+            callback(espera, esgotado)
+
+    def _registrar_espera(self, espera):
+        with self._lock_medidas:
+            self.checkouts += 1
+            self.espera_total += espera
+            self.espera_maxima = max(self.espera_maxima, espera)
+            for indice, limite in enumerate(FAIXAS_ESPERA):
+                if espera <= limite:
+                    self.histograma_espera[indice] += 1
+                    break
+
+    def estatisticas(self):
+        return {
+            "tamanho": self.size(),
+            "em_uso": self.checkedout(),
+            "livres": self.checkedin(),
+            # Negativo enquanto o pool base ainda não foi todo aberto
+            "overflow": self.overflow(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "espera_total": self.espera_total,
+            "espera_maxima": self.espera_maxima,
+            "histograma_espera": dict(zip(FAIXAS_ESPERA, self.histograma_espera))
+        }
+
+
+def opcoes_engine(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS a partir das variáveis DB_*.
+
+    Fora do PgBouncer o statement_timeout vai como parâmetro de conexão.
+    Com DB_PGBOUNCER (pool em modo transaction) nada de estado de sessão:
+    o timeout é aplicado por transação em configurar_engine (SET LOCAL).
+    """
+    opcoes = {
+        "poolclass": PoolMedido,
+        "pool_size": config['DB_POOL_SIZE'],
+        "max_overflow": config['DB_MAX_OVERFLOW'],
+        "pool_timeout": config['DB_POOL_TIMEOUT'],
+        "pool_recycle": config['DB_POOL_RECYCLE'],
+        "pool_pre_ping": config['DB_POOL_PRE_PING'],
+        "connect_args": {"application_name": config['DB_APPLICATION_NAME']}
+    }
+    if config['DB_STATEMENT_TIMEOUT_MS'] and not config['DB_PGBOUNCER']:
+        opcoes["connect_args"]["options"] = f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+    return opcoes
+
+
+def configurar_engine(engine, config):
+    """Listeners que dependem da engine já criada"""
+    timeout = config['DB_STATEMENT_TIMEOUT_MS']
+    if config['DB_PGBOUNCER'] and timeout:
+        @event.listens_for(engine, "begin")
+        def _timeout_por_transacao(conn):
+            # Infraestrutura, não consulta da requisição: fora do orçamento de consultas
+            conn.exec_driver_sql(
+                f"SET LOCAL statement_timeout = {int(timeout)}",
+                execution_options={"monitor_consultas": False}
+            )
+
+
+def estatisticas_pool(engine):
+    pool = engine.pool
+    if isinstance(pool, PoolMedido):
+        return pool.estatisticas()
+    return {"status": pool.status()}
@@ -0,0 +1,292 @@
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+
+def sala_usuario(usuario_id):
+    """Sala Socket.IO que reúne as conexões de um usuário em qualquer worker"""
+    return f"usuario:{usuario_id}"
+
+
+class PresencaMemoria:
+    """
+    Registro de presença local ao processo.
+
+    Mantém o mapa usuário -> conjunto de sids (um por aba/dispositivo) e o
+    mapa reverso sid -> usuário, para que a desconexão seja O(1).
+    """
+
+    def __init__(self):
+        self._sids_por_usuario = {}
+        self._usuario_por_sid = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, usuario_id, sid):
+        usuario_id = str(usuario_id)
+        with self._lock:
+            self._usuario_por_sid[sid] = usuario_id
+            self._sids_por_usuario.setdefault(usuario_id, set()).add(sid)
+
+    def remover(self, sid):
+        with self._lock:
+            usuario_id = self._usuario_por_sid.pop(sid, None)
+            if usuario_id is None:
+                return None
+            sids = self._sids_por_usuario.get(usuario_id)
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._sids_por_usuario[usuario_id]
+            return usuario_id
+
+    def usuario_do_sid(self, sid):
+        return self._usuario_por_sid.get(sid)
+
+    def sids_do_usuario(self, usuario_id):
+        with self._lock:
+            return set(self._sids_por_usuario.get(str(usuario_id), ()))
+
+    def esta_online(self, usuario_id):
+        return str(usuario_id) in self._sids_por_usuario
+
+    def estatisticas(self):
+        with self._lock:
+            conexoes_por_usuario = [len(sids) for sids in self._sids_por_usuario.values()]
+        return {
+            "usuarios_online": len(conexoes_por_usuario),
+            "conexoes": sum(conexoes_por_usuario),
+            "max_conexoes_por_usuario": max(conexoes_por_usuario, default=0)
+        }
+
+
+# Scripts Lua: cada alteração de presença é atômica no Redis, sem janela entre
+# ler o usuário do sid e remover o sid do conjunto dele. As chaves por usuário
+# são montadas dentro do script (prefixo em ARGV), o que exige Redis sem cluster.
+_REGISTRAR = """
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('SADD', ARGV[3] .. ':usuario:' .. ARGV[2], ARGV[1])
+redis.call('SADD', ARGV[3] .. ':online', ARGV[2])
+"""
+
+_REMOVER = """
+local function remover(sid, prefixo)
+    local usuario = redis.call('HGET', KEYS[1], sid)
+    if not usuario then
+        return false
+    end
+    redis.call('HDEL', KEYS[1], sid)
+    local chave_usuario = prefixo .. ':usuario:' .. usuario
+    redis.call('SREM', chave_usuario, sid)
+    if redis.call('SCARD', chave_usuario) == 0 then
+        redis.call('SREM', prefixo .. ':online', usuario)
+    end
+    return usuario
+end
+"""
+
+_REMOVER_SID = _REMOVER + """
+redis.call('HDEL', KEYS[2], ARGV[1])
+return remover(ARGV[1], ARGV[2])
+"""
+
+# KEYS[2]: sids do worker morto; KEYS[3]: conjunto de workers
+_LIMPAR_WORKER = _REMOVER + """
+local sids = redis.call('HKEYS', KEYS[2])
+for _, sid in ipairs(sids) do
+    remover(sid, ARGV[1])
+end
+redis.call('DEL', KEYS[2])
+redis.call('SREM', KEYS[3], ARGV[2])
+return #sids
+"""
+
+
+class PresencaRedis:
+    """
+    Registro de presença compartilhado entre workers/nós.
+
+    Cada worker guarda também os próprios sids e renova uma chave de
+    batimento com TTL; quando um worker morre sem desconectar seus sockets,
+    a chave expira e o próximo batimento de qualquer outro worker remove os
+    sids órfãos (senão o usuário ficaria online para sempre).
+
+    Aceita um cliente já construído para permitir testes com um substituto
+    local compatível com Redis (ex.: fakeredis com Lua).
+    """
+
+    def __init__(self, url=None, cliente=None, prefixo='presenca', ttl=60):
+        if cliente is None:
+            import redis
+            cliente = redis.Redis.from_url(url, decode_responses=True)
+        self._redis = cliente
+        self._prefixo = prefixo
+        self.ttl = ttl
+        self._registrar = cliente.register_script(_REGISTRAR)
+        self._remover = cliente.register_script(_REMOVER_SID)
+        self._limpar_worker = cliente.register_script(_LIMPAR_WORKER)
+        self._worker = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _chave_usuario(self, usuario_id):
+        return f"{self._prefixo}:usuario:{usuario_id}"
+
+    @property
+    def _chave_sids(self):
+        return f"{self._prefixo}:sids"
+
+    @property
+    def _chave_online(self):
+        return f"{self._prefixo}:online"
+
+    @property
+    def _chave_workers(self):
+        return f"{self._prefixo}:workers"
+
+    def _chave_sids_worker(self, worker):
+        return f"{self._prefixo}:worker:{worker}:sids"
+
+    def _chave_vivo(self, worker):
+        return f"{self._prefixo}:worker:{worker}:vivo"
+
+    # ------------------------------------------------------------------
+    # Batimento por worker
+    # ------------------------------------------------------------------
+
+    @property
+    def worker(self):
+        """Identificador deste processo; muda após fork, então o batimento recomeça no filho"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._worker = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+                    self._pid = os.getpid()
+                    self.batimento()
+                    threading.Thread(target=self._bater_periodicamente, name='presenca', daemon=True).start()
+                    atexit.register(self.encerrar)
+        return self._worker
+
+    def _bater_periodicamente(self):
+        while True:
+            time.sleep(self.ttl / 3)
+            try:
+                self.batimento()
+            except Exception as e:
+                logger.error("Erro no batimento de presença: %s", e)
+
+    def batimento(self):
+        """Renova a chave deste worker e limpa os sids de workers cujo batimento expirou"""
+        pipe = self._redis.pipeline()
+        pipe.set(self._chave_vivo(self._worker), '1', ex=self.ttl)
+        pipe.sadd(self._chave_workers, self._worker)
+        pipe.execute()
+
+        for worker in self._redis.smembers(self._chave_workers):
+            if worker != self._worker and not self._redis.exists(self._chave_vivo(worker)):
+                removidos = self.limpar_worker(worker)
+                logger.warning("Presença: %s sids do worker %s sem batimento removidos", removidos, worker)
+
+    def limpar_worker(self, worker):
+        return self._limpar_worker(
+            keys=[self._chave_sids, self._chave_sids_worker(worker), self._chave_workers],
+            args=[self._prefixo, worker]
+        )
+
+    def encerrar(self):
+        """Saída normal do worker: remove seus sids sem esperar o TTL"""
+        if self._pid != os.getpid():
+            return
+        try:
+            self._redis.delete(self._chave_vivo(self._worker))
+            self.limpar_worker(self._worker)
+        except Exception as e:
+            logger.error("Erro ao limpar a presença do worker: %s", e)
+
+    # ------------------------------------------------------------------
+    # Registro
+    # ------------------------------------------------------------------
+
+    def registrar(self, usuario_id, sid):
+        self._registrar(
+            keys=[self._chave_sids, self._chave_sids_worker(self.worker)],
+            args=[sid, str(usuario_id), self._prefixo]
+        )
+
+    def remover(self, sid):
+        return self._remover(
+            keys=[self._chave_sids, self._chave_sids_worker(self.worker)],
+            args=[sid, self._prefixo]
+        )
+
+    def usuario_do_sid(self, sid):
+        return self._redis.hget(self._chave_sids, sid)
+
+    def sids_do_usuario(self, usuario_id):
+        return set(self._redis.smembers(self._chave_usuario(usuario_id)))
+
+    def esta_online(self, usuario_id):
+        return self._redis.scard(self._chave_usuario(usuario_id)) > 0
+
+    def estatisticas(self):
+        pipe = self._redis.pipeline()
+        pipe.scard(self._chave_online)
+        pipe.hlen(self._chave_sids)
+        usuarios_online, conexoes = pipe.execute()
+        return {
+            "usuarios_online": usuarios_online,
+            "conexoes": conexoes
+        }
+
+
+class PresencaRegistry:
+    """Fachada configurada por PRESENCA_BACKEND (memoria | redis)"""
+
+    def __init__(self, app=None):
+        self.backend = PresencaMemoria()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        tipo = app.config.get('PRESENCA_BACKEND', 'memoria')
+        if tipo == 'redis':
+            self.backend = PresencaRedis(
+                url=app.config['PRESENCA_REDIS_URL'],
+                ttl=app.config.get('PRESENCA_TTL', 60)
+            )
+        elif tipo == 'memoria':
+            self.backend = PresencaMemoria()
+        else:
+            raise ValueError(f"PRESENCA_BACKEND inválido: {tipo}")
+        app.extensions['presenca'] = self
+
+    def registrar(self, usuario_id, sid):
+        self.backend.registrar(usuario_id, sid)
+
+    def remover(self, sid):
+        return self.backend.remover(sid)
+
+    def usuario_do_sid(self, sid):
+        return self.backend.usuario_do_sid(sid)
+
+    def sids_do_usuario(self, usuario_id):
+        return self.backend.sids_do_usuario(usuario_id)
+
+    def conexoes_do_usuario(self, usuario_id):
+        return len(self.backend.sids_do_usuario(usuario_id))
+
+    def esta_online(self, usuario_id):
+        return self.backend.esta_online(usuario_id)
+
+    def estatisticas(self):
+        """Contadores para monitoramento: usuários online e conexões abertas"""
+        return self.backend.estatisticas()
+
+
+presenca = PresencaRegistry()
@@ -0,0 +1,177 @@
+import atexit
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+
+class SenhaSobrecarregada(Exception):
+    """O serviço de senhas está no limite; a requisição deve responder 503"""
+
+
+def _gerar_hash(senha, rounds):
+    return bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verificar(senha, senha_hash):
+    try:
+        return bcrypt.checkpw(senha.encode('utf-8'), senha_hash.encode('utf-8'))
+    except ValueError:
+        # Hash malformado no banco: tratar como senha incorreta
+        return False
+
+
+def _eventlet_ativo():
+    if 'eventlet' not in sys.modules:
+        return False
+    from eventlet import patcher
+    return patcher.is_monkey_patched('thread')
+
+
+def _semaforo_nativo(valor):
+    # Liberado também pelas threads reais do tpool, onde o semáforo verde do
+    # monkey_patch não é seguro; acquire/release nunca bloqueiam, então o nativo serve
+    if _eventlet_ativo():
+        from eventlet import patcher
+        return patcher.original('threading').BoundedSemaphore(valor)
+    return threading.BoundedSemaphore(valor)
+
+
+class ServicoSenhas:
+    """
+    Hash e verificação de senhas (bcrypt) fora da thread da requisição.
+
+    O trabalho roda num ProcessPoolExecutor de SENHA_WORKERS processos (sob
+    eventlet, em SENHA_WORKERS threads nativas do tpool). No máximo SENHA_WORKERS +
+    SENHA_FILA_MAXIMA operações ficam em andamento;
+    acima disso, ou se o resultado passar de SENHA_TIMEOUT segundos, a
+    chamada falha na hora com SenhaSobrecarregada em vez de acumular latência.
+    SENHA_WORKERS=0 executa na própria thread (desenvolvimento/testes).
+    """
+
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = 0
+        self.timeout = 5.0
+        self._vagas = None
+        self._pool = None
+        self._pid = None
+        self._atexit_registrado = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.workers = app.config.get('SENHA_WORKERS', os.cpu_count() or 1)
+        self.timeout = app.config.get('SENHA_TIMEOUT', 5.0)
+        self._vagas = _semaforo_nativo(self.workers + app.config.get('SENHA_FILA_MAXIMA', 32))
+        if self.workers and _eventlet_ativo() and 'EVENTLET_THREADPOOL_SIZE' not in os.environ:
+            # O tpool padrão tem 20 threads; o paralelismo do bcrypt deve ser o configurado
+            from eventlet import tpool
+            tpool.set_num_threads(self.workers)
+        app.extensions['senhas'] = self
+        # Cada create_app() (testes, CLI) chama init_app: um único hook basta
+        with self._lock:
+            if not self._atexit_registrado:
+                atexit.register(self.parar)
+                self._atexit_registrado = True
+
+    def gerar_hash(self, senha):
+        return self._executar(_gerar_hash, senha, self.rounds)
+
+    def verificar(self, senha_hash, senha):
+        return self._executar(_verificar, senha, senha_hash)
+
+    def precisa_rehash(self, senha_hash):
+        """True quando o hash foi gerado com um custo diferente de BCRYPT_LOG_ROUNDS"""
+        try:
+            return int(senha_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def _executar(self, funcao, *argumentos):
+        if not self.workers:
+            return funcao(*argumentos)
+
+        if not self._vagas.acquire(blocking=False):
+            raise SenhaSobrecarregada("Fila de hash de senhas cheia")
+
+        if _eventlet_ativo():
+            return self._executar_tpool(funcao, *argumentos)
+
+        try:
+            futuro = self._obter_pool().submit(funcao, *argumentos)
+        except BrokenProcessPool:
+            self._vagas.release()
+            self._descartar_pool()
+            raise SenhaSobrecarregada("Pool de hash de senhas indisponível")
+        except Exception:
+            self._vagas.release()
+            raise
+        # A vaga só é liberada quando o processo termina, mesmo após timeout
+        futuro.add_done_callback(lambda _: self._vagas.release())
+
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FuturoTimeout:
+            raise SenhaSobrecarregada("Tempo esgotado no hash de senha")
+        except BrokenProcessPool:
+            # Um processo filho morreu (ex.: OOM); o próximo pedido recria o pool
+            self._descartar_pool()
+            raise SenhaSobrecarregada("Pool de hash de senhas indisponível")
+
+    def _executar_tpool(self, funcao, *argumentos):
+        # Sob eventlet (servidor.py) fork + multiprocessing não se dão bem com o hub;
+        # o bcrypt libera o GIL, então threads reais do tpool já rodam em paralelo
+        from eventlet import Timeout, tpool
+
+        def tarefa():
+            # Como no pool de processos, a vaga só volta quando o bcrypt termina:
+            # o Timeout libera a requisição, não a thread do tpool
+            try:
+                return funcao(*argumentos)
+            finally:
+                self._vagas.release()
+
+        with Timeout(self.timeout, SenhaSobrecarregada("Tempo esgotado no hash de senha")):
+            return tpool.execute(tarefa)
+
+    def _obter_pool(self):
+        # Um pool por processo: workers criados por fork não herdam o do pai
+        if self._pool is not None and self._pid == os.getpid():
+            return self._pool
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+        return self._pool
+
+    def _descartar_pool(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            logger.error("Pool de hash de senhas quebrado; recriando")
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def parar(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def estatisticas(self):
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            # Semáforo sem API pública de leitura
+            "vagas_livres": self._vagas._value if self._vagas is not None else 0
+        }
+
+
+servico_senhas = ServicoSenhas()
@@ -0,0 +1,108 @@
+import logging
+
+from app.cache import CacheTTL, criar_canal
+from app.models import Sessao
+
+logger = logging.getLogger(__name__)
+
+
+class ValidadorSessoes:
+    """
+    Validação de sessões (jti) compartilhada por todos os recursos protegidos.
+
+    Sessões válidas ficam num cache LRU com TTL e jtis revogados num conjunto
+    próprio; logout e exclusão de conta invalidam as entradas na hora, também
+    nos outros workers através do canal de invalidação.
+    """
+
+    def __init__(self, app=None):
+        self._validas = CacheTTL()
+        self._revogadas = CacheTTL()
+        self._canal = None
+        self._ao_revogar = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._validas = CacheTTL(
+            tamanho_maximo=app.config.get('SESSAO_CACHE_TAMANHO', 10000),
+            ttl=app.config.get('SESSAO_CACHE_TTL', 300)
+        )
+        # Um jti revogado só precisa ser lembrado enquanto o token ainda não expirou
+        self._revogadas = CacheTTL(
+            tamanho_maximo=app.config.get('SESSAO_CACHE_TAMANHO', 10000),
+            ttl=app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()
+        )
+        self._canal = criar_canal(app, 'sessoes')
+        self._canal.assinar(self._aplicar)
+        app.extensions['sessoes'] = self
+
+    def sessao_valida(self, usuario_id, jti, exigir_2fa=True):
+        # Checada em toda requisição e quase sempre ausente: fora das estatísticas
+        if self._revogadas.contem(jti, contar=False):
+            return False
+
+        sessao = self._validas.obter(jti)
+        if sessao is None:
+            registro = Sessao.query.filter_by(jwt_token=jti).first()
+            if registro is None:
+                self._revogadas.definir(jti, True)
+                return False
+            sessao = {
+                "usuario_id": str(registro.id_usuario),
+                "dois_fatores": bool(registro.doisFatoresSessao)
+            }
+            self._validas.definir(jti, sessao)
+
+        if sessao["usuario_id"] != str(usuario_id):
+            return False
+        return sessao["dois_fatores"] or not exigir_2fa
+
+    def token_revogado(self, jwt_header, jwt_payload):
+        """Callback para JWTManager.token_in_blocklist_loader"""
+        return not self.sessao_valida(jwt_payload['sub'], jwt_payload['jti'], exigir_2fa=False)
+
+    def revogar(self, jti):
+        """Invalida uma sessão neste e nos demais workers"""
+        self._publicar({"tipo": "jti", "valor": jti})
+
+    def revogar_usuario(self, usuario_id):
+        """Invalida todas as sessões de um usuário neste e nos demais workers"""
+        self._publicar({"tipo": "usuario", "valor": str(usuario_id)})
+
+    def ao_revogar(self, callback):
+        """Registra callback(jti=..., usuario_id=...) chamado a cada revogação recebida"""
+        self._ao_revogar.append(callback)
+
+    def _publicar(self, mensagem):
+        # Aplica já neste processo: o jti revogado não pode passar enquanto o eco do Redis não chega
+        self._aplicar(mensagem)
+        if self._canal is None or not self._canal.distribuido:
+            return
+        try:
+            self._canal.publicar(mensagem)
+        except Exception as e:
+            # Chamado depois do commit: falhar aqui não pode virar erro no logout
+            logger.error("Erro ao publicar revogação de sessão: %s", e)
+
+    def _aplicar(self, mensagem):
+        if mensagem["tipo"] == "jti":
+            self._validas.remover(mensagem["valor"])
+            self._revogadas.definir(mensagem["valor"], True)
+            argumentos = {"jti": mensagem["valor"]}
+        else:
+            usuario_id = mensagem["valor"]
+            self._validas.remover_se(lambda jti, sessao: sessao["usuario_id"] == usuario_id)
+            argumentos = {"usuario_id": usuario_id}
+
+        for callback in self._ao_revogar:
+            callback(**argumentos)
+
+    def estatisticas(self):
+        return {
+            "validas": self._validas.estatisticas(),
+            "revogadas": self._revogadas.estatisticas()
+        }
+
+
+sessoes = ValidadorSessoes()
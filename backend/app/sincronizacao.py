@@ -0,0 +1,45 @@
+from collections import Counter
+from enum import Enum
+from app.extensions import db
+from app.models import Alteracao, VersaoUsuario
+
+
+def registrar_alteracao(usuarios, tipo, ids_objetos):
+    """
+    Acrescenta mudanças à sequência de cada usuário afetado e avança a sua versão.
+    Não faz commit: as linhas entram na mesma transação da escrita que as originou.
+    :param usuarios: ids dos usuários que devem receber a mudança
+    :param tipo: AlteracaoTipo
+    :param ids_objetos: id (ou lista de ids) da mensagem, conversa ou contato alterado
+    """
+    if not isinstance(ids_objetos, (list, tuple, set)):
+        ids_objetos = [ids_objetos]
+    registrar_alteracoes(
+        [(usuario_id, id_objeto) for usuario_id in usuarios for id_objeto in ids_objetos],
+        tipo
+    )
+
+
+def registrar_alteracoes(pares, tipo):
+    """
+    Como registrar_alteracao, para pares (usuário, objeto) diferentes entre si:
+    um upsert de versões e um INSERT no total, em vez de dois por par.
+
+    As versões são reservadas antes do INSERT e dão o seq de cada linha; como a
+    reserva trava a linha do usuário até o commit, um seq menor nunca fica
+    visível depois de um maior e o cursor de /sync não pula alterações.
+    """
+    tipo = tipo.value if isinstance(tipo, Enum) else tipo
+    pares = [(str(usuario_id), id_objeto) for usuario_id, id_objeto in pares]
+    if not pares:
+        return
+
+    quantidades = Counter(usuario_id for usuario_id, _ in pares)
+    versoes = VersaoUsuario.reservar(quantidades)
+    proximo = {usuario_id: versoes[usuario_id] - quantidade + 1 for usuario_id, quantidade in quantidades.items()}
+
+    linhas = []
+    for usuario_id, id_objeto in pares:
+        linhas.append({"id_usuario": usuario_id, "seq": proximo[usuario_id], "tipo": tipo, "id_objeto": id_objeto})
+        proximo[usuario_id] += 1
+    db.session.execute(Alteracao.__table__.insert(), linhas)
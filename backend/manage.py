@@ -1,13 +1,10 @@
 from app import create_app
-from app.extensions import db, socketio
+from app.extensions import socketio
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, use_reloader=True)
-    with app.app_context():
-        db.create_all() 
-        
+    # Servidor de desenvolvimento; o banco é preparado antes com `flask db-bootstrap`
     socketio.run(
         app,
         debug=True,
@@ -15,4 +12,4 @@ if __name__ == '__main__':
         port=5000,
         use_reloader=True,
         log_output=app.config['SOCKETIO_LOGGER']
-    )
\ No newline at end of file
+    )
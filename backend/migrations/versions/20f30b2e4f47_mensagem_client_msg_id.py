@@ -0,0 +1,26 @@
+"""chave de idempotência das mensagens enviadas pelo cliente
+
+Revision ID: 20f30b2e4f47
+Revises: fa795bc7b394
+Create Date: 2026-10-17 11:05:32.870114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20f30b2e4f47'
+down_revision = 'fa795bc7b394'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('mensagens', sa.Column('client_msg_id', sa.Text(), nullable=True))
+    op.create_unique_constraint('unique_mensagem_cliente', 'mensagens', ['id_usuario', 'client_msg_id'])
+
+
+def downgrade():
+    op.drop_constraint('unique_mensagem_cliente', 'mensagens', type_='unique')
+    op.drop_column('mensagens', 'client_msg_id')
@@ -0,0 +1,97 @@
+"""logs particionados por mês em timestamp
+
+Revision ID: 32ee5b811dd0
+Revises: 8e4ef95f312b
+Create Date: 2026-10-17 13:40:51.207714
+
+A tabela existente é copiada para uma nova tabela particionada (uma
+partição por mês com dados, mais os próximos meses e a DEFAULT) e depois
+trocada pelo nome. Em bases grandes rode numa janela de manutenção: a
+cópia segura um lock exclusivo em logs.
+
+"""
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '32ee5b811dd0'
+down_revision = '8e4ef95f312b'
+branch_labels = None
+depends_on = None
+
+MESES_ADIANTE = 3
+
+
+def _somar_meses(dia, meses):
+    total = dia.year * 12 + dia.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def upgrade():
+    conn = op.get_bind()
+    op.execute("LOCK TABLE logs IN ACCESS EXCLUSIVE MODE")
+
+    op.execute("""
+        CREATE TABLE logs_novo (
+            id UUID NOT NULL,
+            id_usuario UUID REFERENCES usuarios (id) ON DELETE CASCADE,
+            categoria TEXT NOT NULL,
+            severidade TEXT NOT NULL,
+            acao TEXT NOT NULL,
+            detalhe TEXT,
+            ip_origem INET,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            metadados TEXT,
+            CONSTRAINT logs_novo_pkey PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("CREATE TABLE logs_padrao PARTITION OF logs_novo DEFAULT")
+
+    hoje = datetime.now(timezone.utc).date()
+    mais_antigo = conn.execute(sa.text("SELECT min(timestamp) FROM logs")).scalar()
+    inicio = date((mais_antigo or hoje).year, (mais_antigo or hoje).month, 1)
+    fim = _somar_meses(date(hoje.year, hoje.month, 1), MESES_ADIANTE)
+    mes = inicio
+    while mes <= fim:
+        op.execute(
+            f"CREATE TABLE logs_{mes.year:04d}_{mes.month:02d} PARTITION OF logs_novo "
+            f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{_somar_meses(mes, 1).isoformat()}')"
+        )
+        mes = _somar_meses(mes, 1)
+
+    op.execute("""
+        INSERT INTO logs_novo (id, id_usuario, categoria, severidade, acao, detalhe, ip_origem, timestamp, metadados)
+        SELECT id, id_usuario, categoria, severidade, acao, detalhe, ip_origem, coalesce(timestamp, now()), metadados
+        FROM logs
+    """)
+
+    op.drop_table('logs')
+    op.rename_table('logs_novo', 'logs')
+    op.execute("ALTER TABLE logs RENAME CONSTRAINT logs_novo_pkey TO logs_pkey")
+    op.execute("ALTER TABLE logs RENAME CONSTRAINT logs_novo_id_usuario_fkey TO logs_id_usuario_fkey")
+    op.create_index('ix_logs_usuario_timestamp', 'logs', ['id_usuario', 'timestamp'])
+
+
+def downgrade():
+    op.execute("""
+        CREATE TABLE logs_antigo (
+            id UUID PRIMARY KEY,
+            id_usuario UUID REFERENCES usuarios (id) ON DELETE CASCADE,
+            categoria TEXT NOT NULL,
+            severidade TEXT NOT NULL,
+            acao TEXT NOT NULL,
+            detalhe TEXT,
+            ip_origem INET,
+            timestamp TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            metadados TEXT
+        )
+    """)
+    op.execute("INSERT INTO logs_antigo SELECT * FROM logs")
+    op.drop_table('logs')
+    op.rename_table('logs_antigo', 'logs')
+    op.execute("ALTER TABLE logs RENAME CONSTRAINT logs_antigo_pkey TO logs_pkey")
+    op.execute("ALTER TABLE logs RENAME CONSTRAINT logs_antigo_id_usuario_fkey TO logs_id_usuario_fkey")
+    op.create_index('ix_logs_usuario_timestamp', 'logs', ['id_usuario', 'timestamp'])
@@ -0,0 +1,43 @@
+"""sequência por usuário em alteracoes (cursor de /sync)
+
+Revision ID: 5b0c9e1d7a42
+Revises: 714e7e977f6c
+Create Date: 2026-10-17 17:02:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b0c9e1d7a42'
+down_revision = '714e7e977f6c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('alteracoes', sa.Column('seq', sa.BigInteger(), nullable=True))
+    # Linhas existentes: numeradas por usuário na ordem do id global
+    op.execute("""
+        UPDATE alteracoes a SET seq = n.seq
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY id_usuario ORDER BY id) AS seq
+            FROM alteracoes
+        ) n
+        WHERE a.id = n.id
+    """)
+    # A próxima reserva precisa começar acima do maior seq de cada usuário
+    op.execute("""
+        INSERT INTO versoes_usuario (id_usuario, versao)
+        SELECT id_usuario, max(seq) FROM alteracoes GROUP BY id_usuario
+        ON CONFLICT (id_usuario) DO UPDATE
+        SET versao = GREATEST(versoes_usuario.versao, EXCLUDED.versao)
+    """)
+    op.alter_column('alteracoes', 'seq', nullable=False)
+    op.create_unique_constraint('unique_alteracao_usuario_seq', 'alteracoes', ['id_usuario', 'seq'])
+
+
+def downgrade():
+    op.drop_constraint('unique_alteracao_usuario_seq', 'alteracoes', type_='unique')
+    op.drop_column('alteracoes', 'seq')
@@ -0,0 +1,37 @@
+"""sequência de alterações para sincronização incremental
+
+Revision ID: 6e1f2b1323e6
+Revises: 20f30b2e4f47
+Create Date: 2026-10-17 11:48:19.402663
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '6e1f2b1323e6'
+down_revision = '20f30b2e4f47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('alteracoes',
+    sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+    sa.Column('id_usuario', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('tipo', sa.Text(), nullable=False),
+    sa.Column('id_objeto', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['id_usuario'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_alteracoes_usuario_id', 'alteracoes', ['id_usuario', 'id'])
+    op.add_column('mensagens', sa.Column('exclusao', sa.Boolean(), server_default='false', nullable=False))
+
+
+def downgrade():
+    op.drop_column('mensagens', 'exclusao')
+    op.drop_index('ix_alteracoes_usuario_id', table_name='alteracoes')
+    op.drop_table('alteracoes')
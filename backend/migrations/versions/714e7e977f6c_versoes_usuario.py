@@ -0,0 +1,36 @@
+"""versão por usuário para validação condicional (ETag)
+
+Revision ID: 714e7e977f6c
+Revises: cde7a3181cf6
+Create Date: 2026-10-17 14:48:19.330571
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '714e7e977f6c'
+down_revision = 'cde7a3181cf6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('versoes_usuario',
+    sa.Column('id_usuario', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('versao', sa.BigInteger(), nullable=False),
+    sa.Column('atualizado_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['id_usuario'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id_usuario')
+    )
+    # Parte da versão atual de cada usuário a partir da sequência de alterações
+    op.execute("""
+        INSERT INTO versoes_usuario (id_usuario, versao)
+        SELECT id_usuario, count(*) FROM alteracoes GROUP BY id_usuario
+    """)
+
+
+def downgrade():
+    op.drop_table('versoes_usuario')
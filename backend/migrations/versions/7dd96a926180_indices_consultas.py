@@ -0,0 +1,48 @@
+"""indices para as consultas mais frequentes
+
+Revision ID: 7dd96a926180
+Revises: eb43d3af751e
+Create Date: 2026-10-17 09:40:07.552910
+
+Os índices usam IF NOT EXISTS porque bancos criados por db.create_all já
+podem tê-los a partir dos modelos.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7dd96a926180'
+down_revision = 'eb43d3af751e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Histórico de mensagens (cursor) e anonimização de mensagens do usuário
+    op.create_index('ix_mensagens_conversa_data_envio', 'mensagens',
+                    ['id_conversa', sa.text('data_envio DESC'), sa.text('id DESC')],
+                    if_not_exists=True)
+    op.create_index(op.f('ix_mensagens_id_usuario'), 'mensagens', ['id_usuario'], if_not_exists=True)
+
+    # id_usuario1 já é coberto pela unique (id_usuario1, id_usuario2)
+    op.create_index(op.f('ix_conversas_id_usuario2'), 'conversas', ['id_usuario2'], if_not_exists=True)
+
+    # /auth/me, logout e exclusão de conta buscam a sessão pelo jti
+    op.create_index(op.f('ix_sessoes_jwt_token'), 'sessoes', ['jwt_token'], if_not_exists=True)
+
+    op.create_index('ix_doisfatores_usuario_timestamp', 'doisfatores',
+                    ['id_usuario', sa.text('timestamp DESC')], if_not_exists=True)
+    op.create_index('ix_logs_usuario_timestamp', 'logs', ['id_usuario', 'timestamp'], if_not_exists=True)
+    op.create_index(op.f('ix_contatos_id_contato'), 'contatos', ['id_contato'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_contatos_id_contato'), table_name='contatos')
+    op.drop_index('ix_logs_usuario_timestamp', table_name='logs')
+    op.drop_index('ix_doisfatores_usuario_timestamp', table_name='doisfatores')
+    op.drop_index(op.f('ix_sessoes_jwt_token'), table_name='sessoes')
+    op.drop_index(op.f('ix_conversas_id_usuario2'), table_name='conversas')
+    op.drop_index(op.f('ix_mensagens_id_usuario'), table_name='mensagens')
+    op.drop_index('ix_mensagens_conversa_data_envio', table_name='mensagens')
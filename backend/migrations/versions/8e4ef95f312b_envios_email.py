@@ -0,0 +1,40 @@
+"""acompanhamento da fila de envio de e-mails
+
+Revision ID: 8e4ef95f312b
+Revises: b338d56e777a
+Create Date: 2026-10-17 13:05:12.481203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4ef95f312b'
+down_revision = 'b338d56e777a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('envios_email',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('id_usuario', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('destinatario', sa.Text(), nullable=False),
+    sa.Column('assunto', sa.Text(), nullable=False),
+    sa.Column('status', sa.Text(), nullable=False),
+    sa.Column('tentativas', sa.Integer(), nullable=False),
+    sa.Column('ultimo_erro', sa.Text(), nullable=True),
+    sa.Column('criado_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('atualizado_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('enviado_em', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['id_usuario'], ['usuarios.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_envios_email_id_usuario'), 'envios_email', ['id_usuario'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_envios_email_id_usuario'), table_name='envios_email')
+    op.drop_table('envios_email')
@@ -0,0 +1,33 @@
+"""marca de leitura por participante da conversa
+
+Revision ID: b338d56e777a
+Revises: 6e1f2b1323e6
+Create Date: 2026-10-17 12:30:44.915027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b338d56e777a'
+down_revision = '6e1f2b1323e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('estado_conversas',
+    sa.Column('id_usuario', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('id_conversa', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('lida_ate', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('atualizado_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['id_conversa'], ['conversas.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['id_usuario'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id_usuario', 'id_conversa')
+    )
+
+
+def downgrade():
+    op.drop_table('estado_conversas')
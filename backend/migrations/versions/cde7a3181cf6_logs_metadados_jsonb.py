@@ -0,0 +1,38 @@
+"""metadados de logs em JSONB com índice GIN
+
+Revision ID: cde7a3181cf6
+Revises: 32ee5b811dd0
+Create Date: 2026-10-17 14:12:33.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'cde7a3181cf6'
+down_revision = '32ee5b811dd0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Todo conteúdo existente foi gerado por json.dumps; o ALTER propaga para as partições
+    op.alter_column('logs', 'metadados',
+                    existing_type=sa.Text(),
+                    type_=postgresql.JSONB(),
+                    postgresql_using='metadados::jsonb',
+                    existing_nullable=True)
+    op.create_index('ix_logs_metadados', 'logs', ['metadados'],
+                    postgresql_using='gin',
+                    postgresql_ops={'metadados': 'jsonb_path_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_logs_metadados', table_name='logs')
+    op.alter_column('logs', 'metadados',
+                    existing_type=postgresql.JSONB(),
+                    type_=sa.Text(),
+                    postgresql_using='metadados::text',
+                    existing_nullable=True)
@@ -0,0 +1,104 @@
+"""esquema inicial
+
+Revision ID: eb43d3af751e
+Revises: 
+Create Date: 2026-10-17 09:12:41.318204
+
+Bancos criados antes das migrações (via db.create_all) já possuem estas
+tabelas: marque-os com `flask db stamp eb43d3af751e` antes do upgrade.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'eb43d3af751e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('usuarios',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('nome', sa.Text(), nullable=True),
+    sa.Column('email', sa.Text(), nullable=False),
+    sa.Column('senha_hash', sa.Text(), nullable=False),
+    sa.Column('dois_fatores_ativo', sa.Boolean(), nullable=True),
+    sa.Column('data_criacao', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('ultimo_login', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('foto_perfil', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_usuarios_email'), 'usuarios', ['email'], unique=True)
+    op.create_table('sessoes',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('id_usuario', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('jwt_token', sa.Text(), nullable=False),
+    sa.Column('doisFatoresSessao', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['id_usuario'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('contatos',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('id_usuario', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('id_contato', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('bloqueio', sa.Boolean(), nullable=True),
+    sa.Column('data_criacao', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['id_usuario'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('id_usuario', 'id_contato', name='unique_contato_usuario')
+    )
+    op.create_table('conversas',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('id_usuario1', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('id_usuario2', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('data_criacao', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['id_usuario1'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['id_usuario2'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('id_usuario1', 'id_usuario2', name='unique_conversa_usuarios')
+    )
+    op.create_table('mensagens',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('id_conversa', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('id_usuario', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('texto_criptografado', sa.Text(), nullable=False),
+    sa.Column('data_envio', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['id_conversa'], ['conversas.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['id_usuario'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('logs',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('id_usuario', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('categoria', sa.Text(), nullable=False),
+    sa.Column('severidade', sa.Text(), nullable=False),
+    sa.Column('acao', sa.Text(), nullable=False),
+    sa.Column('detalhe', sa.Text(), nullable=True),
+    sa.Column('ip_origem', postgresql.INET(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('metadados', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['id_usuario'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('doisfatores',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('id_usuario', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('codigo', sa.Text(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['id_usuario'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('doisfatores')
+    op.drop_table('logs')
+    op.drop_table('mensagens')
+    op.drop_table('conversas')
+    op.drop_table('contatos')
+    op.drop_table('sessoes')
+    op.drop_index(op.f('ix_usuarios_email'), table_name='usuarios')
+    op.drop_table('usuarios')
@@ -0,0 +1,58 @@
+"""participantes da conversa em ordem canônica
+
+Revision ID: fa795bc7b394
+Revises: 7dd96a926180
+Create Date: 2026-10-17 10:21:55.104377
+
+Conversas espelhadas (A,B) e (B,A) são fundidas na mais antiga, com as
+mensagens movidas para ela, e as restantes passam a guardar o menor UUID
+em id_usuario1.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'fa795bc7b394'
+down_revision = '7dd96a926180'
+branch_labels = None
+depends_on = None
+
+
+PARES_ESPELHADOS = """
+    SELECT manter.id AS id_manter, remover.id AS id_remover
+    FROM conversas manter
+    JOIN conversas remover
+      ON manter.id_usuario1 = remover.id_usuario2
+     AND manter.id_usuario2 = remover.id_usuario1
+    WHERE manter.id_usuario1 <> manter.id_usuario2
+      AND (manter.data_criacao, manter.id) < (remover.data_criacao, remover.id)
+"""
+
+
+def upgrade():
+    op.execute(f"""
+        UPDATE mensagens m
+        SET id_conversa = pares.id_manter
+        FROM ({PARES_ESPELHADOS}) pares
+        WHERE m.id_conversa = pares.id_remover
+    """)
+    op.execute(f"""
+        DELETE FROM conversas
+        WHERE id IN (SELECT id_remover FROM ({PARES_ESPELHADOS}) pares)
+    """)
+    op.execute("""
+        UPDATE conversas
+        SET id_usuario1 = id_usuario2, id_usuario2 = id_usuario1
+        WHERE id_usuario1 > id_usuario2
+    """)
+    op.create_check_constraint(
+        'ck_conversa_participantes_ordenados',
+        'conversas',
+        'id_usuario1 <= id_usuario2'
+    )
+
+
+def downgrade():
+    # A fusão das conversas espelhadas não é revertida
+    op.drop_constraint('ck_conversa_participantes_ordenados', 'conversas', type_='check')
@@ -0,0 +1,194 @@
+"""
+Soak de conexões Socket.IO no servidor de produção (servidor.py, eventlet).
+
+Abre --conexoes clientes simulados (AsyncClient, websocket) contra um
+worker, mede a memória residente do processo por conexão e a latência de
+send_message -> receive_message entre dois clientes de sonda, com o
+servidor vazio, logo após abrir todas as conexões e ao fim de --manter
+segundos com elas ociosas (respondendo pings).
+
+    python -m scripts.bench_conexoes [--conexoes 10000] [--usuarios 1000] [--manter 120]
+
+Requer o cliente assíncrono do python-socketio (requirements-dev.txt) e
+limite de arquivos abertos acima de --conexoes (o script tenta elevar o
+limite flexível até o rígido; o servidor herda o mesmo limite).
+"""
+import argparse
+import asyncio
+import resource
+import time
+from uuid import uuid4
+
+import socketio
+from socketio.exceptions import TimeoutError as TempoEsgotado
+
+from scripts.comum import (
+    configurar_ambiente,
+    criar_usuarios,
+    emitir_token,
+    formatar_percentis,
+    iniciar_servidor,
+    memoria_kb,
+    parar_servidor,
+    percentis,
+    preparar_banco
+)
+
+
+def elevar_limite_arquivos(necessario):
+    flexivel, rigido = resource.getrlimit(resource.RLIMIT_NOFILE)
+    alvo = rigido if rigido != resource.RLIM_INFINITY else max(flexivel, necessario)
+    if flexivel < alvo:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (alvo, rigido))
+    if alvo < necessario:
+        print(f"Aviso: limite de arquivos abertos ({alvo}) abaixo de {necessario}; aumente com ulimit -n")
+
+
+def criar_conversa(app, usuario_a, usuario_b):
+    from app.extensions import db
+    from app.models import Conversa
+
+    with app.app_context():
+        id_usuario1, id_usuario2 = Conversa.ordenar_participantes(usuario_a, usuario_b)
+        conversa = Conversa(id=uuid4(), id_usuario1=id_usuario1, id_usuario2=id_usuario2)
+        db.session.add(conversa)
+        db.session.commit()
+        return str(conversa.id)
+
+
+class Carga:
+    def __init__(self, url, espera):
+        self.url = url
+        self.espera = espera
+        self.clientes = []
+        self.tempos_conexao = []
+        self.falhas = 0
+        self.quedas = 0
+        self.encerrando = False
+
+    async def conectar(self, token):
+        cliente = socketio.AsyncClient(reconnection=False)
+
+        @cliente.on('disconnect')
+        async def ao_desconectar(*_):
+            if not self.encerrando:
+                self.quedas += 1
+
+        inicio = time.perf_counter()
+        await cliente.connect(self.url, auth={'token': token}, transports=['websocket'], wait_timeout=self.espera)
+        self.tempos_conexao.append(time.perf_counter() - inicio)
+        return cliente
+
+    async def abrir(self, tokens, quantidade, concorrencia):
+        limite = asyncio.Semaphore(concorrencia)
+
+        async def abrir_uma(token):
+            async with limite:
+                try:
+                    self.clientes.append(await self.conectar(token))
+                except Exception:
+                    self.falhas += 1
+
+        await asyncio.gather(*(abrir_uma(tokens[n % len(tokens)]) for n in range(quantidade)))
+
+    async def fechar(self):
+        self.encerrando = True
+        await asyncio.gather(*(cliente.disconnect() for cliente in self.clientes), return_exceptions=True)
+
+
+async def sondar(remetente, destinatario, conversa_id, quantidade, espera):
+    laco = asyncio.get_running_loop()
+    pendentes = {}
+
+    @destinatario.on('receive_message')
+    async def ao_receber(dados):
+        futuro = pendentes.get(dados.get('texto'))
+        if futuro is not None and not futuro.done():
+            futuro.set_result(time.perf_counter())
+
+    entregas, perdidas = [], 0
+    for _ in range(quantidade):
+        marcador = uuid4().hex
+        pendentes[marcador] = laco.create_future()
+        inicio = time.perf_counter()
+        try:
+            resposta = await remetente.call('send_message', {'conversa_id': conversa_id, 'texto': marcador}, timeout=espera)
+            if not resposta or not resposta.get('ok'):
+                raise RuntimeError(f"send_message falhou: {resposta}")
+            entregas.append(await asyncio.wait_for(pendentes[marcador], espera) - inicio)
+        except (asyncio.TimeoutError, TempoEsgotado):
+            perdidas += 1
+        finally:
+            pendentes.pop(marcador, None)
+    return percentis(entregas), perdidas
+
+
+async def executar(args, servidor, tokens_carga, tokens_sonda, conversa_id):
+    url = f'http://127.0.0.1:{args.porta}'
+    carga = Carga(url, args.espera)
+    remetente = await carga.conectar(tokens_sonda[0])
+    destinatario = await carga.conectar(tokens_sonda[1])
+    carga.tempos_conexao.clear()
+
+    await sondar(remetente, destinatario, conversa_id, 20, args.espera)
+    memoria_base = memoria_kb(servidor.pid)
+    latencia, perdidas = await sondar(remetente, destinatario, conversa_id, args.sondas, args.espera)
+    print(f"servidor vazio     | RSS {memoria_base / 1024:.1f} MiB | entrega: {formatar_percentis(latencia)} | perdidas={perdidas}")
+
+    inicio = time.monotonic()
+    await carga.abrir(tokens_carga, args.conexoes, args.concorrencia)
+    abertas = len(carga.clientes)
+    memoria = memoria_kb(servidor.pid)
+    por_conexao = (memoria - memoria_base) / abertas if abertas else 0
+    print(f"{abertas} conexões em {time.monotonic() - inicio:.1f}s (falhas={carga.falhas}) | "
+          f"connect: {formatar_percentis(percentis(carga.tempos_conexao))}")
+    latencia, perdidas = await sondar(remetente, destinatario, conversa_id, args.sondas, args.espera)
+    print(f"após abrir         | RSS {memoria / 1024:.1f} MiB ({por_conexao:.1f} KiB/conexão) | "
+          f"entrega: {formatar_percentis(latencia)} | perdidas={perdidas}")
+
+    await asyncio.sleep(args.manter)
+    memoria = memoria_kb(servidor.pid)
+    latencia, perdidas = await sondar(remetente, destinatario, conversa_id, args.sondas, args.espera)
+    print(f"após {args.manter:.0f}s ociosas | RSS {memoria / 1024:.1f} MiB | quedas={carga.quedas} | "
+          f"entrega: {formatar_percentis(latencia)} | perdidas={perdidas}")
+
+    carga.clientes += [remetente, destinatario]
+    await carga.fechar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conexoes', type=int, default=10000)
+    parser.add_argument('--usuarios', type=int, default=1000, help="Usuários distintos entre as conexões de carga")
+    parser.add_argument('--concorrencia', type=int, default=200, help="Handshakes simultâneos durante a abertura")
+    parser.add_argument('--manter', type=float, default=120.0, help="Segundos com todas as conexões abertas")
+    parser.add_argument('--sondas', type=int, default=200, help="Mensagens medidas em cada fase")
+    parser.add_argument('--espera', type=float, default=30.0)
+    parser.add_argument('--porta', type=int, default=5104)
+    args = parser.parse_args()
+
+    elevar_limite_arquivos(args.conexoes + 1000)
+    configurar_ambiente(
+        SERVIDOR_WORKERS='1',
+        SERVIDOR_MAX_CONEXOES=args.conexoes + 100,
+        METRICAS_HABILITADAS='false'
+    )
+    from app import create_app
+
+    app = create_app()
+    preparar_banco(app)
+    # Dois usuários só para a sonda: a entrega não é multiplicada pelas conexões de carga
+    usuarios = criar_usuarios(app, args.usuarios + 2)
+    conversa_id = criar_conversa(app, usuarios[0], usuarios[1])
+    tokens_sonda = [emitir_token(app, usuario_id) for usuario_id in usuarios[:2]]
+    tokens_carga = [emitir_token(app, usuario_id) for usuario_id in usuarios[2:]]
+
+    servidor = iniciar_servidor(args.porta)
+    try:
+        asyncio.run(executar(args, servidor, tokens_carga, tokens_sonda, conversa_id))
+    finally:
+        parar_servidor(servidor)
+
+
+if __name__ == '__main__':
+    main()
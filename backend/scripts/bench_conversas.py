@@ -0,0 +1,147 @@
+"""
+Benchmark da listagem de conversas (GET /api/conversas): a consulta única
+atual contra o laço N+1 anterior (1 + 2N consultas), com 10, 100 e 1000
+conversas por usuário. Mede consultas SQL e latência por requisição.
+
+    python -m scripts.bench_conversas [--tamanhos 10,100,1000] [--repeticoes 30] [--mensagens 20]
+"""
+import argparse
+import time
+
+from scripts.comum import (
+    configurar_ambiente,
+    criar_usuarios,
+    emitir_token,
+    formatar_percentis,
+    percentis,
+    preparar_banco
+)
+
+
+def listar_n1(usuario_id):
+    """Implementação anterior da listagem, mantida aqui só para comparação"""
+    from app.extensions import db
+    from app.models import Conversa, Mensagem, Usuario
+
+    conversas = db.session.query(Conversa).filter(
+        (Conversa.id_usuario1 == usuario_id) |
+        (Conversa.id_usuario2 == usuario_id)
+    ).all()
+
+    conversas_formatadas = []
+    for conversa in conversas:
+        outro_usuario_id = conversa.id_usuario2 if str(conversa.id_usuario1) == usuario_id else conversa.id_usuario1
+        outro_usuario = db.session.get(Usuario, outro_usuario_id)
+        ultima_mensagem = Mensagem.query.filter_by(
+            id_conversa=conversa.id
+        ).order_by(Mensagem.data_envio.desc()).first()
+        conversas_formatadas.append({
+            "id": str(conversa.id),
+            "outro_usuario": str(outro_usuario.id),
+            "nome": outro_usuario.nome,
+            "email": outro_usuario.email,
+            "prioridade": ultima_mensagem.data_envio.isoformat() if ultima_mensagem else None,
+            "data_criacao": conversa.data_criacao.isoformat()
+        })
+    return {"conversas": conversas_formatadas}
+
+
+def semear_conversas(app, dono_id, quantidade, mensagens):
+    from sqlalchemy import text
+
+    from app.extensions import db
+
+    with app.app_context():
+        db.session.execute(text(
+            "INSERT INTO conversas (id, id_usuario1, id_usuario2) "
+            "SELECT gen_random_uuid(), LEAST(CAST(:dono AS uuid), u.id), GREATEST(CAST(:dono AS uuid), u.id) "
+            "FROM (SELECT id FROM usuarios WHERE email LIKE 'contato%' ORDER BY email LIMIT :quantidade) u"
+        ), {"dono": dono_id, "quantidade": quantidade})
+        db.session.execute(text(
+            "INSERT INTO mensagens (id, id_conversa, id_usuario, texto_criptografado, data_envio) "
+            "SELECT gen_random_uuid(), c.id, CASE WHEN m % 2 = 0 THEN c.id_usuario1 ELSE c.id_usuario2 END, "
+            "'texto', now() - m * interval '1 minute' - random() * interval '30 days' "
+            "FROM conversas c, generate_series(1, :mensagens) m "
+            "WHERE c.id_usuario1 = CAST(:dono AS uuid) OR c.id_usuario2 = CAST(:dono AS uuid)"
+        ), {"dono": dono_id, "mensagens": mensagens})
+        db.session.commit()
+        db.session.execute(text("ANALYZE conversas, mensagens, usuarios"))
+        db.session.commit()
+
+
+def medir(app, cliente, url, token, repeticoes):
+    from sqlalchemy import event
+
+    from app.extensions import db
+
+    consultas = [0]
+
+    def contar(*_):
+        consultas[0] += 1
+
+    cabecalhos = {"Authorization": f"Bearer {token}"}
+    # Aquecimento: cache de sessão, planos e conexões do pool
+    resposta = cliente.get(url, headers=cabecalhos)
+    assert resposta.status_code == 200, resposta.get_json()
+    total = len(resposta.get_json()["conversas"])
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', contar)
+    duracoes = []
+    try:
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            cliente.get(url, headers=cabecalhos)
+            duracoes.append(time.perf_counter() - inicio)
+    finally:
+        event.remove(engine, 'before_cursor_execute', contar)
+    return total, consultas[0] / repeticoes, percentis(duracoes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanhos', default='10,100,1000', help="Conversas por usuário, separadas por vírgula")
+    parser.add_argument('--repeticoes', type=int, default=30)
+    parser.add_argument('--mensagens', type=int, default=20, help="Mensagens por conversa")
+    args = parser.parse_args()
+    tamanhos = [int(tamanho) for tamanho in args.tamanhos.split(',')]
+
+    # Auditoria assíncrona como em produção; o N+1 do legado não pode derrubar a requisição
+    configurar_ambiente(
+        AUDIT_LOG_ASYNC='true',
+        SQL_ORCAMENTO_ESTRITO='false',
+        METRICAS_HABILITADAS='false',
+        SENHA_WORKERS='0'
+    )
+    from flask_jwt_extended import get_jwt_identity, jwt_required
+
+    from app import create_app
+
+    app = create_app()
+
+    @jwt_required()
+    def conversas_n1():
+        return listar_n1(get_jwt_identity())
+
+    app.add_url_rule('/bench/conversas-n1', 'bench_conversas_n1', conversas_n1)
+
+    preparar_banco(app)
+    criar_usuarios(app, max(tamanhos), prefixo='contato')
+    cliente = app.test_client()
+
+    print(f"{args.repeticoes} requisições por caso, {args.mensagens} mensagens por conversa\n")
+    for tamanho in tamanhos:
+        dono_id = criar_usuarios(app, 1, prefixo=f'dono{tamanho}-')[0]
+        semear_conversas(app, dono_id, tamanho, args.mensagens)
+        token = emitir_token(app, dono_id)
+
+        for rotulo, url in (("consulta única", "/api/conversas"), ("N+1 anterior", "/bench/conversas-n1")):
+            total, consultas, resumo = medir(app, cliente, url, token, args.repeticoes)
+            print(f"{tamanho:>5} conversas | {rotulo:<14} | {total:>5} itens | "
+                  f"{consultas:>6.1f} consultas/req | {formatar_percentis(resumo)}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
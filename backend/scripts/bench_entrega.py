@@ -0,0 +1,124 @@
+"""
+Benchmark da latência de entrega entre workers (receive_message).
+
+Sobe dois servidor.py ligados pela mesma SOCKETIO_MESSAGE_QUEUE (Redis) e
+conecta o remetente a um e o destinatário ao outro. Cada mensagem é enviada
+com send_message e medida até chegar ao destinatário; o mesmo envio com os
+dois clientes no mesmo worker serve de referência.
+
+    python -m scripts.bench_entrega [--redis redis://localhost:6379/15] [--mensagens 500]
+
+Requer um Redis local e o cliente do python-socketio (requirements-dev.txt).
+"""
+import argparse
+import threading
+import time
+from uuid import uuid4
+
+import socketio
+
+from scripts.comum import (
+    configurar_ambiente,
+    criar_usuarios,
+    emitir_token,
+    formatar_percentis,
+    iniciar_servidor,
+    parar_servidor,
+    percentis,
+    preparar_banco
+)
+
+
+def criar_conversa(app, usuario_a, usuario_b):
+    from app.extensions import db
+    from app.models import Conversa
+
+    with app.app_context():
+        id_usuario1, id_usuario2 = Conversa.ordenar_participantes(usuario_a, usuario_b)
+        conversa = Conversa(id=uuid4(), id_usuario1=id_usuario1, id_usuario2=id_usuario2)
+        db.session.add(conversa)
+        db.session.commit()
+        return str(conversa.id)
+
+
+def conectar(porta, token):
+    cliente = socketio.Client(reconnection=False)
+    cliente.connect(f'http://127.0.0.1:{porta}', auth={'token': token}, transports=['websocket'], wait_timeout=10)
+    return cliente
+
+
+def medir(remetente, destinatario, conversa_id, quantidade, espera):
+    chegadas = {}
+    sinal = threading.Event()
+
+    @destinatario.on('receive_message')
+    def ao_receber(dados):
+        chegadas[dados['texto']] = time.perf_counter()
+        sinal.set()
+
+    entregas, confirmacoes, perdidas = [], [], 0
+    for _ in range(quantidade):
+        marcador = uuid4().hex
+        sinal.clear()
+        inicio = time.perf_counter()
+        resposta = remetente.call('send_message', {'conversa_id': conversa_id, 'texto': marcador}, timeout=espera)
+        confirmacoes.append(time.perf_counter() - inicio)
+        if not resposta or not resposta.get('ok'):
+            raise RuntimeError(f"send_message falhou: {resposta}")
+        # A entrega pode chegar antes do ack; espera só se ainda não chegou
+        while marcador not in chegadas and sinal.wait(espera):
+            sinal.clear()
+        if marcador in chegadas:
+            entregas.append(chegadas.pop(marcador) - inicio)
+        else:
+            perdidas += 1
+    return percentis(entregas), percentis(confirmacoes), perdidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis', default='redis://localhost:6379/15')
+    parser.add_argument('--mensagens', type=int, default=500)
+    parser.add_argument('--portas', default='5101,5102')
+    parser.add_argument('--espera', type=float, default=5.0, help="Segundos até considerar a entrega perdida")
+    args = parser.parse_args()
+    porta_a, porta_b = (int(porta) for porta in args.portas.split(','))
+
+    configurar_ambiente(
+        SOCKETIO_MESSAGE_QUEUE=args.redis,
+        CACHE_CANAL_BACKEND='redis',
+        PRESENCA_BACKEND='redis',
+        SERVIDOR_WORKERS='1',
+        METRICAS_HABILITADAS='false'
+    )
+    from app import create_app
+
+    app = create_app()
+    preparar_banco(app)
+    usuario_a, usuario_b = criar_usuarios(app, 2)
+    conversa_id = criar_conversa(app, usuario_a, usuario_b)
+    token_a, token_b = emitir_token(app, usuario_a), emitir_token(app, usuario_b)
+
+    servidores = [iniciar_servidor(porta_a), iniciar_servidor(porta_b)]
+    try:
+        for rotulo, porta_destinatario in (("mesmo worker", porta_a), ("entre workers", porta_b)):
+            remetente = conectar(porta_a, token_a)
+            destinatario = conectar(porta_destinatario, token_b)
+            try:
+                # Aquecimento: conexões do pool, caches e assinatura do canal
+                medir(remetente, destinatario, conversa_id, 20, args.espera)
+                entrega, confirmacao, perdidas = medir(
+                    remetente, destinatario, conversa_id, args.mensagens, args.espera
+                )
+            finally:
+                remetente.disconnect()
+                destinatario.disconnect()
+            print(f"{rotulo:<14} | entrega: {formatar_percentis(entrega)}")
+            print(f"{'':<14} | ack:     {formatar_percentis(confirmacao)} | perdidas={perdidas}")
+    finally:
+        for servidor in servidores:
+            parar_servidor(servidor)
+
+
+if __name__ == '__main__':
+    main()
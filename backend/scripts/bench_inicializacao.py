@@ -0,0 +1,97 @@
+"""
+Benchmark do tempo de inicialização: `import app` e `create_app()`.
+
+Cada rodada é um processo Python novo (sem módulos em cache na memória),
+que mede a importação do pacote e a montagem da aplicação e devolve os
+tempos ao processo pai. Relata p50/p95 de cada fase e do processo inteiro,
+com as métricas ligadas e desligadas. Nenhuma conexão ao banco acontece em
+create_app(), então não precisa de BENCH_DATABASE_URL.
+
+    python -m scripts.bench_inicializacao [--rodadas 20] [--importtime 15]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from scripts.comum import PASTA_BACKEND, formatar_percentis, percentis
+
+# Executado em cada processo filho
+MEDICAO = """
+import json, time
+inicio = time.perf_counter()
+import app
+importado = time.perf_counter()
+app.create_app()
+montado = time.perf_counter()
+print(json.dumps({"import": importado - inicio, "create_app": montado - importado}))
+"""
+
+
+def ambiente(metricas):
+    variaveis = {
+        **os.environ,
+        'SQLALCHEMY_DATABASE_URI': os.getenv('BENCH_DATABASE_URL') or 'postgresql+psycopg2://localhost/nexsay_bench',
+        'METRICAS_HABILITADAS': 'true' if metricas else 'false'
+    }
+    variaveis.setdefault('SECRET_KEY', 'bench')
+    variaveis.setdefault('JWT_SECRET_KEY', 'bench')
+    return variaveis
+
+
+def rodar(rodadas, metricas):
+    tempos = {"import": [], "create_app": [], "processo": []}
+    variaveis = ambiente(metricas)
+    # Primeira execução só para gerar os .pyc: as medidas comparam inicializações equivalentes
+    subprocess.run([sys.executable, '-c', MEDICAO], cwd=PASTA_BACKEND, env=variaveis,
+                   check=True, capture_output=True)
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        saida = subprocess.run([sys.executable, '-c', MEDICAO], cwd=PASTA_BACKEND, env=variaveis,
+                               check=True, capture_output=True, text=True)
+        tempos["processo"].append(time.perf_counter() - inicio)
+        medidas = json.loads(saida.stdout.strip().splitlines()[-1])
+        tempos["import"].append(medidas["import"])
+        tempos["create_app"].append(medidas["create_app"])
+    return tempos
+
+
+def modulos_mais_lentos(quantidade):
+    """Módulos com maior tempo acumulado de importação segundo `python -X importtime`"""
+    saida = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app; app.create_app()'],
+                           cwd=PASTA_BACKEND, env=ambiente(True), check=True, capture_output=True, text=True)
+    modulos = []
+    for linha in saida.stderr.splitlines():
+        # "import time:  próprio (us) | acumulado (us) | módulo"
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, acumulado, nome = linha[len('import time:'):].split('|', 2)
+        modulos.append((int(acumulado), nome.strip()))
+    return sorted(modulos, reverse=True)[:quantidade]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rodadas', type=int, default=20, help="Processos novos por configuração")
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help="Lista os N módulos de importação mais cara (0 desliga)")
+    args = parser.parse_args()
+
+    print(f"{args.rodadas} inicializações a frio por configuração\n")
+    for metricas in (False, True):
+        tempos = rodar(args.rodadas, metricas)
+        print(f"METRICAS_HABILITADAS={'true' if metricas else 'false'}")
+        for fase, duracoes in tempos.items():
+            print(f"  {fase:<10} | {formatar_percentis(percentis(duracoes))}")
+        print()
+
+    if args.importtime:
+        print("Importações mais caras (acumulado, métricas ligadas):")
+        for acumulado, nome in modulos_mais_lentos(args.importtime):
+            print(f"  {acumulado / 1000:8.1f}ms  {nome}")
+
+
+if __name__ == '__main__':
+    main()
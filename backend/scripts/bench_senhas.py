@@ -0,0 +1,108 @@
+"""
+Benchmark do login sob tráfego misto (bcrypt fora da thread da requisição).
+
+Sobe servidor.py e, durante --duracao segundos, mantém --logins clientes
+fazendo POST /api/auth/login (bcrypt no custo BCRYPT_LOG_ROUNDS) e
+--leitores clientes fazendo GET /api/auth/me, que não tocam no bcrypt.
+Relata p50/p99 de cada tipo e a contagem por status: com a fila de senhas
+cheia o login responde 503 rápido em vez de acumular latência, e as
+leituras não devem piorar.
+
+    python -m scripts.bench_senhas [--logins 32] [--leitores 16] [--duracao 30] [--senha-workers 4]
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from scripts.comum import (
+    SENHA_PADRAO,
+    configurar_ambiente,
+    criar_usuarios,
+    emitir_token,
+    formatar_percentis,
+    iniciar_servidor,
+    parar_servidor,
+    percentis,
+    preparar_banco
+)
+
+
+def cliente(requisicao, fim, duracoes, status, lock):
+    sessao = requests.Session()
+    locais, contagem = [], Counter()
+    while time.monotonic() < fim:
+        inicio = time.perf_counter()
+        try:
+            codigo = requisicao(sessao).status_code
+        except requests.RequestException:
+            codigo = 'erro'
+        locais.append(time.perf_counter() - inicio)
+        contagem[codigo] += 1
+    with lock:
+        duracoes.extend(locais)
+        status.update(contagem)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=32, help="Clientes concorrentes fazendo login")
+    parser.add_argument('--leitores', type=int, default=16, help="Clientes concorrentes em GET /api/auth/me")
+    parser.add_argument('--duracao', type=float, default=30.0)
+    parser.add_argument('--senha-workers', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=12, help="BCRYPT_LOG_ROUNDS")
+    parser.add_argument('--porta', type=int, default=5103)
+    args = parser.parse_args()
+
+    # E-mails do 2FA vão para uma porta fechada: falham no worker da fila, fora da requisição
+    configurar_ambiente(
+        BCRYPT_LOG_ROUNDS=args.rounds,
+        SENHA_WORKERS=args.senha_workers,
+        MAIL_SERVER='127.0.0.1',
+        MAIL_PORT='9',
+        EMAIL_FILA_TAMANHO='1000000',
+        METRICAS_HABILITADAS='false'
+    )
+    from app import create_app
+
+    app = create_app()
+    preparar_banco(app)
+    usuarios = criar_usuarios(app, args.logins + args.leitores)
+    emails = [f"bench{n}@bench.local" for n in range(args.logins)]
+    tokens = [emitir_token(app, usuario_id) for usuario_id in usuarios[args.logins:]]
+
+    base = f'http://127.0.0.1:{args.porta}/api'
+    servidor = iniciar_servidor(args.porta)
+    try:
+        fim = time.monotonic() + args.duracao
+        lock = threading.Lock()
+        resultados = {"login": ([], Counter()), "leitura": ([], Counter())}
+        threads = []
+        for email in emails:
+            login = (lambda email: lambda sessao: sessao.post(
+                f'{base}/auth/login', json={'email': email, 'password': SENHA_PADRAO}, timeout=30
+            ))(email)
+            threads.append(threading.Thread(target=cliente, args=(login, fim, *resultados["login"], lock)))
+        for token in tokens:
+            leitura = (lambda token: lambda sessao: sessao.get(
+                f'{base}/auth/me', headers={'Authorization': f'Bearer {token}'}, timeout=30
+            ))(token)
+            threads.append(threading.Thread(target=cliente, args=(leitura, fim, *resultados["leitura"], lock)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        parar_servidor(servidor)
+
+    print(f"{args.logins} logins + {args.leitores} leitores por {args.duracao:.0f}s, "
+          f"SENHA_WORKERS={args.senha_workers}, BCRYPT_LOG_ROUNDS={args.rounds}\n")
+    for rotulo, (duracoes, status) in resultados.items():
+        por_status = ", ".join(f"{codigo}: {vezes}" for codigo, vezes in sorted(status.items(), key=str))
+        print(f"{rotulo:<8} | {formatar_percentis(percentis(duracoes))} | {por_status}")
+
+
+if __name__ == '__main__':
+    main()
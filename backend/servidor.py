@@ -0,0 +1,228 @@
+"""
+Servidor de produção: eventlet (green threads), um ou mais processos.
+
+    SERVIDOR_BACKLOG=2048 python servidor.py
+
+Cada conexão Socket.IO ocupa uma green thread em vez de uma thread do
+sistema. Com mais de um worker o socket de escuta é aberto antes do fork e
+compartilhado (o kernel distribui os accepts); os eventos entre workers
+passam por SOCKETIO_MESSAGE_QUEUE, revogações, caches e presença pelo Redis
+(CACHE_CANAL_BACKEND e PRESENCA_BACKEND), e clientes em long-polling
+precisam de balanceador com afinidade (ou transports=['websocket']).
+
+Cada worker dispara `flask logs manutencao` ao subir e depois a cada
+LOGS_MANUTENCAO_INTERVALO segundos; um advisory lock no Postgres garante
+que só uma execução trabalhe por vez.
+
+SIGTERM encerra com calma: o supervisor repassa o sinal e espera cada
+worker gravar as filas de auditoria e de e-mail antes de sair.
+"""
+import eventlet
+
+# Antes de qualquer outro import: socket, threading, time, select e ssl viram green
+eventlet.monkey_patch()
+
+import logging
+import os
+import signal
+import sys
+
+import eventlet.event
+import eventlet.wsgi
+from eventlet.green import subprocess
+from eventlet.hubs import trampoline
+from greenlet import GreenletExit
+from prometheus_client import multiprocess
+from psycopg2 import OperationalError, extensions
+
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'eventlet')
+
+
+def _limpar_metricas_multiprocesso():
+    """Arquivos de métricas de execuções anteriores somariam aos contadores novos"""
+    pasta = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if not pasta:
+        return
+    os.makedirs(pasta, exist_ok=True)
+    for nome in os.listdir(pasta):
+        if nome.endswith('.db'):
+            os.remove(os.path.join(pasta, nome))
+
+
+# Antes de importar a aplicação, que cria as métricas
+_limpar_metricas_multiprocesso()
+
+from app import create_app
+from app.config import Config
+
+logger = logging.getLogger('servidor')
+
+
+def _esperar_psycopg(conn, timeout=-1):
+    """Wait callback do psycopg2: cede o hub do eventlet enquanto o Postgres responde"""
+    while True:
+        estado = conn.poll()
+        if estado == extensions.POLL_OK:
+            break
+        elif estado == extensions.POLL_READ:
+            trampoline(conn.fileno(), read=True)
+        elif estado == extensions.POLL_WRITE:
+            trampoline(conn.fileno(), write=True)
+        else:
+            raise OperationalError(f"Estado inesperado em poll(): {estado}")
+
+
+def manter_logs_periodicamente(intervalo):
+    """
+    Roda `flask logs manutencao` (partições à frente e retenção) a cada
+    intervalo segundos. É um processo à parte porque o COPY do arquivamento
+    não funciona com o wait callback do psycopg2; todos os workers disparam,
+    mas o advisory lock deixa só um trabalhar e os outros saem na hora.
+    """
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    ambiente = dict(
+        os.environ,
+        FLASK_APP='manage.py',
+        SOCKETIO_ASYNC_MODE='threading',
+        METRICAS_HABILITADAS='false'
+    )
+    ambiente.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    while True:
+        try:
+            # Popen/communicate verdes: o worker continua atendendo enquanto o comando roda
+            processo = subprocess.Popen(
+                [sys.executable, '-m', 'flask', 'logs', 'manutencao'],
+                cwd=pasta, env=ambiente, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+            )
+            texto = processo.communicate()[0].decode(errors='replace').strip()
+            if processo.returncode:
+                logger.error("Manutenção de logs falhou (status %d): %s", processo.returncode, texto)
+            else:
+                logger.info("Manutenção de logs: %s", texto)
+        except OSError as e:
+            logger.error("Não foi possível iniciar a manutenção de logs: %s", e)
+        eventlet.sleep(intervalo)
+
+
+def servir(sock):
+    """
+    Atende até receber SIGTERM/SIGINT e então retorna normalmente, para que
+    os handlers de atexit (fila de auditoria, fila de e-mail) gravem o que
+    ainda está em memória antes de o processo sair.
+    """
+    app = create_app()
+    pool = eventlet.GreenPool(Config.SERVIDOR_MAX_CONEXOES)
+    servidor = eventlet.spawn(
+        eventlet.wsgi.server,
+        sock,
+        app,
+        custom_pool=pool,
+        keepalive=True,
+        log_output=Config.SOCKETIO_LOGGER
+    )
+
+    manutencao = None
+    if Config.LOGS_MANUTENCAO_INTERVALO > 0:
+        manutencao = eventlet.spawn(manter_logs_periodicamente, Config.LOGS_MANUTENCAO_INTERVALO)
+
+    parar = eventlet.event.Event()
+
+    def pedir_parada(signum, frame):
+        if not parar.ready():
+            parar.send(signum)
+
+    signal.signal(signal.SIGTERM, pedir_parada)
+    signal.signal(signal.SIGINT, pedir_parada)
+    parar.wait()
+
+    logger.info("Worker %d encerrando", os.getpid())
+    if manutencao is not None:
+        manutencao.kill()
+    # Para de aceitar conexões; requisições em andamento têm SERVIDOR_TEMPO_ENCERRAMENTO para terminar
+    servidor.kill()
+    with eventlet.Timeout(Config.SERVIDOR_TEMPO_ENCERRAMENTO, False):
+        pool.waitall()
+    # Sockets ainda abertos (WebSocket, long-polling) não terminam sozinhos
+    for conexao in list(pool.coroutines_running):
+        conexao.kill()
+    try:
+        servidor.wait()
+    except GreenletExit:
+        pass
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    extensions.set_wait_callback(_esperar_psycopg)
+
+    if Config.SOCKETIO_ASYNC_MODE != 'eventlet':
+        sys.exit("servidor.py exige SOCKETIO_ASYNC_MODE=eventlet")
+    workers = Config.SERVIDOR_WORKERS
+    if workers > 1:
+        if not Config.SOCKETIO_MESSAGE_QUEUE:
+            sys.exit("SERVIDOR_WORKERS > 1 exige SOCKETIO_MESSAGE_QUEUE (ex.: redis://localhost:6379/0)")
+        # Em memória, revogações de sessão, caches e presença ficariam restritos a cada worker
+        if Config.CACHE_CANAL_BACKEND != 'redis' or Config.PRESENCA_BACKEND != 'redis':
+            sys.exit("SERVIDOR_WORKERS > 1 exige CACHE_CANAL_BACKEND=redis e PRESENCA_BACKEND=redis")
+        if Config.METRICAS_HABILITADAS and not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+            sys.exit("SERVIDOR_WORKERS > 1 exige PROMETHEUS_MULTIPROC_DIR (ex.: /tmp/nexsay-metricas) para /metrics")
+
+    sock = eventlet.listen((Config.SERVIDOR_HOST, Config.SERVIDOR_PORTA), backlog=Config.SERVIDOR_BACKLOG)
+    logger.info("Escutando em %s:%s com %d worker(s)", Config.SERVIDOR_HOST, Config.SERVIDOR_PORTA, workers)
+
+    if workers <= 1:
+        servir(sock)
+        return
+
+    # A aplicação é criada depois do fork: threads, pools e conexões são de cada worker
+    filhos = set()
+    encerrando = False
+
+    def iniciar_worker():
+        pid = os.fork()
+        if pid == 0:
+            # Nada dos handlers do supervisor até servir() instalar os do worker
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            codigo = 0
+            try:
+                servir(sock)
+            except Exception:
+                logger.exception("Worker %d falhou", os.getpid())
+                codigo = 1
+            # Saída normal (não os._exit): roda os handlers de atexit
+            sys.exit(codigo)
+        filhos.add(pid)
+
+    def encerrar(signum, frame):
+        nonlocal encerrando
+        encerrando = True
+        for pid in list(filhos):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(workers):
+        iniciar_worker()
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+
+    # Reinicia workers que morrerem; no encerramento, espera todos gravarem suas filas
+    while filhos:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        filhos.discard(pid)
+        if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+            # Tira os gauges do worker morto da soma
+            multiprocess.mark_process_dead(pid)
+        if encerrando:
+            continue
+        logger.warning("Worker %d terminou (status %d), reiniciando", pid, status)
+        iniciar_worker()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Fixtures compartilhados pelos testes.
+
+Os testes que usam `banco` precisam de um PostgreSQL descartável em
+TEST_DATABASE_URL (o nome do banco deve conter "test"): o esquema public é
+recriado e todas as migrações são aplicadas do zero. Sem a variável, esses
+testes são pulados; os demais rodam só com as dependências instaladas.
+"""
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+URL_TESTE = os.getenv('TEST_DATABASE_URL')
+PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+
+# Config lê o ambiente na importação: tudo definido antes de importar a aplicação
+os.environ['SQLALCHEMY_DATABASE_URI'] = URL_TESTE or 'postgresql+psycopg2://localhost/nexsay_teste'
+os.environ.setdefault('SECRET_KEY', 'teste')
+os.environ.setdefault('JWT_SECRET_KEY', 'chave-jwt-de-teste-com-pelo-menos-32-bytes')
+os.environ['AUDIT_LOG_ASYNC'] = 'false'
+os.environ['EMAIL_FILA_ASYNC'] = 'false'
+os.environ['SENHA_WORKERS'] = '0'
+os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+os.environ['METRICAS_HABILITADAS'] = 'false'
+# Estouro do orçamento de consultas ou N+1 derruba o teste em vez de só gerar aviso
+os.environ['SQL_ORCAMENTO_ESTRITO'] = 'true'
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    # Códigos 2FA não saem da máquina: o Flask-Mail só registra o envio
+    app.extensions['mail'].suppress = True
+    return app
+
+
+@pytest.fixture(scope='session')
+def banco(app):
+    """Banco de teste com o esquema das migrações; apagado e recriado a cada sessão"""
+    if not URL_TESTE:
+        pytest.skip("TEST_DATABASE_URL não definido")
+    if 'test' not in (make_url(URL_TESTE).database or ''):
+        pytest.fail("TEST_DATABASE_URL deve apontar para um banco descartável (nome contendo 'test')")
+
+    from flask_migrate import upgrade
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA public CASCADE"))
+            conn.execute(text("CREATE SCHEMA public"))
+        upgrade(directory=PASTA_MIGRACOES)
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def cliente(app, banco):
+    return app.test_client()
+
+
+@pytest.fixture
+def criar_usuario(app, banco):
+    """Fábrica de usuários verificados, com e-mail único por teste"""
+    from uuid import uuid4
+
+    from app.models import Usuario
+
+    def criar(nome='Usuário'):
+        usuario = Usuario(id=uuid4(), nome=nome, email=f"{uuid4().hex}@teste.com", senha_hash='x')
+        db.session.add(usuario)
+        db.session.commit()
+        return str(usuario.id)
+
+    return criar
+
+
+@pytest.fixture
+def autenticar(app, banco):
+    """Cabeçalhos de uma sessão já verificada no 2FA, como no fim do login"""
+    from uuid import uuid4
+
+    from flask_jwt_extended import create_access_token
+
+    from app.models import Sessao
+
+    def autenticar(usuario_id):
+        jti = str(uuid4())
+        db.session.add(Sessao(id=uuid4(), id_usuario=usuario_id, jwt_token=jti, doisFatoresSessao=True))
+        db.session.commit()
+        token = create_access_token(identity=usuario_id, additional_claims={"jti": jti})
+        return {"Authorization": f"Bearer {token}"}
+
+    return autenticar
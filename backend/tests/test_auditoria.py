@@ -0,0 +1,17 @@
+"""Consulta de auditoria: validação dos filtros antes de tocar no banco"""
+
+
+def test_usuario_invalido_responde_400(app, cliente, criar_usuario, autenticar):
+    with app.app_context():
+        admin = criar_usuario('Admin')
+        cabecalhos = autenticar(admin)
+    app.config['AUDITORIA_ADMINS'] = admin
+    try:
+        resposta = cliente.get('/api/auditoria/logs?usuario=nao-e-uuid', headers=cabecalhos)
+        assert resposta.status_code == 400
+        assert 'usuario' in resposta.get_json()['message']
+
+        resposta = cliente.get(f'/api/auditoria/logs?usuario={admin}', headers=cabecalhos)
+        assert resposta.status_code == 200
+    finally:
+        app.config['AUDITORIA_ADMINS'] = ''
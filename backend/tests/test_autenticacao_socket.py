@@ -0,0 +1,29 @@
+"""Autenticação do Socket.IO: token só no payload de auth do handshake"""
+from uuid import uuid4
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.extensions import socketio
+from app.sessoes import sessoes
+
+
+@pytest.fixture
+def token(app, monkeypatch):
+    """JWT válido de uma sessão aceita, sem depender do banco"""
+    monkeypatch.setattr(sessoes, 'sessao_valida', lambda usuario_id, jti: True)
+    with app.app_context():
+        return create_access_token(identity=str(uuid4()), additional_claims={"jti": str(uuid4())})
+
+
+def test_token_no_payload_de_auth_conecta(app, token):
+    cliente = socketio.test_client(app, auth={'token': token})
+    assert cliente.is_connected()
+    cliente.disconnect()
+
+
+def test_token_na_url_ou_no_cabecalho_e_recusado(app, token):
+    pela_url = socketio.test_client(app, query_string=f"token={token}")
+    pelo_cabecalho = socketio.test_client(app, headers={"Authorization": f"Bearer {token}"})
+    assert not pela_url.is_connected()
+    assert not pelo_cabecalho.is_connected()
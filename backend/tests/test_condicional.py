@@ -0,0 +1,53 @@
+"""ETag das listagens: qualquer mudança visível na lista precisa invalidá-lo"""
+from hashlib import sha1
+from uuid import uuid4
+
+from flask import request
+
+from app.extensions import db
+from app.models import Contato, Conversa, Usuario
+
+
+def test_novo_registro_com_email_existente_invalida_etag_dos_contatos(app, cliente, criar_usuario, autenticar):
+    email = f"{uuid4().hex}@teste.com"
+    with app.app_context():
+        dono = criar_usuario('Dono')
+        # Conta ainda não verificada (ou excluída): o registro reaproveita a linha e troca o nome
+        contato = Usuario(id=uuid4(), nome='Nome Antigo', email=email, senha_hash='x', dois_fatores_ativo=False)
+        db.session.add(contato)
+        db.session.add(Contato(id=uuid4(), id_usuario=dono, id_contato=contato.id))
+        db.session.commit()
+        cabecalhos = autenticar(dono)
+
+    primeira = cliente.get('/api/contatos', headers=cabecalhos)
+    etag = primeira.headers['ETag']
+    assert cliente.get('/api/contatos', headers={**cabecalhos, 'If-None-Match': etag}).status_code == 304
+
+    registro = cliente.post('/api/auth/register', json={'email': email, 'password': 'nova-senha', 'nome': 'Nome Novo'})
+    assert registro.status_code == 201, registro.get_json()
+
+    depois = cliente.get('/api/contatos', headers={**cabecalhos, 'If-None-Match': etag})
+    assert depois.status_code == 200
+    assert [contato['nome'] for contato in depois.get_json()['contatos']] == ['Nome Novo']
+
+
+def test_etag_nao_responde_por_conversa_alheia(app, cliente, criar_usuario, autenticar):
+    with app.app_context():
+        dono, outro, intruso = criar_usuario('Dono'), criar_usuario('Outro'), criar_usuario('Intruso')
+        id_usuario1, id_usuario2 = Conversa.ordenar_participantes(dono, outro)
+        conversa = Conversa(id=uuid4(), id_usuario1=id_usuario1, id_usuario2=id_usuario2)
+        db.session.add(conversa)
+        db.session.commit()
+        conversa_id = str(conversa.id)
+        cabecalhos = autenticar(intruso)
+
+    # O intruso valida a própria listagem e reaproveita a versão para a conversa alheia
+    url = f'/api/conversas/{conversa_id}/mensagens'
+    etag = cliente.get('/api/conversas', headers=cabecalhos).headers['ETag']
+    versao = etag.split('"')[1].split('-')[0]
+    with app.test_request_context(url):
+        assinatura = sha1(request.full_path.encode()).hexdigest()[:16]
+
+    resposta = cliente.get(url, headers={**cabecalhos, 'If-None-Match': f'W/"{versao}-{assinatura}"'})
+    assert resposta.status_code == 404
+    assert cliente.get(f'/api/conversas/{uuid4()}/mensagens', headers=cabecalhos).status_code == 404
@@ -0,0 +1,80 @@
+"""
+Orçamento de consultas e detector de N+1 (SQL_ORCAMENTO_ESTRITO=true no conftest).
+As instruções são simuladas chamando os listeners do cursor: não precisa de banco.
+"""
+from types import SimpleNamespace
+
+import pytest
+from flask import g
+
+from app.consultas import (
+    OrcamentoConsultasExcedido,
+    _antes_execucao,
+    _escopo_ativo,
+    monitor_consultas
+)
+
+
+def _executar(statement, vezes=1, **opcoes):
+    contexto = SimpleNamespace(execution_options=opcoes)
+    for _ in range(vezes):
+        _antes_execucao(None, None, statement, {}, contexto, False)
+
+
+def test_estouro_do_orcamento_levanta(app):
+    with app.test_request_context():
+        monitor_consultas.iniciar()
+        for indice in range(31):
+            _executar(f"SELECT {indice}")
+        with pytest.raises(OrcamentoConsultasExcedido, match="31 consultas"):
+            monitor_consultas.verificar('api.qualquer')
+
+
+def test_mesma_instrucao_repetida_e_n1(app):
+    with app.test_request_context():
+        monitor_consultas.iniciar()
+        _executar("SELECT * FROM usuarios WHERE id = %(id)s", vezes=5)
+        with pytest.raises(OrcamentoConsultasExcedido, match="N\\+1"):
+            monitor_consultas.verificar('api.qualquer')
+
+
+def test_dentro_do_orcamento_passa(app):
+    with app.test_request_context():
+        monitor_consultas.iniciar()
+        _executar("SELECT * FROM usuarios WHERE id = %(id)s", vezes=4)
+        monitor_consultas.verificar('api.qualquer')
+        assert monitor_consultas.contagem() == 4
+
+
+def test_instrucoes_de_infraestrutura_nao_contam(app):
+    with app.test_request_context():
+        monitor_consultas.iniciar()
+        _executar("SET LOCAL statement_timeout = 5000", vezes=10, monitor_consultas=False)
+        assert monitor_consultas.contagem() == 0
+        monitor_consultas.verificar('api.qualquer')
+
+
+def test_evento_com_n1_levanta_e_fecha_o_escopo(app):
+    @monitor_consultas.evento('teste')
+    def handler():
+        _executar("SELECT * FROM mensagens WHERE id = %(id)s", vezes=5)
+
+    with app.test_request_context():
+        with pytest.raises(OrcamentoConsultasExcedido, match="socket:teste"):
+            handler()
+        assert not _escopo_ativo()
+
+
+def test_evento_que_levanta_fecha_o_escopo(app):
+    @monitor_consultas.evento('teste')
+    def handler():
+        _executar("SELECT 1")
+        raise ValueError("falha no handler")
+
+    with app.test_request_context():
+        with pytest.raises(ValueError):
+            handler()
+        assert not _escopo_ativo()
+        # Consultas depois do evento não entram na conta dele
+        _executar("SELECT 2")
+        assert g.consultas_sql == 1
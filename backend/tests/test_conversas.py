@@ -0,0 +1,80 @@
+"""
+Listagem de conversas: uma consulta só, independente da quantidade de
+conversas (o N+1 anterior fazia 1 + 2N). Com SQL_ORCAMENTO_ESTRITO ligado
+no conftest, qualquer N+1 também derruba a requisição.
+"""
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models import Conversa, Mensagem
+
+
+def _criar_conversas(criar_usuario, dono_id, quantidade):
+    agora = datetime.now(timezone.utc)
+    for n in range(quantidade):
+        contato_id = criar_usuario(f"Contato {n}")
+        id_usuario1, id_usuario2 = Conversa.ordenar_participantes(dono_id, contato_id)
+        conversa = Conversa(id=uuid4(), id_usuario1=id_usuario1, id_usuario2=id_usuario2)
+        db.session.add(conversa)
+        db.session.add(Mensagem(
+            id=uuid4(),
+            id_conversa=conversa.id,
+            id_usuario=contato_id,
+            texto_criptografado=f"mensagem {n}",
+            data_envio=agora - timedelta(minutes=n)
+        ))
+    db.session.commit()
+
+
+def _listar(cliente, cabecalhos, **parametros):
+    consultas = []
+
+    def registrar(conn, cursor, statement, *_):
+        consultas.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        resposta = cliente.get('/api/conversas', headers=cabecalhos, query_string=parametros)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json(), consultas
+
+
+def test_listagem_nao_cresce_com_as_conversas(app, cliente, criar_usuario, autenticar):
+    with app.app_context():
+        poucas, muitas = criar_usuario(), criar_usuario()
+        _criar_conversas(criar_usuario, poucas, 2)
+        _criar_conversas(criar_usuario, muitas, 12)
+        cabecalhos_poucas, cabecalhos_muitas = autenticar(poucas), autenticar(muitas)
+
+    # Primeira chamada aquece o cache de sessões para as duas contas
+    _listar(cliente, cabecalhos_poucas)
+    _listar(cliente, cabecalhos_muitas)
+
+    dados_poucas, consultas_poucas = _listar(cliente, cabecalhos_poucas)
+    dados_muitas, consultas_muitas = _listar(cliente, cabecalhos_muitas)
+
+    assert dados_poucas["total"] == 2
+    assert dados_muitas["total"] == 12
+    assert len(consultas_muitas) == len(consultas_poucas)
+
+
+def test_listagem_ordenada_por_recencia_com_cursor(app, cliente, criar_usuario, autenticar):
+    with app.app_context():
+        dono = criar_usuario()
+        _criar_conversas(criar_usuario, dono, 5)
+        cabecalhos = autenticar(dono)
+
+    pagina, _ = _listar(cliente, cabecalhos, limit=3)
+    assert pagina["total"] == 3
+    assert pagina["next_cursor"]
+    restante, _ = _listar(cliente, cabecalhos, limit=3, cursor=pagina["next_cursor"])
+    assert restante["total"] == 2
+    assert restante["next_cursor"] is None
+
+    prioridades = [conversa["prioridade"] for conversa in pagina["conversas"] + restante["conversas"]]
+    assert prioridades == sorted(prioridades, reverse=True)
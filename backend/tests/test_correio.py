@@ -0,0 +1,132 @@
+"""
+Fila de e-mails contra um servidor SMTP local (aiosmtpd): envio síncrono
+(EMAIL_FILA_ASYNC=false, como no conftest) e workers em segundo plano.
+"""
+import socket
+import time
+from uuid import uuid4
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from app.correio import fila_email
+from app.models import EnvioEmail, EnvioEmailStatus
+
+
+class ServidorSmtp:
+    """Guarda as mensagens recebidas e recusa temporariamente as primeiras `falhas` entregas"""
+
+    def __init__(self):
+        self.mensagens = []
+        self.conexoes = set()
+        self.falhas = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.falhas:
+            self.falhas -= 1
+            return '451 Falha temporária'
+        # (host, porta) de origem identifica a conexão TCP usada
+        self.conexoes.add(session.peer)
+        self.mensagens.append(envelope)
+        return '250 OK'
+
+
+def _porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(app, banco):
+    """Servidor aiosmtpd em porta livre, com o Flask-Mail apontado para ele durante o teste"""
+    servidor = ServidorSmtp()
+    controlador = Controller(servidor, hostname='127.0.0.1', port=_porta_livre())
+    controlador.start()
+
+    estado = app.extensions['mail']
+    campos = ('suppress', 'server', 'port', 'use_tls', 'use_ssl', 'username', 'password', 'default_sender')
+    anterior = {campo: getattr(estado, campo) for campo in campos}
+    estado.suppress, estado.server, estado.port = False, controlador.hostname, controlador.port
+    estado.use_tls = estado.use_ssl = False
+    estado.username = estado.password = None
+    estado.default_sender = 'nexsay@teste.com'
+    try:
+        yield servidor
+    finally:
+        for campo, valor in anterior.items():
+            setattr(estado, campo, valor)
+        controlador.stop()
+
+
+@pytest.fixture
+def fila_assincrona(app):
+    """Um único worker e backoff curto, restaurando o modo síncrono no fim"""
+    anterior = fila_email.assincrono, fila_email.workers, fila_email.backoff_base
+    fila_email.assincrono, fila_email.workers, fila_email.backoff_base = True, 1, 0.05
+    try:
+        yield fila_email
+    finally:
+        fila_email.parar()
+        fila_email.assincrono, fila_email.workers, fila_email.backoff_base = anterior
+
+
+def _aguardar_status(app, envio_ids, status, timeout=10.0):
+    limite = time.monotonic() + timeout
+    while True:
+        with app.app_context():
+            envios = EnvioEmail.query.filter(EnvioEmail.id.in_(envio_ids)).all()
+            if len(envios) == len(envio_ids) and all(envio.status == status for envio in envios):
+                return envios
+        assert time.monotonic() < limite, [(envio.status, envio.ultimo_erro) for envio in envios]
+        time.sleep(0.05)
+
+
+def test_envio_entregue_marca_enviado(app, smtp):
+    destinatario = f"{uuid4().hex}@teste.com"
+    with app.app_context():
+        envio_id = fila_email.enfileirar(destinatario, 'Código', 'corpo')
+        assert envio_id is not None
+        envio = EnvioEmail.query.filter_by(id=envio_id).one()
+        assert envio.status == EnvioEmailStatus.ENVIADO.value
+        assert envio.tentativas == 1
+        assert envio.enviado_em is not None
+
+    assert [envelope.rcpt_tos for envelope in smtp.mensagens] == [[destinatario]]
+
+
+def test_worker_reaproveita_a_conexao_smtp(app, smtp, fila_assincrona):
+    with app.app_context():
+        envio_ids = [fila_assincrona.enfileirar(f"{uuid4().hex}@teste.com", 'Código', 'corpo') for _ in range(3)]
+    assert None not in envio_ids
+
+    _aguardar_status(app, envio_ids, EnvioEmailStatus.ENVIADO.value)
+    assert len(smtp.mensagens) == 3
+    assert len(smtp.conexoes) == 1
+
+
+def test_falha_temporaria_repete_com_backoff(app, smtp, fila_assincrona):
+    smtp.falhas = 1
+    with app.app_context():
+        envio_id = fila_assincrona.enfileirar(f"{uuid4().hex}@teste.com", 'Código', 'corpo')
+
+    envio, = _aguardar_status(app, [envio_id], EnvioEmailStatus.ENVIADO.value)
+    assert envio.tentativas == 2
+    assert envio.ultimo_erro is None
+    assert len(smtp.mensagens) == 1
+
+
+def test_smtp_indisponivel_marca_envio_como_falhou(app, banco):
+    estado = app.extensions['mail']
+    anterior = estado.suppress, estado.server, estado.port
+    # Porta fechada: a conexão é recusada antes de qualquer troca SMTP
+    estado.suppress, estado.server, estado.port = False, '127.0.0.1', 9
+    destinatario = f"{uuid4().hex}@teste.com"
+    try:
+        with app.app_context():
+            assert fila_email.enfileirar(destinatario, 'Assunto', 'corpo') is None
+            envio = EnvioEmail.query.filter_by(destinatario=destinatario).one()
+            assert envio.status == EnvioEmailStatus.FALHOU.value
+            assert envio.ultimo_erro
+    finally:
+        estado.suppress, estado.server, estado.port = anterior
@@ -0,0 +1,138 @@
+"""
+Regressão dos índices das consultas frequentes (migração 7dd96a926180 e seguintes).
+
+Com uma massa sintética e estatísticas atualizadas, cada caminho de acesso
+abaixo, o mesmo usado pelas rotas indicadas, não pode cair em Seq Scan nas
+tabelas grandes.
+"""
+import pytest
+from sqlalchemy import text
+
+USUARIOS = 10000
+CONVERSAS_POR_USUARIO = 5
+MENSAGENS_POR_CONVERSA = 4
+REGISTROS_POR_USUARIO = 5
+
+
+@pytest.fixture(scope='module')
+def massa(banco):
+    with banco.engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO usuarios (id, nome, email, senha_hash) "
+            "SELECT gen_random_uuid(), 'Usuário ' || n, 'usuario' || n || '@teste.com', 'x' "
+            "FROM generate_series(1, :usuarios) n"
+        ), {"usuarios": USUARIOS})
+        conn.execute(text(
+            "WITH u AS (SELECT id, row_number() OVER (ORDER BY email) AS n FROM usuarios) "
+            "INSERT INTO conversas (id, id_usuario1, id_usuario2) "
+            "SELECT gen_random_uuid(), LEAST(a.id, b.id), GREATEST(a.id, b.id) "
+            "FROM u a JOIN u b ON b.n BETWEEN a.n + 1 AND a.n + :conversas"
+        ), {"conversas": CONVERSAS_POR_USUARIO})
+        conn.execute(text(
+            "INSERT INTO mensagens (id, id_conversa, id_usuario, texto_criptografado, data_envio) "
+            "SELECT gen_random_uuid(), c.id, CASE WHEN m % 2 = 0 THEN c.id_usuario1 ELSE c.id_usuario2 END, "
+            "'texto', now() - m * interval '1 minute' "
+            "FROM conversas c, generate_series(1, :mensagens) m"
+        ), {"mensagens": MENSAGENS_POR_CONVERSA})
+        conn.execute(text(
+            "INSERT INTO contatos (id, id_usuario, id_contato) "
+            "SELECT gen_random_uuid(), id_usuario1, id_usuario2 FROM conversas "
+            "UNION ALL SELECT gen_random_uuid(), id_usuario2, id_usuario1 FROM conversas"
+        ))
+        conn.execute(text(
+            "INSERT INTO sessoes (id, id_usuario, jwt_token, \"doisFatoresSessao\") "
+            "SELECT gen_random_uuid(), u.id, gen_random_uuid()::text, true "
+            "FROM usuarios u, generate_series(1, :registros)"
+        ), {"registros": REGISTROS_POR_USUARIO})
+        conn.execute(text(
+            "INSERT INTO doisfatores (id, id_usuario, codigo, timestamp) "
+            "SELECT gen_random_uuid(), u.id, md5(random()::text), now() - r * interval '1 hour' "
+            "FROM usuarios u, generate_series(1, :registros) r"
+        ), {"registros": REGISTROS_POR_USUARIO})
+        conn.execute(text(
+            "INSERT INTO logs (id, id_usuario, categoria, severidade, acao, timestamp) "
+            "SELECT gen_random_uuid(), u.id, 'Sistema', 'Info', 'TESTE', now() - r * interval '1 hour' "
+            "FROM usuarios u, generate_series(1, :registros) r"
+        ), {"registros": REGISTROS_POR_USUARIO})
+        conn.execute(text(
+            "INSERT INTO alteracoes (id_usuario, seq, tipo, id_objeto) "
+            "SELECT u.id, r, 'mensagem_nova', gen_random_uuid() "
+            "FROM usuarios u, generate_series(1, :registros) r"
+        ), {"registros": REGISTROS_POR_USUARIO})
+
+    # ANALYZE fora de transação explícita
+    with banco.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+    with banco.engine.connect() as conn:
+        conversa = conn.execute(text("SELECT id, id_usuario1 FROM conversas LIMIT 1")).one()
+        return {
+            "usuario": conversa.id_usuario1,
+            "conversa": conversa.id,
+            "jti": conn.execute(text("SELECT jwt_token FROM sessoes LIMIT 1")).scalar()
+        }
+
+
+def _varreduras_sequenciais(no):
+    encontradas = [no["Relation Name"]] if no.get("Node Type") == "Seq Scan" else []
+    for filho in no.get("Plans", []):
+        encontradas += _varreduras_sequenciais(filho)
+    return encontradas
+
+
+# (rota, consulta, prefixos das tabelas que não podem ter Seq Scan)
+CAMINHOS = [
+    (
+        "GET /conversas/<id>/mensagens",
+        "SELECT * FROM mensagens WHERE id_conversa = :conversa ORDER BY data_envio DESC, id DESC LIMIT 51",
+        ("mensagens",)
+    ),
+    (
+        "POST /auth/confirmar-exclusao (anonimização)",
+        "UPDATE mensagens SET texto_criptografado = '[mensagem removida]', exclusao = true WHERE id_usuario = :usuario",
+        ("mensagens",)
+    ),
+    (
+        "POST /auth/confirmar-exclusao (conversas do usuário)",
+        "SELECT * FROM conversas WHERE id_usuario1 = :usuario OR id_usuario2 = :usuario",
+        ("conversas",)
+    ),
+    (
+        "GET /auth/me, logout (sessão pelo jti)",
+        "SELECT * FROM sessoes WHERE jwt_token = :jti LIMIT 1",
+        ("sessoes",)
+    ),
+    (
+        "POST /auth/verify-login (último código 2FA)",
+        "SELECT * FROM doisfatores WHERE id_usuario = :usuario AND timestamp >= now() - interval '15 minutes' "
+        "ORDER BY timestamp DESC LIMIT 1",
+        ("doisfatores",)
+    ),
+    (
+        "GET /auditoria/logs?usuario=",
+        "SELECT * FROM logs WHERE id_usuario = :usuario ORDER BY timestamp DESC LIMIT 50",
+        ("logs",)
+    ),
+    (
+        "POST /auth/register e /auth/confirmar-exclusao (donos do contato)",
+        "SELECT id_usuario FROM contatos WHERE id_contato = :usuario",
+        ("contatos",)
+    ),
+    (
+        "GET /sync",
+        "SELECT seq, tipo, id_objeto FROM alteracoes WHERE id_usuario = :usuario AND seq > 2 ORDER BY seq LIMIT 1001",
+        ("alteracoes",)
+    ),
+]
+
+
+@pytest.mark.parametrize("rota, consulta, tabelas", CAMINHOS, ids=[rota for rota, _, _ in CAMINHOS])
+def test_caminho_usa_indice(banco, massa, rota, consulta, tabelas):
+    with banco.engine.connect() as conn:
+        plano = conn.execute(text(f"EXPLAIN (FORMAT JSON) {consulta}"), massa).scalar()[0]["Plan"]
+
+    proibidas = [
+        relacao for relacao in _varreduras_sequenciais(plano)
+        if relacao.startswith(tabelas)
+    ]
+    assert not proibidas, f"{rota}: Seq Scan em {', '.join(proibidas)}"
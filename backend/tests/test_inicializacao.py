@@ -0,0 +1,14 @@
+"""create_app() não pode voltar a carregar módulos pesados que só servem a recursos desligados"""
+import os
+import subprocess
+import sys
+
+PASTA_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_create_app_sem_metricas_nao_importa_prometheus():
+    codigo = "import sys, app; app.create_app(); print('prometheus_client' in sys.modules)"
+    ambiente = {**os.environ, 'METRICAS_HABILITADAS': 'false'}
+    saida = subprocess.run([sys.executable, '-c', codigo], cwd=PASTA_BACKEND, env=ambiente,
+                           check=True, capture_output=True, text=True)
+    assert saida.stdout.strip().splitlines()[-1] == 'False'
@@ -0,0 +1,56 @@
+"""
+Confirmações de leitura pelo Socket.IO: a marca por conversa
+(mark_read_up_to) e o evento antigo por mensagem (message_read).
+"""
+from uuid import uuid4
+
+import pytest
+
+from app.extensions import db, socketio
+from app.models import Conversa
+
+
+@pytest.fixture
+def par(app, criar_usuario, autenticar):
+    """Dois usuários conectados por socket e a conversa entre eles"""
+    with app.app_context():
+        remetente, leitor = criar_usuario('Remetente'), criar_usuario('Leitor')
+        id_usuario1, id_usuario2 = Conversa.ordenar_participantes(remetente, leitor)
+        conversa = Conversa(id=uuid4(), id_usuario1=id_usuario1, id_usuario2=id_usuario2)
+        db.session.add(conversa)
+        db.session.commit()
+        tokens = [autenticar(usuario)["Authorization"][7:] for usuario in (remetente, leitor)]
+
+    clientes = [socketio.test_client(app, auth={'token': token}) for token in tokens]
+    yield clientes[0], clientes[1], str(conversa.id)
+    for cliente in clientes:
+        cliente.disconnect()
+
+
+def _eventos(cliente, nome):
+    return [evento['args'][0] for evento in cliente.get_received() if evento['name'] == nome]
+
+
+def test_message_read_confirma_ao_remetente(par):
+    remetente, leitor, conversa_id = par
+    enviada = remetente.emit('send_message', {'conversa_id': conversa_id, 'texto': 'oi'}, callback=True)
+    assert enviada['ok']
+    remetente.get_received()
+
+    leitor.emit('message_read', {'mensagem_id': enviada['mensagem_id']})
+
+    assert _eventos(leitor, 'read_success')
+    confirmacoes = _eventos(remetente, 'message_read_confirmation')
+    assert [confirmacao['mensagem_id'] for confirmacao in confirmacoes] == [enviada['mensagem_id']]
+
+
+def test_mark_read_up_to_devolve_marca_vigente(par):
+    remetente, leitor, conversa_id = par
+    enviada = remetente.emit('send_message', {'conversa_id': conversa_id, 'texto': 'oi'}, callback=True)
+
+    primeira = leitor.emit('mark_read_up_to', {'conversa_id': conversa_id, 'mensagem_id': enviada['mensagem_id']}, callback=True)
+    repetida = leitor.emit('mark_read_up_to', {'conversa_id': conversa_id, 'mensagem_id': enviada['mensagem_id']}, callback=True)
+
+    assert primeira['ok'] and repetida['ok']
+    assert primeira['lida_ate'] is not None
+    assert repetida['lida_ate'] == primeira['lida_ate']
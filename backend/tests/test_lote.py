@@ -0,0 +1,116 @@
+"""
+Envio em lote da fila offline: idempotente por client_msg_id e com o mesmo
+número de instruções SQL qualquer que seja o tamanho do lote.
+"""
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event
+
+from app.api.conversas import LIMITE_MAXIMO_LOTE
+from app.extensions import db
+from app.models import Conversa, Mensagem
+
+URL_LOTE = '/api/conversas/mensagens/lote'
+
+
+@pytest.fixture
+def conversa(app, criar_usuario, autenticar):
+    """Conversa entre o remetente e um contato, com os cabeçalhos do remetente"""
+    with app.app_context():
+        remetente, contato = criar_usuario('Remetente'), criar_usuario('Contato')
+        id_usuario1, id_usuario2 = Conversa.ordenar_participantes(remetente, contato)
+        nova = Conversa(id=uuid4(), id_usuario1=id_usuario1, id_usuario2=id_usuario2)
+        db.session.add(nova)
+        db.session.commit()
+        return str(nova.id), autenticar(remetente)
+
+
+def _mensagens(conversa_id, quantidade):
+    return [{'client_msg_id': uuid4().hex, 'conversa_id': conversa_id, 'texto': f"offline {n}"}
+            for n in range(quantidade)]
+
+
+def _enviar(cliente, cabecalhos, mensagens):
+    consultas = []
+
+    def registrar(conn, cursor, statement, *_):
+        consultas.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        resposta = cliente.post(URL_LOTE, headers=cabecalhos, json={'mensagens': mensagens})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+    return resposta, consultas
+
+
+def _contar(app, conversa_id):
+    with app.app_context():
+        return Mensagem.query.filter_by(id_conversa=conversa_id).count()
+
+
+def test_reenvio_do_lote_devolve_duplicadas(app, cliente, conversa):
+    conversa_id, cabecalhos = conversa
+    mensagens = _mensagens(conversa_id, 3)
+
+    primeira, _ = _enviar(cliente, cabecalhos, mensagens)
+    assert primeira.status_code == 200, primeira.get_json()
+    assert primeira.get_json()['criadas'] == 3
+
+    segunda, _ = _enviar(cliente, cabecalhos, mensagens)
+    assert segunda.status_code == 200
+    assert segunda.get_json()['criadas'] == 0
+    assert [resultado['status'] for resultado in segunda.get_json()['resultados']] == ['duplicada'] * 3
+    assert [resultado['id'] for resultado in segunda.get_json()['resultados']] == \
+        [resultado['id'] for resultado in primeira.get_json()['resultados']]
+    assert _contar(app, conversa_id) == 3
+
+
+def test_client_msg_id_repetido_no_mesmo_lote(app, cliente, conversa):
+    conversa_id, cabecalhos = conversa
+    mensagem = _mensagens(conversa_id, 1)[0]
+
+    resposta, _ = _enviar(cliente, cabecalhos, [mensagem, dict(mensagem)])
+    assert resposta.status_code == 200, resposta.get_json()
+    resultados = resposta.get_json()['resultados']
+    assert resposta.get_json()['criadas'] == 1
+    assert resultados[0]['id'] == resultados[1]['id']
+    assert _contar(app, conversa_id) == 1
+
+
+def test_conversa_alheia_rejeitada_por_item(app, cliente, conversa, criar_usuario):
+    conversa_id, cabecalhos = conversa
+    with app.app_context():
+        outro1, outro2 = Conversa.ordenar_participantes(criar_usuario('Outro'), criar_usuario('Outro'))
+        alheia = Conversa(id=uuid4(), id_usuario1=outro1, id_usuario2=outro2)
+        db.session.add(alheia)
+        db.session.commit()
+        alheia_id = str(alheia.id)
+
+    mensagens = _mensagens(conversa_id, 1) + _mensagens(alheia_id, 1)
+    resposta, _ = _enviar(cliente, cabecalhos, mensagens)
+    assert resposta.status_code == 200, resposta.get_json()
+    valida, rejeitada = resposta.get_json()['resultados']
+    assert valida['status'] == 'criada'
+    assert rejeitada['status'] == 'erro'
+    assert _contar(app, alheia_id) == 0
+
+
+def test_lote_acima_do_limite_responde_413(app, cliente, conversa):
+    conversa_id, cabecalhos = conversa
+    resposta, _ = _enviar(cliente, cabecalhos, _mensagens(conversa_id, LIMITE_MAXIMO_LOTE + 1))
+    assert resposta.status_code == 413
+    assert _contar(app, conversa_id) == 0
+
+
+def test_instrucoes_nao_crescem_com_o_lote(app, cliente, conversa):
+    conversa_id, cabecalhos = conversa
+    # Aquece o cache de sessões
+    _enviar(cliente, cabecalhos, _mensagens(conversa_id, 1))
+
+    pequeno, consultas_pequeno = _enviar(cliente, cabecalhos, _mensagens(conversa_id, 2))
+    grande, consultas_grande = _enviar(cliente, cabecalhos, _mensagens(conversa_id, 40))
+    assert pequeno.status_code == grande.status_code == 200
+    assert grande.get_json()['criadas'] == 40
+    assert len(consultas_grande) == len(consultas_pequeno)
@@ -0,0 +1,27 @@
+"""Manutenção agendada das partições de logs: só um processo por vez"""
+from sqlalchemy import text
+
+from app.extensions import db
+from app.particoes import CHAVE_MANUTENCAO, PARTICAO_PADRAO, listar_particoes_logs, manter_logs
+
+
+def test_manutencao_cria_particoes_a_frente(app, banco):
+    with app.app_context():
+        criadas, removidas = manter_logs(db.engine, meses_adiante=6, meses_retencao=120)
+        with db.engine.connect() as conn:
+            existentes = set(listar_particoes_logs(conn))
+    assert set(criadas) <= existentes
+    assert removidas == []
+    # Mês atual e os seis seguintes, além da DEFAULT
+    assert len([nome for nome in existentes if nome != PARTICAO_PADRAO]) >= 7
+
+
+def test_manutencao_nao_roda_com_o_lock_ocupado(app, banco):
+    with app.app_context():
+        with db.engine.connect() as outro_processo:
+            outro_processo.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": CHAVE_MANUTENCAO})
+            try:
+                assert manter_logs(db.engine, meses_adiante=6, meses_retencao=120) is None
+            finally:
+                outro_processo.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_MANUTENCAO})
+        assert manter_logs(db.engine, meses_adiante=6, meses_retencao=120) is not None
@@ -0,0 +1,58 @@
+"""
+Presença compartilhada (PresencaRedis) sobre um substituto local do Redis.
+Não precisa de banco; precisa do fakeredis com suporte a Lua.
+"""
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+
+from app.presenca import PresencaRedis  # noqa: E402
+
+
+@pytest.fixture
+def servidor():
+    return fakeredis.FakeServer()
+
+
+def _presenca(servidor):
+    return PresencaRedis(cliente=fakeredis.FakeStrictRedis(server=servidor, decode_responses=True), ttl=60)
+
+
+def test_remover_ultima_conexao_tira_usuario_do_online(servidor):
+    presenca = _presenca(servidor)
+    presenca.registrar('u1', 'sid-a')
+    presenca.registrar('u1', 'sid-b')
+
+    assert presenca.remover('sid-a') == 'u1'
+    assert presenca.esta_online('u1')
+    assert presenca.remover('sid-b') == 'u1'
+    assert not presenca.esta_online('u1')
+    assert presenca.remover('sid-b') is None
+    assert presenca.estatisticas() == {"usuarios_online": 0, "conexoes": 0}
+
+
+def test_sids_de_worker_sem_batimento_sao_removidos(servidor):
+    morto, vivo = _presenca(servidor), _presenca(servidor)
+    morto.registrar('u1', 'sid-morto')
+    vivo.registrar('u2', 'sid-vivo')
+
+    # Simula o TTL expirado: o processo morreu sem desconectar os sockets
+    morto._redis.delete(morto._chave_vivo(morto.worker))
+    vivo.batimento()
+
+    assert not vivo.esta_online('u1')
+    assert vivo.usuario_do_sid('sid-morto') is None
+    assert vivo.esta_online('u2')
+    assert vivo.estatisticas() == {"usuarios_online": 1, "conexoes": 1}
+
+
+def test_encerrar_remove_os_proprios_sids(servidor):
+    presenca, outro = _presenca(servidor), _presenca(servidor)
+    presenca.registrar('u1', 'sid-a')
+    outro.registrar('u2', 'sid-b')
+
+    presenca.encerrar()
+
+    assert not outro.esta_online('u1')
+    assert outro.esta_online('u2')
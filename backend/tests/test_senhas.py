@@ -0,0 +1,53 @@
+"""Limites do serviço de senhas: fila cheia, timeout e devolução das vagas"""
+import time
+
+import pytest
+from flask import Flask
+
+from app.senhas import SenhaSobrecarregada, ServicoSenhas
+
+
+def _servico(**config):
+    app = Flask(__name__)
+    app.config.update({'SENHA_WORKERS': 1, 'SENHA_FILA_MAXIMA': 0, 'SENHA_TIMEOUT': 0.2, **config})
+    servico = ServicoSenhas(app)
+    return servico
+
+
+def _vagas(servico):
+    return servico.estatisticas()["vagas_livres"]
+
+
+def test_hash_e_verificacao():
+    servico = _servico(BCRYPT_LOG_ROUNDS=4, SENHA_TIMEOUT=30)
+    try:
+        senha_hash = servico.gerar_hash('segredo')
+        assert servico.verificar(senha_hash, 'segredo')
+        assert not servico.verificar(senha_hash, 'outra')
+        assert not servico.precisa_rehash(senha_hash)
+        assert _vagas(servico) == 1
+    finally:
+        servico.parar()
+
+
+def test_fila_cheia_responde_na_hora():
+    servico = _servico()
+    servico._vagas.acquire(blocking=False)
+    inicio = time.monotonic()
+    with pytest.raises(SenhaSobrecarregada):
+        servico.verificar('hash', 'senha')
+    assert time.monotonic() - inicio < 0.1
+
+
+def test_vaga_do_tpool_so_volta_quando_o_hash_termina():
+    pytest.importorskip('eventlet')
+    servico = _servico()
+    # Como em _executar: a vaga é tomada antes de despachar para o tpool
+    assert servico._vagas.acquire(blocking=False)
+    with pytest.raises(SenhaSobrecarregada):
+        servico._executar_tpool(time.sleep, 0.6)
+    # A requisição desistiu, mas a thread ainda está ocupada com o trabalho
+    assert _vagas(servico) == 0
+
+    time.sleep(1.0)
+    assert _vagas(servico) == 1